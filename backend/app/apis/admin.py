@@ -0,0 +1,146 @@
+import asyncio
+import hmac
+import logging
+import threading
+from functools import partial
+from typing import Dict, Optional
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+
+from app.loop_monitor import LoopMonitor
+from app.profiling import SamplingProfiler, MemoryProfiler
+from app.rate_limit import RateLimiter
+from app.dependencies import (
+    get_loop_monitor,
+    get_sampling_profiler,
+    get_memory_profiler,
+    get_connection_manager,
+    get_idempotency_service,
+    get_active_orders_board,
+    get_rate_limiter,
+    get_websocket_rate_limiter,
+    uses_memory_storage,
+)
+from app.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+
+    token = get_settings().admin_token
+    if not token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/loop")
+async def get_loop_report(
+    limit: int = Query(20, ge=1, le=200, description="Количество источников блокировок"),
+    monitor: LoopMonitor = Depends(get_loop_monitor)
+):
+
+    return {
+        "lag_ms": round(monitor.lag * 1000, 1),
+        "max_lag_ms": round(monitor.max_lag * 1000, 1),
+        "stalls": monitor.stalls,
+        "blocked_seconds": round(monitor.blocked_seconds, 3),
+        "block_threshold_ms": monitor.block_threshold * 1000,
+        "blockers": monitor.top_blockers(limit)
+    }
+
+
+@router.get("/startup")
+async def get_startup_timings(request: Request):
+
+    return {"timings_ms": request.app.state.startup_timings}
+
+
+@router.post("/profile")
+async def run_profile(
+    seconds: float = Query(10, gt=0, description="Длительность профилирования в секундах"),
+    interval_ms: float = Query(5, ge=1, le=100, description="Интервал между сэмплами"),
+    format: str = Query("collapsed", pattern="^(collapsed|top)$", description="collapsed или top"),
+    profiler: SamplingProfiler = Depends(get_sampling_profiler)
+):
+
+    if profiler.running:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+
+    # Handlers run on the event loop thread, which is the thread worth sampling.
+    thread_id = threading.get_ident()
+    try:
+        stacks = await asyncio.get_running_loop().run_in_executor(
+            None, profiler.profile, thread_id, seconds, interval_ms / 1000
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    if format == "top":
+        return {"samples": sum(stacks.values()), "functions": profiler.top_functions(stacks)}
+
+    return PlainTextResponse(
+        profiler.collapsed(stacks),
+        headers={"Content-Disposition": 'attachment; filename="profile.collapsed"'}
+    )
+
+
+def _structure_sizes() -> Dict[str, int]:
+
+    sizes = {
+        f"connection_manager.{name}": size
+        for name, size in get_connection_manager().get_structure_sizes().items()
+    }
+    if not uses_memory_storage():
+        sizes["idempotency.cache"] = get_idempotency_service().get_cache_size()
+    sizes["active_orders_board"] = len(get_active_orders_board())
+    sizes["websocket_rate_limiter.buckets"] = len(get_websocket_rate_limiter().buckets)
+
+    limiter = get_rate_limiter()
+    if isinstance(limiter, RateLimiter):
+        sizes["rate_limiter.buckets"] = len(limiter.buckets)
+    return sizes
+
+
+# Snapshots, their diff, freeing the traces and the heap walk take seconds on
+# a large heap, so they run in the default executor; the structure sizes are
+# read on the loop.
+
+@router.post("/memory/start")
+async def start_memory_tracing(profiler: MemoryProfiler = Depends(get_memory_profiler)):
+
+    await asyncio.get_running_loop().run_in_executor(None, profiler.start, _structure_sizes())
+    return {"tracing": True}
+
+
+@router.get("/memory/diff")
+async def get_memory_diff(
+    limit: int = Query(30, ge=1, le=500, description="Количество строк"),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$", description="Группировка"),
+    objects: bool = Query(False, description="Подсчитать живые модели (обход всей кучи)"),
+    profiler: MemoryProfiler = Depends(get_memory_profiler)
+):
+
+    loop = asyncio.get_running_loop()
+    try:
+        report = await loop.run_in_executor(
+            None, partial(profiler.diff, _structure_sizes(), limit=limit, group_by=group_by)
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    if objects:
+        report["models"] = await loop.run_in_executor(None, profiler.count_instances, (BaseModel,))
+    return report
+
+
+@router.post("/memory/stop")
+async def stop_memory_tracing(profiler: MemoryProfiler = Depends(get_memory_profiler)):
+
+    await asyncio.get_running_loop().run_in_executor(None, profiler.stop)
+    return {"tracing": False}
@@ -0,0 +1,53 @@
+import logging
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from app.services.customer import CustomerService
+from app.services.order import OrderService
+from app.models.customer import CustomerProfile
+from app.responses.customer import CustomerResponse, CustomerOrdersResponse
+from app.exceptions import CustomerNotFoundError, DatabaseError
+from app.dependencies import get_customer_service, get_order_service
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/customers", tags=["customers"])
+
+
+async def find_customer(
+    phone: Optional[str] = Query(None, description="Телефон клиента"),
+    email: Optional[str] = Query(None, description="Email клиента"),
+    service: CustomerService = Depends(get_customer_service)
+) -> CustomerProfile:
+
+    if not phone and not email:
+        raise HTTPException(status_code=400, detail="Phone or email is required")
+
+    try:
+        return await service.get_customer(phone=phone, email=email)
+    except CustomerNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except DatabaseError as e:
+        logger.error(f"Database error in find_customer: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/lookup", response_model=CustomerResponse)
+async def get_customer(customer: CustomerProfile = Depends(find_customer)):
+    return customer
+
+
+@router.get("/lookup/orders", response_model=CustomerOrdersResponse)
+async def get_customer_orders(
+    customer: CustomerProfile = Depends(find_customer),
+    service: OrderService = Depends(get_order_service)
+):
+
+    try:
+        orders = await service.get_orders_by_ids(customer.recent_order_ids)
+        return CustomerOrdersResponse(
+            customer=customer.model_dump(by_alias=True),
+            orders=[o.model_dump() for o in orders]
+        )
+    except DatabaseError as e:
+        logger.error(f"Database error in get_customer_orders: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,36 @@
+import logging
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+
+from app.services.product import ProductService
+from app.services.menu import IDENTITY
+from app.responses.menu import MenuResponse
+from app.exceptions import DatabaseError
+from app.dependencies import get_product_service
+from app.http_cache import is_not_modified, set_cache_headers, not_modified_response
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/menu", tags=["menu"])
+
+
+@router.get("", response_model=MenuResponse)
+async def get_menu(request: Request, service: ProductService = Depends(get_product_service)):
+
+    try:
+        menu = await service.get_menu()
+    except DatabaseError as e:
+        logger.error(f"Database error in get_menu: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    encoding = menu.negotiate(request.headers.get("accept-encoding"))
+    etag = menu.etag_for(encoding)
+    if is_not_modified(request, etag):
+        response = not_modified_response(etag)
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+    response = Response(content=menu.encoded[encoding], media_type="application/json")
+    set_cache_headers(response, etag)
+    response.headers["Vary"] = "Accept-Encoding"
+    if encoding != IDENTITY:
+        response.headers["Content-Encoding"] = encoding
+    return response
@@ -2,15 +2,46 @@ import logging
 from datetime import datetime
 from typing import Optional
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Request, Response
+from fastapi.responses import JSONResponse
 
 from app.services.order import OrderService
-from app.dto.order import OrderCreate, OrderStatusUpdate
-from app.responses.order import OrderResponse, OrderListResponse
+from app.services.idempotency import IdempotencyService
+from app.services.active_orders import ActiveOrdersBoard
+from app.services.versions import CollectionVersions, ORDERS
+from app.dto.order import OrderCreate, OrderStatusUpdate, OrderStatusBulkUpdate
+from app.responses.order import (
+    OrderResponse,
+    OrderListResponse,
+    ActiveOrdersResponse,
+    OrderStatusBulkResponse,
+)
 from app.models.order import OrderStatus
-from app.exceptions import OrderNotFoundError, ProductNotFoundError, DatabaseError, ValidationError
-from app.dependencies import get_order_service, get_connection_manager
-from app.websocket.connection_manager import ConnectionManager
+from app.exceptions import (
+    OrderNotFoundError,
+    ProductNotFoundError,
+    DatabaseError,
+    ValidationError,
+    IdempotencyConflictError,
+    IdempotencyKeyMismatchError,
+    ConcurrencyError,
+)
+from app.dependencies import (
+    get_order_service,
+    get_idempotency_service,
+    get_collection_versions,
+    get_active_orders_board,
+    uses_secondary_reads,
+)
+from app.http_cache import (
+    make_etag,
+    version_etag,
+    parse_if_match,
+    has_validators,
+    is_not_modified,
+    set_cache_headers,
+    not_modified_response,
+)
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/orders", tags=["orders"])
@@ -19,22 +50,42 @@ router = APIRouter(prefix="/orders", tags=["orders"])
 @router.post("/", response_model=OrderResponse, status_code=201)
 async def create_order(
     order: OrderCreate,
-    background_tasks: BackgroundTasks,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
     service: OrderService = Depends(get_order_service),
-    connection_manager: ConnectionManager = Depends(get_connection_manager)
+    idempotency: IdempotencyService = Depends(get_idempotency_service)
 ):
 
     try:
-        new_order = await service.create_order(order)
+        fingerprint = None
+        if idempotency_key:
+            fingerprint = idempotency.fingerprint(order.model_dump_json())
+            stored = await idempotency.reserve(idempotency_key, fingerprint)
+            if stored is not None:
+                return JSONResponse(
+                    status_code=stored["status_code"],
+                    content=stored["body"],
+                    headers={"Idempotent-Replayed": "true"}
+                )
+
+        try:
+            new_order = await service.create_order(order)
+        except BaseException:
+            # Also on cancellation, so a retry does not wait out the lease.
+            if idempotency_key:
+                await idempotency.release(idempotency_key)
+            raise
+
         logger.info(f"Order created via API: {new_order.id}")
 
-        background_tasks.add_task(
-            connection_manager.broadcast_new_order,
-            new_order.model_dump(mode='json')
-        )
+        if idempotency_key:
+            await idempotency.complete(idempotency_key, fingerprint, 201, new_order.model_dump(mode='json'))
 
         return new_order
 
+    except IdempotencyConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except IdempotencyKeyMismatchError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except ProductNotFoundError as e:
         logger.warning(f"Product not found during order creation: {e}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -48,16 +99,30 @@ async def create_order(
 
 @router.get("/", response_model=OrderListResponse)
 async def get_orders(
+    request: Request,
+    response: Response,
     status: Optional[OrderStatus] = Query(None, description="Фильтр по статусу"),
     customer_name: Optional[str] = Query(None, description="Поиск по имени клиента"),
     date_from: Optional[datetime] = Query(None, description="Дата начала периода"),
     date_to: Optional[datetime] = Query(None, description="Дата окончания периода"),
     page: int = Query(1, ge=1, description="Номер страницы"),
     limit: int = Query(10, ge=1, le=100, description="Количество заказов на странице"),
-    service: OrderService = Depends(get_order_service)
+    service: OrderService = Depends(get_order_service),
+    versions: CollectionVersions = Depends(get_collection_versions),
+    secondary_reads: bool = Depends(uses_secondary_reads)
 ):
 
     try:
+        # The version counter is read on the primary; a page served by a
+        # lagging secondary must not carry the newest version's tag.
+        if not secondary_reads:
+            version = await versions.get(ORDERS)
+            etag = make_etag(ORDERS, version, status, customer_name, date_from, date_to, page, limit)
+            if is_not_modified(request, etag):
+                return not_modified_response(etag)
+
+            set_cache_headers(response, etag)
+
         orders, total = await service.get_orders(
             status=status,
             customer_name=customer_name,
@@ -78,14 +143,35 @@ async def get_orders(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/active", response_model=ActiveOrdersResponse)
+async def get_active_orders(
+    status: Optional[OrderStatus] = Query(None, description="Фильтр по статусу"),
+    board: ActiveOrdersBoard = Depends(get_active_orders_board)
+):
+
+    return ActiveOrdersResponse(
+        orders=[o.model_dump() for o in board.get_orders(status)],
+        counts=board.get_counts()
+    )
+
+
 @router.get("/{order_id}", response_model=OrderResponse)
 async def get_order(
     order_id: UUID,
+    request: Request,
+    response: Response,
     service: OrderService = Depends(get_order_service)
 ):
 
     try:
+        if has_validators(request):
+            version, updated_at = await service.get_order_version(order_id)
+            etag = version_etag(version)
+            if is_not_modified(request, etag, updated_at):
+                return not_modified_response(etag, updated_at)
+
         order = await service.get_order(order_id)
+        set_cache_headers(response, version_etag(order.version), order.updated_at)
         return order
     except OrderNotFoundError as e:
         logger.warning(f"Order not found in API: {order_id}")
@@ -95,35 +181,58 @@ async def get_order(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.patch("/status/bulk", response_model=OrderStatusBulkResponse)
+async def update_orders_status_bulk(
+    status_update: OrderStatusBulkUpdate,
+    service: OrderService = Depends(get_order_service)
+):
+
+    try:
+        results = await service.update_orders_status_bulk(status_update.order_ids, status_update.status)
+        updated = sum(1 for result in results if "order" in result)
+        logger.info(f"Bulk status update via API: {updated}/{len(results)} -> {status_update.status}")
+
+        return OrderStatusBulkResponse(
+            results=[
+                {
+                    "order_id": result["order_id"],
+                    "success": "order" in result,
+                    "order": result["order"].model_dump() if "order" in result else None,
+                    "error": result.get("error")
+                }
+                for result in results
+            ],
+            updated=updated
+        )
+    except DatabaseError as e:
+        logger.error(f"Database error in update_orders_status_bulk: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.patch("/{order_id}/status", response_model=OrderResponse)
 async def update_order_status(
     order_id: UUID,
     status_update: OrderStatusUpdate,
-    background_tasks: BackgroundTasks,
-    service: OrderService = Depends(get_order_service),
-    connection_manager: ConnectionManager = Depends(get_connection_manager)
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    service: OrderService = Depends(get_order_service)
 ):
 
     try:
-        updated_order = await service.update_order_status(order_id, status_update.status)
-        logger.info(f"Order status updated via API: {order_id} -> {status_update.status}")
-
-        background_tasks.add_task(
-            connection_manager.broadcast_order_update,
-            order_id,
-            updated_order.model_dump(mode='json')
-        )
-
-        stats = await service.get_orders_statistics()
-        background_tasks.add_task(
-            connection_manager.broadcast_statistics_update,
-            stats
-        )
+        expected_version = parse_if_match(if_match)
+    except ValueError as e:
+        raise HTTPException(status_code=412, detail=str(e))
 
+    try:
+        updated_order = await service.update_order_status(order_id, status_update.status, expected_version)
+        logger.info(f"Order status updated via API: {order_id} -> {status_update.status}")
+        response.headers["ETag"] = version_etag(updated_order.version)
         return updated_order
 
     except OrderNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except ConcurrencyError as e:
+        raise HTTPException(status_code=412, detail=str(e))
     except ValueError as e:
         logger.warning(f"Invalid status transition: {e}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -135,25 +244,26 @@ async def update_order_status(
 @router.delete("/{order_id}", response_model=OrderResponse)
 async def cancel_order(
     order_id: UUID,
-    background_tasks: BackgroundTasks,
-    service: OrderService = Depends(get_order_service),
-    connection_manager: ConnectionManager = Depends(get_connection_manager)
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    service: OrderService = Depends(get_order_service)
 ):
 
     try:
-        cancelled_order = await service.cancel_order(order_id)
-        logger.info(f"Order cancelled via API: {order_id}")
-
-        background_tasks.add_task(
-            connection_manager.broadcast_order_update,
-            order_id,
-            cancelled_order.model_dump(mode='json')
-        )
+        expected_version = parse_if_match(if_match)
+    except ValueError as e:
+        raise HTTPException(status_code=412, detail=str(e))
 
+    try:
+        cancelled_order = await service.cancel_order(order_id, expected_version)
+        logger.info(f"Order cancelled via API: {order_id}")
+        response.headers["ETag"] = version_etag(cancelled_order.version)
         return cancelled_order
 
     except OrderNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except ConcurrencyError as e:
+        raise HTTPException(status_code=412, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except DatabaseError as e:
@@ -1,14 +1,24 @@
 import logging
 from typing import Optional
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, Header
 
 from app.services.product import ProductService
+from app.services.versions import CollectionVersions, PRODUCTS
 from app.dto.product import ProductCreate, ProductUpdate
-from app.responses.product import ProductResponse, ProductListResponse
+from app.responses.product import ProductResponse, ProductListResponse, ProductSearchResponse
 from app.responses.common import MessageResponse
-from app.exceptions import ProductNotFoundError, DatabaseError
-from app.dependencies import get_product_service
+from app.exceptions import ProductNotFoundError, DatabaseError, ConcurrencyError
+from app.dependencies import get_product_service, get_collection_versions, uses_secondary_reads
+from app.http_cache import (
+    make_etag,
+    version_etag,
+    parse_if_match,
+    has_validators,
+    is_not_modified,
+    set_cache_headers,
+    not_modified_response,
+)
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/products", tags=["products"])
@@ -17,12 +27,14 @@ router = APIRouter(prefix="/products", tags=["products"])
 @router.post("/", response_model=ProductResponse, status_code=201)
 async def create_product(
     product: ProductCreate,
+    response: Response,
     service: ProductService = Depends(get_product_service)
 ):
 
     try:
         new_product = await service.create_product(product)
         logger.info(f"Product created via API: {new_product.id}")
+        response.headers["ETag"] = version_etag(new_product.version)
         return new_product
     except DatabaseError as e:
         logger.error(f"Database error in create_product: {e}")
@@ -31,14 +43,28 @@ async def create_product(
 
 @router.get("/", response_model=ProductListResponse)
 async def get_products(
+    request: Request,
+    response: Response,
     category: Optional[str] = Query(None, description="Фильтр по категории"),
     available_only: bool = Query(False, description="Только доступные товары"),
     page: int = Query(1, ge=1, description="Номер страницы"),
     limit: int = Query(10, ge=1, le=100, description="Количество товаров на странице"),
-    service: ProductService = Depends(get_product_service)
+    service: ProductService = Depends(get_product_service),
+    versions: CollectionVersions = Depends(get_collection_versions),
+    secondary_reads: bool = Depends(uses_secondary_reads)
 ):
 
     try:
+        # The version counter is read on the primary; a page served by a
+        # lagging secondary must not carry the newest version's tag.
+        if not secondary_reads:
+            version = await versions.get(PRODUCTS)
+            etag = make_etag(PRODUCTS, version, category, available_only, page, limit)
+            if is_not_modified(request, etag):
+                return not_modified_response(etag)
+
+            set_cache_headers(response, etag)
+
         products, total = await service.get_products(
             category=category,
             available_only=available_only,
@@ -57,14 +83,40 @@ async def get_products(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/search", response_model=ProductSearchResponse)
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=100, description="Начало названия, категории или описания"),
+    category: Optional[str] = Query(None, description="Фильтр по категории"),
+    available_only: bool = Query(False, description="Только доступные товары"),
+    limit: int = Query(10, ge=1, le=50, description="Максимальное количество результатов"),
+    service: ProductService = Depends(get_product_service)
+):
+
+    try:
+        products = await service.search_products(q, category=category, available_only=available_only, limit=limit)
+        return ProductSearchResponse(products=[p.model_dump() for p in products], query=q)
+    except DatabaseError as e:
+        logger.error(f"Database error in search_products: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/{product_id}", response_model=ProductResponse)
 async def get_product(
     product_id: UUID,
+    request: Request,
+    response: Response,
     service: ProductService = Depends(get_product_service)
 ):
 
     try:
-        product = await service.get_product(product_id)
+        if has_validators(request):
+            version, updated_at = await service.get_product_version(product_id, allow_stale=True)
+            etag = version_etag(version)
+            if is_not_modified(request, etag, updated_at):
+                return not_modified_response(etag, updated_at)
+
+        product = await service.get_product(product_id, allow_stale=True)
+        set_cache_headers(response, version_etag(product.version), product.updated_at)
         return product
     except ProductNotFoundError as e:
         logger.warning(f"Product not found in API: {product_id}")
@@ -78,15 +130,21 @@ async def get_product(
 async def update_product(
     product_id: UUID,
     product: ProductUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     service: ProductService = Depends(get_product_service)
 ):
 
     try:
-        updated_product = await service.update_product(product_id, product)
+        expected_version = parse_if_match(if_match)
+        updated_product = await service.update_product(product_id, product, expected_version)
         logger.info(f"Product updated via API: {product_id}")
+        response.headers["ETag"] = version_etag(updated_product.version)
         return updated_product
     except ProductNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except (ConcurrencyError, ValueError) as e:
+        raise HTTPException(status_code=412, detail=str(e))
     except DatabaseError as e:
         logger.error(f"Database error in update_product: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -95,11 +153,12 @@ async def update_product(
 @router.delete("/{product_id}", response_model=MessageResponse)
 async def delete_product(
     product_id: UUID,
+    if_match: Optional[str] = Header(None),
     service: ProductService = Depends(get_product_service)
 ):
 
     try:
-        success = await service.delete_product(product_id)
+        success = await service.delete_product(product_id, parse_if_match(if_match))
         if success:
             logger.info(f"Product deleted via API: {product_id}")
             return MessageResponse(message="Product deleted successfully")
@@ -107,6 +166,8 @@ async def delete_product(
             raise HTTPException(status_code=500, detail="Failed to delete product")
     except ProductNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except (ConcurrencyError, ValueError) as e:
+        raise HTTPException(status_code=412, detail=str(e))
     except DatabaseError as e:
         logger.error(f"Database error in delete_product: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,16 +1,96 @@
 import logging
+import os
+import socket
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Union
 from pymongo import MongoClient
-from fastapi import Depends
+from pymongo.read_preferences import ReadPreference, SecondaryPreferred
 
 from app.services.product import ProductService
 from app.services.order import OrderService
+from app.services.outbox import OutboxService
+from app.services.idempotency import IdempotencyService
+from app.services.archive import OrderArchiver
+from app.services.active_orders import ActiveOrdersBoard
+from app.services.customer import CustomerService
+from app.services.versions import CollectionVersions
+from app.services.mongo_storage import MongoOrderRepository, MongoProductRepository
+from app.services.memory_storage import (
+    MemoryCollectionVersions,
+    MemoryCustomerService,
+    MemoryOrderRepository,
+    MemoryOutboxService,
+    MemoryProductRepository,
+)
+from app.load_shedding import LoadShedder
+from app.loop_monitor import LoopMonitor
+from app.profiling import SamplingProfiler, MemoryProfiler
+from app.rate_limit import RateLimiter, SharedRateLimiter
 from app.websocket.connection_manager import ConnectionManager
+from app.websocket.dispatcher import OutboxDispatcher
 from app.settings import get_settings
 
 logger = logging.getLogger(__name__)
 
 _db_client = None
+_loop_monitor = None
+_sampling_profiler = None
+_memory_profiler = None
+_load_shedder = None
+_rate_limiter = None
+_websocket_rate_limiter = None
+_product_service = None
+_order_service = None
+_collection_versions = None
 _connection_manager = None
+_outbox_service = None
+_outbox_dispatcher = None
+_idempotency_service = None
+_order_archiver = None
+_active_orders_board = None
+_customer_service = None
+
+
+def get_loop_monitor() -> LoopMonitor:
+
+    global _loop_monitor
+    if _loop_monitor is None:
+        settings = get_settings()
+        _loop_monitor = LoopMonitor(
+            interval=settings.loop_monitor_interval_ms / 1000,
+            block_threshold=settings.loop_block_threshold_ms / 1000,
+        )
+    return _loop_monitor
+
+
+def get_sampling_profiler() -> SamplingProfiler:
+
+    global _sampling_profiler
+    if _sampling_profiler is None:
+        _sampling_profiler = SamplingProfiler(max_duration=get_settings().profiler_max_duration_s)
+    return _sampling_profiler
+
+
+def get_memory_profiler() -> MemoryProfiler:
+
+    global _memory_profiler
+    if _memory_profiler is None:
+        _memory_profiler = MemoryProfiler()
+    return _memory_profiler
+
+
+def get_load_shedder() -> LoadShedder:
+
+    global _load_shedder
+    if _load_shedder is None:
+        settings = get_settings()
+        _load_shedder = LoadShedder(
+            get_loop_monitor(),
+            mongo_latency_threshold=settings.shed_mongo_latency_ms / 1000,
+            loop_lag_threshold=settings.shed_loop_lag_ms / 1000,
+        )
+    return _load_shedder
 
 
 def get_db_client() -> MongoClient:
@@ -18,31 +98,253 @@ def get_db_client() -> MongoClient:
     global _db_client
     if _db_client is None:
         settings = get_settings()
+        options = {}
+        if settings.mongodb_compressors:
+            options["compressors"] = settings.mongodb_compressors
         _db_client = MongoClient(
             settings.mongodb_url,
             UuidRepresentation="standard",
+            maxPoolSize=settings.mongodb_max_pool_size,
+            minPoolSize=settings.mongodb_min_pool_size,
+            connectTimeoutMS=settings.mongodb_connect_timeout_ms,
+            serverSelectionTimeoutMS=settings.mongodb_server_selection_timeout_ms,
+            socketTimeoutMS=settings.mongodb_socket_timeout_ms or None,
+            event_listeners=[get_load_shedder().mongo_listener],
+            **options,
+        )
+        logger.info(
+            f"MongoDB client initialized (pool {settings.mongodb_min_pool_size}-{settings.mongodb_max_pool_size}, "
+            f"secondary reads: {settings.mongodb_secondary_reads})"
         )
-        logger.info("MongoDB client initialized")
     return _db_client
 
 
+def warm_up_db_client(connections: int):
+    """Open ``connections`` pooled sockets up front so the first requests skip the handshake."""
+
+    db_client = get_db_client()
+    if connections <= 1:
+        db_client.admin.command('ping')
+        return
+
+    # A pooled socket is only created when every open one is busy, so the
+    # pings have to run concurrently.
+    with ThreadPoolExecutor(max_workers=connections) as executor:
+        list(executor.map(lambda _: db_client.admin.command('ping'), range(connections)))
+    logger.info(f"MongoDB pool warmed up with {connections} connections")
+
+
+def get_stale_read_preference() -> Optional[ReadPreference]:
+    """Read preference for reads that tolerate bounded staleness, or None to stay on the primary."""
+
+    settings = get_settings()
+    if not settings.mongodb_secondary_reads:
+        return None
+    return SecondaryPreferred(max_staleness=settings.mongodb_max_staleness_s)
+
+
+def uses_secondary_reads() -> bool:
+    """Whether list pages may come from a secondary, whose data can lag the version counters."""
+
+    return get_stale_read_preference() is not None
+
+
+def get_archive_after() -> Optional[timedelta]:
+    """Age after which finished orders are archived, or None when archival is disabled."""
+
+    days = get_settings().order_archive_after_days
+    return timedelta(days=days) if days > 0 else None
+
+
 def get_connection_manager() -> ConnectionManager:
 
     global _connection_manager
     if _connection_manager is None:
-        _connection_manager = ConnectionManager()
+        settings = get_settings()
+        _connection_manager = ConnectionManager(
+            event_log_size=settings.websocket_event_log_size,
+            coalesce_window=settings.websocket_coalesce_window_ms / 1000,
+            statistics_interval=settings.websocket_statistics_interval_ms / 1000,
+            heartbeat_interval=settings.websocket_heartbeat_interval_s,
+            idle_timeout=settings.websocket_idle_timeout_s,
+            max_connections=settings.websocket_max_connections,
+        )
         logger.info("WebSocket connection manager initialized")
     return _connection_manager
 
 
-def get_product_service(db_client: MongoClient = Depends(get_db_client)) -> ProductService:
+def get_rate_limiter() -> Union[RateLimiter, SharedRateLimiter]:
+
+    global _rate_limiter
+    if _rate_limiter is None:
+        settings = get_settings()
+        if settings.rate_limit_shared:
+            _rate_limiter = SharedRateLimiter(get_db_client(), database_name=settings.database_name)
+        else:
+            _rate_limiter = RateLimiter(max_keys=settings.rate_limit_max_keys)
+    return _rate_limiter
+
+
+def get_websocket_rate_limiter() -> RateLimiter:
+    """Limits WebSocket handshakes per client and role; always local to the worker."""
+
+    global _websocket_rate_limiter
+    if _websocket_rate_limiter is None:
+        _websocket_rate_limiter = RateLimiter(max_keys=get_settings().rate_limit_max_keys)
+    return _websocket_rate_limiter
 
-    return ProductService(db_client)
 
+def uses_memory_storage() -> bool:
 
-def get_order_service(
-    db_client: MongoClient = Depends(get_db_client),
-    product_service: ProductService = Depends(get_product_service)
-) -> OrderService:
+    return get_settings().storage_backend == "memory"
 
-    return OrderService(db_client, product_service)
+
+def get_outbox_service() -> Union[OutboxService, MemoryOutboxService]:
+
+    global _outbox_service
+    if _outbox_service is None:
+        if uses_memory_storage():
+            # Shares the counters, so the orders version still follows the outbox sequence.
+            _outbox_service = MemoryOutboxService(get_collection_versions().counters)
+        else:
+            _outbox_service = OutboxService(get_db_client(), database_name=get_settings().database_name)
+        logger.info("Outbox service initialized")
+    return _outbox_service
+
+
+def get_collection_versions() -> Union[CollectionVersions, MemoryCollectionVersions]:
+
+    global _collection_versions
+    if _collection_versions is None:
+        if uses_memory_storage():
+            _collection_versions = MemoryCollectionVersions()
+        else:
+            _collection_versions = CollectionVersions(get_db_client(), database_name=get_settings().database_name)
+    return _collection_versions
+
+
+def get_active_orders_board() -> ActiveOrdersBoard:
+
+    global _active_orders_board
+    if _active_orders_board is None:
+        _active_orders_board = ActiveOrdersBoard()
+        logger.info("Active orders board initialized")
+    return _active_orders_board
+
+
+def get_customer_service() -> Union[CustomerService, MemoryCustomerService]:
+
+    global _customer_service
+    if _customer_service is None:
+        settings = get_settings()
+        if uses_memory_storage():
+            _customer_service = MemoryCustomerService(recent_orders=settings.customer_recent_orders)
+        else:
+            _customer_service = CustomerService(
+                get_db_client(),
+                recent_orders=settings.customer_recent_orders,
+                database_name=settings.database_name,
+            )
+        logger.info("Customer service initialized")
+    return _customer_service
+
+
+def get_product_service() -> ProductService:
+
+    global _product_service
+    if _product_service is None:
+        settings = get_settings()
+        if uses_memory_storage():
+            repository = MemoryProductRepository()
+        else:
+            repository = MongoProductRepository(
+                get_db_client(),
+                stale_read_preference=get_stale_read_preference(),
+                database_name=settings.database_name,
+            )
+        _product_service = ProductService(
+            repository,
+            get_collection_versions(),
+            search_refresh_interval=settings.product_search_refresh_s,
+        )
+        logger.info("Product service initialized")
+    return _product_service
+
+
+def get_order_service() -> OrderService:
+
+    global _order_service
+    if _order_service is None:
+        settings = get_settings()
+        if uses_memory_storage():
+            repository = MemoryOrderRepository()
+        else:
+            repository = MongoOrderRepository(
+                get_db_client(),
+                stale_read_preference=get_stale_read_preference(),
+                archive_after=get_archive_after(),
+                database_name=settings.database_name,
+            )
+        _order_service = OrderService(
+            repository,
+            get_product_service(),
+            get_outbox_service(),
+            active_board=get_active_orders_board(),
+            customers=get_customer_service(),
+            insert_batch_delay=settings.order_insert_batch_ms / 1000,
+            insert_batch_size=settings.order_insert_batch_size,
+        )
+        logger.info("Order service initialized")
+    return _order_service
+
+
+def get_outbox_dispatcher() -> OutboxDispatcher:
+
+    global _outbox_dispatcher
+    if _outbox_dispatcher is None:
+        settings = get_settings()
+        _outbox_dispatcher = OutboxDispatcher(
+            outbox=get_outbox_service(),
+            connection_manager=get_connection_manager(),
+            order_service=get_order_service(),
+            # Each process fans out to its own sockets, so it needs its own offset.
+            consumer=settings.outbox_consumer_name or f"{socket.gethostname()}-{os.getpid()}",
+            batch_size=settings.outbox_batch_size,
+            poll_interval=settings.outbox_poll_interval_ms / 1000,
+            gap_timeout=settings.outbox_gap_timeout_s,
+        )
+        logger.info("Outbox dispatcher initialized")
+    return _outbox_dispatcher
+
+
+def get_idempotency_service() -> IdempotencyService:
+
+    global _idempotency_service
+    if _idempotency_service is None:
+        settings = get_settings()
+        _idempotency_service = IdempotencyService(
+            get_db_client(),
+            cache_size=settings.idempotency_cache_size,
+            ttl_seconds=settings.idempotency_ttl_hours * 3600,
+            lease_seconds=settings.idempotency_lease_s,
+            database_name=settings.database_name,
+        )
+        logger.info("Idempotency service initialized")
+    return _idempotency_service
+
+
+def get_order_archiver() -> OrderArchiver:
+
+    global _order_archiver
+    if _order_archiver is None:
+        settings = get_settings()
+        _order_archiver = OrderArchiver(
+            get_db_client(),
+            get_outbox_service(),
+            max_age=timedelta(days=settings.order_archive_after_days),
+            batch_size=settings.order_archive_batch_size,
+            interval=settings.order_archive_interval_s,
+            database_name=settings.database_name,
+        )
+        logger.info("Order archiver initialized")
+    return _order_archiver
@@ -1,5 +1,6 @@
 from datetime import datetime
 from typing import Optional, List
+from uuid import UUID
 from pydantic import BaseModel, Field
 
 from app.models.customer import Customer
@@ -61,3 +62,19 @@ class OrderStatusUpdate(BaseModel):
                 "status": "готов"
             }
         }
+
+
+class OrderStatusBulkUpdate(BaseModel):
+    order_ids: List[UUID] = Field(..., min_items=1, max_items=100, description="ID заказов")
+    status: OrderStatus = Field(..., description="Новый статус заказов")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "order_ids": [
+                    "550e8400-e29b-41d4-a716-446655440002",
+                    "550e8400-e29b-41d4-a716-446655440003"
+                ],
+                "status": "готов"
+            }
+        }
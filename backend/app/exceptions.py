@@ -18,3 +18,19 @@ class DatabaseError(BaseAppException):
 
 class ValidationError(BaseAppException):
     pass
+
+
+class ConcurrencyError(BaseAppException):
+    pass
+
+
+class IdempotencyConflictError(BaseAppException):
+    pass
+
+
+class IdempotencyKeyMismatchError(BaseAppException):
+    pass
+
+
+class CustomerNotFoundError(BaseAppException):
+    pass
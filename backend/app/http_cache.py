@@ -0,0 +1,81 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts) -> str:
+
+    digest = hashlib.blake2b("|".join(str(p) for p in parts).encode("utf-8"), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def version_etag(version: int) -> str:
+    return f'"v{version}"'
+
+
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """Expected document version from an If-Match header; None when absent or ``*``.
+
+    Raises ValueError for tags that were not issued by ``version_etag``.
+    """
+
+    if if_match is None or if_match.strip() == "*":
+        return None
+
+    tag = if_match.strip()
+    if tag.startswith("W/") or not (tag.startswith('"v') and tag.endswith('"')):
+        raise ValueError(f"Unsupported If-Match value: {if_match}")
+    return int(tag[2:-1])
+
+
+def http_date(value: datetime) -> str:
+
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """Evaluate If-None-Match, falling back to If-Modified-Since only when no ETag was sent."""
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in candidates or etag in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    return last_modified.replace(microsecond=0) <= since
+
+
+def has_validators(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def set_cache_headers(response: Response, etag: str, last_modified: Optional[datetime] = None):
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    if last_modified is not None:
+        response.headers["Last-Modified"] = http_date(last_modified)
+
+
+def not_modified_response(etag: str, last_modified: Optional[datetime] = None) -> Response:
+
+    response = Response(status_code=304)
+    set_cache_headers(response, etag, last_modified)
+    return response
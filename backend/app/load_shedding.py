@@ -0,0 +1,60 @@
+import logging
+from typing import Optional
+from pymongo import monitoring
+
+from app.loop_monitor import LoopMonitor
+
+logger = logging.getLogger(__name__)
+
+
+class MongoLatencyListener(monitoring.CommandListener):
+    """Keeps an exponentially weighted average of Mongo command round-trips."""
+
+    def __init__(self, alpha: float = 0.2):
+
+        self.alpha = alpha
+        self.latency = 0.0
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        self._observe(event.duration_micros / 1e6)
+
+    def _observe(self, duration: float):
+        self.latency += self.alpha * (duration - self.latency)
+
+
+class LoadShedder:
+    """Decides when the service is too slow to take more work.
+
+    Two signals are watched: the average Mongo round-trip, fed by a command
+    listener on the client, and the event loop lag reported by the loop
+    monitor. Either one over its threshold means requests would mostly
+    queue, so they are better refused early. A threshold of 0 disables that
+    signal. The outbox dispatcher keeps polling while requests are shed, so
+    the Mongo average keeps moving and recovers on its own.
+    """
+
+    def __init__(
+        self,
+        loop_monitor: LoopMonitor,
+        mongo_latency_threshold: float = 0.0,
+        loop_lag_threshold: float = 0.0
+    ):
+
+        self.mongo_listener = MongoLatencyListener()
+        self.loop_monitor = loop_monitor
+        self.mongo_latency_threshold = mongo_latency_threshold
+        self.loop_lag_threshold = loop_lag_threshold
+
+    def overloaded(self) -> Optional[str]:
+
+        if self.mongo_latency_threshold > 0 and self.mongo_listener.latency > self.mongo_latency_threshold:
+            return f"MongoDB latency {self.mongo_listener.latency * 1000:.0f}ms"
+        if self.loop_lag_threshold > 0 and self.loop_monitor.lag > self.loop_lag_threshold:
+            return f"event loop lag {self.loop_monitor.lag * 1000:.0f}ms"
+        return None
@@ -4,8 +4,16 @@ from pathlib import Path
 
 from app.settings import get_settings
 
+_configured = False
+
+
 def setup_logging():
 
+    global _configured
+    if _configured:
+        return
+    _configured = True
+
     settings = get_settings()
 
     log_dir = Path("logs")
@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVICES_DIR = os.path.join(APP_DIR, "services")
+
+# Locals that name the query a service method is running.
+QUERY_LOCALS = ("filter_query", "pipeline", "query", "requests")
+
+
+class LoopMonitor:
+    """Measures event loop lag and finds out what blocks the loop.
+
+    A probe task sleeps for ``interval`` and records how late it wakes up. A
+    watchdog thread checks that the probe keeps running; when the loop has
+    been stuck for longer than ``block_threshold`` it grabs the loop thread's
+    stack while the blocking call is still on it. Stalls are grouped by the
+    innermost service method on the stack (or the innermost app frame), with
+    the query that method was running, so the worst blockers can be listed.
+    """
+
+    def __init__(self, interval: float = 0.1, block_threshold: float = 0.1, max_blockers: int = 200):
+
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.max_blockers = max_blockers
+
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.blocked_seconds = 0.0
+        self.blockers: Dict[str, dict] = {}
+
+        self._beat = time.monotonic()
+        self._captured_beat: Optional[float] = None
+        self._captured: Optional[dict] = None
+        self._lock = threading.Lock()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self):
+
+        if self._task is not None:
+            return
+
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._probe())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(f"Event loop monitor started: interval {self.interval}s, block threshold {self.block_threshold}s")
+
+    async def stop(self):
+
+        if self._task is None:
+            return
+
+        self._stopped.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._watchdog = None
+
+    def top_blockers(self, limit: int = 20) -> List[dict]:
+
+        with self._lock:
+            blockers = sorted(self.blockers.values(), key=lambda b: b["blocked_seconds"], reverse=True)
+            return [dict(b) for b in blockers[:limit]]
+
+    async def _probe(self):
+
+        while True:
+            self._beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - self._beat - self.interval)
+
+            # Rise at once, decay gradually, so one quiet tick does not hide a stalling loop.
+            self.lag = max(lag, self.lag * 0.8)
+            self.max_lag = max(self.max_lag, lag)
+
+            if lag >= self.block_threshold:
+                self._record_stall(lag)
+
+    def _record_stall(self, lag: float):
+
+        with self._lock:
+            captured, self._captured = self._captured, None
+            self.stalls += 1
+            self.blocked_seconds += lag
+
+            site = captured["site"] if captured else "unattributed"
+            blocker = self.blockers.get(site)
+            if blocker is None:
+                if len(self.blockers) >= self.max_blockers:
+                    return
+                blocker = {"site": site, "count": 0, "blocked_seconds": 0.0, "max_seconds": 0.0}
+                self.blockers[site] = blocker
+
+            blocker["count"] += 1
+            blocker["blocked_seconds"] += lag
+            blocker["max_seconds"] = max(blocker["max_seconds"], lag)
+            if captured:
+                blocker["query"] = captured["query"]
+                blocker["stack"] = captured["stack"]
+
+        if lag >= self.block_threshold * 10:
+            logger.warning(f"Event loop blocked for {lag * 1000:.0f}ms in {site}")
+
+    def _watch(self):
+
+        check_interval = max(self.block_threshold / 2, 0.01)
+        while not self._stopped.wait(check_interval):
+            beat = self._beat
+            if time.monotonic() - beat < self.interval + self.block_threshold or self._captured_beat == beat:
+                continue
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+
+            captured = self._capture(frame)
+            with self._lock:
+                self._captured_beat = beat
+                self._captured = captured
+
+    @staticmethod
+    def _capture(frame) -> dict:
+
+        app_frame = None
+        service_frame = None
+        f = frame
+        while f is not None:
+            filename = os.path.abspath(f.f_code.co_filename)
+            if filename.startswith(APP_DIR):
+                app_frame = app_frame or f
+                if filename.startswith(SERVICES_DIR):
+                    service_frame = f
+                    break
+            f = f.f_back
+
+        site_frame = service_frame or app_frame or frame
+        module = os.path.relpath(site_frame.f_code.co_filename, os.path.dirname(APP_DIR))
+        site = f"{module}:{site_frame.f_code.co_name}"
+
+        query = None
+        for name in QUERY_LOCALS:
+            value = site_frame.f_locals.get(name)
+            if value is not None:
+                query = repr(value)[:500]
+                break
+
+        stack = traceback.format_list(traceback.extract_stack(frame)[-15:])
+        return {"site": site, "query": query, "stack": [line.rstrip() for line in stack]}
@@ -1,33 +1,183 @@
+import time
+
+_import_started = time.perf_counter()
+
+import asyncio
 import logging
-from contextlib import asynccontextmanager
+from functools import partial
+from contextlib import asynccontextmanager, contextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
 from app.settings import get_settings
 from app.logging_config import setup_logging
-from app.dependencies import get_db_client, get_connection_manager
-
-from app.apis import products, orders
+from app.rate_limit import AdmissionMiddleware
+from app.metrics import MetricsServer
+from app.dependencies import (
+    get_db_client,
+    uses_memory_storage,
+    get_load_shedder,
+    get_loop_monitor,
+    get_rate_limiter,
+    warm_up_db_client,
+    get_connection_manager,
+    get_outbox_service,
+    get_outbox_dispatcher,
+    get_idempotency_service,
+    get_order_archiver,
+    get_active_orders_board,
+    get_product_service,
+    get_order_service,
+    get_collection_versions,
+)
+
+from app.apis import products, orders, menu, customers, admin
 from app.websocket import endpoints as ws_endpoints
 
-setup_logging()
 logger = logging.getLogger(__name__)
 
+IMPORT_SECONDS = time.perf_counter() - _import_started
+
+
+@contextmanager
+def timed(timings: dict, phase: str):
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[phase] = round((time.perf_counter() - started) * 1000, 1)
+
+
+async def drain_application():
+    """First phase of shutdown, run while the server still holds its connections.
+
+    New sockets are refused, committed outbox events are delivered, and every
+    client gets a reconnect hint with its own random delay before the socket
+    is closed with 1012.
+    """
+
+    settings = get_settings()
+    connection_manager = get_connection_manager()
+    if connection_manager.draining:
+        return
+
+    logger.info("Draining application...")
+
+    async def drain():
+        await get_outbox_dispatcher().drain()
+        await connection_manager.drain(settings.websocket_reconnect_window_s)
+
+    try:
+        await asyncio.wait_for(drain(), timeout=settings.shutdown_drain_timeout_s)
+    except asyncio.TimeoutError:
+        logger.warning(f"Drain did not finish within {settings.shutdown_drain_timeout_s}s")
+
+
+async def backfill_customer_profiles(customer_service, order_service):
+    """Add the orders placed before customer profiles existed, off the event loop."""
+
+    started = time.perf_counter()
+    try:
+        recorded = await asyncio.get_running_loop().run_in_executor(
+            None, customer_service.backfill, order_service.iter_orders()
+        )
+    except Exception as e:
+        logger.error(f"Customer profile backfill failed: {e}")
+        return
+
+    if recorded:
+        logger.info(f"Customer profiles built from {recorded} existing orders in {time.perf_counter() - started:.1f}s")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting application...")
 
+    started = time.perf_counter()
+    timings = app.state.startup_timings
+    order_archiver = None
+    customer_backfill = None
+    metrics_server = None
+    db_client = None
     try:
 
-        db_client = get_db_client()
-        db_client.admin.command('ping')
-        logger.info("MongoDB connection established")
+        settings = get_settings()
+
+        if not uses_memory_storage():
+            with timed(timings, "mongodb"):
+                db_client = get_db_client()
+                warm_up_db_client(settings.mongodb_warmup_connections)
+                get_outbox_service().require_transactions()
+                logger.info("MongoDB connection established")
+
 
+        get_loop_monitor().start()
+        if settings.rate_limit_enabled and settings.rate_limit_shared:
+            get_rate_limiter().ensure_indexes()
 
         connection_manager = get_connection_manager()
+        connection_manager.start_heartbeat()
         logger.info("WebSocket connection manager initialized")
 
+        # Services are application-scoped: built once here, then shared by every request.
+        with timed(timings, "indexes_and_migrations"):
+            product_service = get_product_service()
+            product_service.repository.ensure_indexes()
+            product_service.repository.migrate()
+            order_service = get_order_service()
+            order_service.repository.ensure_indexes()
+            order_service.repository.migrate()
+            customer_service = order_service.customers
+            if customer_service is not None:
+                customer_service.ensure_indexes()
+                if db_client is None:
+                    # The memory store starts empty: only the mark is set.
+                    customer_service.backfill(order_service.iter_orders())
+                else:
+                    # Fixes the mark before this worker records any order;
+                    # the backfill runs once the application serves requests.
+                    customer_service.start_backfill()
+            get_collection_versions()
+
+            get_outbox_service().ensure_indexes(settings.outbox_retention_hours * 3600)
+            if db_client is not None:
+                get_idempotency_service().ensure_indexes()
+
+        with timed(timings, "product_search_index"):
+            await product_service.refresh_search_index()
+
+        with timed(timings, "active_orders_board"):
+            active_board = get_active_orders_board()
+            watermark = await get_outbox_service().latest_sequence()
+            active_board.rebuild(await order_service.get_active_orders(), watermark)
+
+        with timed(timings, "outbox_dispatcher"):
+            outbox_dispatcher = get_outbox_dispatcher()
+            outbox_dispatcher.add_handler(partial(active_board.sync, load_order=order_service.get_order))
+            await outbox_dispatcher.start()
+
+        if customer_service is not None and db_client is not None:
+            customer_backfill = asyncio.create_task(backfill_customer_profiles(customer_service, order_service))
+
+        if settings.order_archive_after_days > 0 and db_client is not None:
+            order_archiver = get_order_archiver()
+            order_archiver.ensure_indexes()
+            order_archiver.start()
+
+        if settings.enable_metrics:
+            metrics_server = MetricsServer(settings.api_host, settings.metrics_port)
+            await metrics_server.start()
+
+        # Build the OpenAPI schema now rather than on the first /docs or
+        # /openapi.json request; FastAPI caches it on the app.
+        with timed(timings, "openapi"):
+            app.openapi()
+
+        timings["lifespan"] = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(f"Application started in {timings['lifespan']}ms: {timings}")
+
         yield
 
     except Exception as e:
@@ -38,14 +188,34 @@ async def lifespan(app: FastAPI):
 
         logger.info("Shutting down application...")
 
-        try:
-            db_client.close()
-            logger.info("MongoDB connection closed")
-        except:
-            pass
+        await drain_application()
+        if metrics_server is not None:
+            await metrics_server.stop()
+        if order_archiver is not None:
+            await order_archiver.stop()
+        if customer_backfill is not None:
+            # An interrupted backfill is resumed by the next worker to start
+            # once its lease runs out.
+            customer_backfill.cancel()
+            try:
+                await customer_backfill
+            except asyncio.CancelledError:
+                pass
+        await get_outbox_dispatcher().stop()
+        await get_connection_manager().stop_heartbeat()
+        await get_loop_monitor().stop()
+
+        if db_client is not None:
+            try:
+                db_client.close()
+                logger.info("MongoDB connection closed")
+            except Exception as e:
+                logger.warning(f"Error closing MongoDB connection: {e}")
 
 def create_app() -> FastAPI:
 
+    started = time.perf_counter()
+    setup_logging()
     settings = get_settings()
 
     app = FastAPI(
@@ -57,6 +227,17 @@ def create_app() -> FastAPI:
         redoc_url="/redoc" if settings.debug else None
     )
 
+    app.add_middleware(
+        AdmissionMiddleware,
+        limiter=get_rate_limiter() if settings.rate_limit_enabled else None,
+        shedder=get_load_shedder(),
+        default_limit=tuple(settings.rate_limit_default),
+        route_limits=settings.rate_limit_routes,
+        # Diagnostics must stay reachable while the service is overloaded.
+        exempt_prefixes=("/api/v1/admin/",),
+        trusted_proxies=settings.rate_limit_trusted_proxies,
+    )
+
     app.add_middleware(
         CORSMiddleware,
         allow_origins=settings.cors_origins,
@@ -67,6 +248,9 @@ def create_app() -> FastAPI:
 
     app.include_router(products.router, prefix="/api/v1")
     app.include_router(orders.router, prefix="/api/v1")
+    app.include_router(menu.router, prefix="/api/v1")
+    app.include_router(customers.router, prefix="/api/v1")
+    app.include_router(admin.router, prefix="/api/v1")
 
     app.include_router(ws_endpoints.router)
 
@@ -94,13 +278,25 @@ def create_app() -> FastAPI:
             "status": "running"
         }
 
+    @app.get("/health")
+    async def health():
+        # Liveness only: answers as soon as the process serves requests.
+        return {"status": "ok"}
+
     @app.get("/ready")
     async def ready():
 
+        if get_connection_manager().draining:
+            return JSONResponse(
+                status_code=503,
+                content={"status": "not ready", "error": "Application is shutting down"}
+            )
+
         try:
 
-            db_client = get_db_client()
-            db_client.admin.command('ping')
+            if not uses_memory_storage():
+                db_client = get_db_client()
+                db_client.admin.command('ping')
 
             return {"status": "ready", "message": "Application is ready to serve requests"}
         except Exception as e:
@@ -110,11 +306,24 @@ def create_app() -> FastAPI:
                 content={"status": "not ready", "error": str(e)}
             )
 
+    app.state.startup_timings = {
+        "imports": round(IMPORT_SECONDS * 1000, 1),
+        "create_app": round((time.perf_counter() - started) * 1000, 1),
+    }
+
     logger.info("FastAPI application created successfully")
     return app
 
 
-app = create_app()
+def __getattr__(name: str):
+    # ``app`` is built on first access, so importing this module stays cheap and
+    # side-effect free; ``uvicorn app.main:app`` still works.
+
+    if name == "app":
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == "__main__":
@@ -128,4 +337,5 @@ if __name__ == "__main__":
         port=settings.api_port,
         reload=settings.debug,
         log_config=None,
+        ws_per_message_deflate=settings.websocket_per_message_deflate,
     )
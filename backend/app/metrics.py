@@ -0,0 +1,90 @@
+import asyncio
+import logging
+from typing import Optional
+
+from app.dependencies import get_load_shedder, get_loop_monitor, get_order_service
+
+logger = logging.getLogger(__name__)
+
+
+def render_metrics() -> str:
+
+    monitor = get_loop_monitor()
+    shedder = get_load_shedder()
+    batcher = get_order_service().insert_batcher
+    batches = (
+        "# TYPE order_insert_batches_total counter\n"
+        f"order_insert_batches_total {batcher.batches}\n"
+        "# TYPE order_insert_batched_total counter\n"
+        f"order_insert_batched_total {batcher.items}\n"
+    ) if batcher is not None else ""
+    return (
+        "# TYPE event_loop_lag_seconds gauge\n"
+        f"event_loop_lag_seconds {monitor.lag:.6f}\n"
+        "# TYPE event_loop_max_lag_seconds gauge\n"
+        f"event_loop_max_lag_seconds {monitor.max_lag:.6f}\n"
+        "# TYPE event_loop_stalls_total counter\n"
+        f"event_loop_stalls_total {monitor.stalls}\n"
+        "# TYPE event_loop_blocked_seconds_total counter\n"
+        f"event_loop_blocked_seconds_total {monitor.blocked_seconds:.6f}\n"
+        "# TYPE mongodb_command_latency_seconds gauge\n"
+        f"mongodb_command_latency_seconds {shedder.mongo_listener.latency:.6f}\n"
+        + batches
+    )
+
+
+class MetricsServer:
+    """Serves ``GET /metrics`` on its own port, away from the public API.
+
+    The handler only formats in-process counters, so a bare asyncio server
+    is enough. With several workers only the first one to bind the port
+    serves it; the others log a warning and go without.
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+
+        try:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+            logger.info(f"Metrics served on {self.host}:{self.port}")
+        except OSError as e:
+            logger.warning(f"Metrics port {self.port} unavailable, metrics not served: {e}")
+
+    async def stop(self):
+
+        if self._server is None:
+            return
+
+        self._server.close()
+        await self._server.wait_closed()
+        self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Request headers are read and ignored.
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+                pass
+
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", render_metrics().encode("utf-8")
+            else:
+                status, body = "404 Not Found", b"Not Found\n"
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+        except Exception as e:
+            logger.debug(f"Metrics request failed: {e}")
+        finally:
+            writer.close()
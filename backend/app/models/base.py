@@ -8,6 +8,7 @@ class BaseDocument(BaseModel):
     id: UUID = Field(default_factory=uuid4, alias="_id")
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+    version: int = Field(default=1, ge=1, description="Версия документа, растёт при каждом изменении")
 
     class Config:
         populate_by_name = True
@@ -1,4 +1,6 @@
-from typing import Optional
+from datetime import datetime
+from typing import List, Optional
+from uuid import UUID
 from pydantic import BaseModel, Field
 
 
@@ -18,3 +20,22 @@ class Customer(BaseModel):
                 "address": "г. Ташкент, ул. Навои 15"
             }
         }
+
+
+class CustomerProfile(BaseModel):
+    """Running totals for everyone ordering with the same phone (or email when there is no phone)."""
+
+    id: str = Field(..., alias="_id", description="Нормализованный телефон или email")
+    name: str = Field(..., description="Имя из последнего заказа")
+    phone: Optional[str] = Field(None, description="Телефон клиента")
+    email: Optional[str] = Field(None, description="Email клиента")
+    address: Optional[str] = Field(None, description="Последний известный адрес")
+    order_count: int = Field(0, description="Количество заказов")
+    cancelled_count: int = Field(0, description="Количество отменённых заказов")
+    total_spent: float = Field(0.0, description="Сумма заказов без отменённых")
+    recent_order_ids: List[UUID] = Field(default_factory=list, description="Последние заказы, от старых к новым")
+    first_order_at: Optional[datetime] = Field(None, description="Время первого заказа")
+    last_order_at: Optional[datetime] = Field(None, description="Время последнего заказа")
+
+    class Config:
+        populate_by_name = True
@@ -7,6 +7,7 @@ class OrderItem(BaseModel):
 
     id: UUID = Field(..., description="ID товара")
     name: str = Field(..., description="Название товара на момент заказа")
+    category: Optional[str] = Field(None, description="Категория товара на момент заказа")
     quantity: int = Field(..., ge=1, description="Количество")
     price: float = Field(..., ge=0, description="Цена за единицу на момент заказа")
     total_price: float = Field(..., ge=0, description="Общая стоимость позиции")
@@ -22,6 +23,7 @@ class OrderItem(BaseModel):
             "example": {
                 "id": "550e8400-e29b-41d4-a716-446655440001",
                 "name": "Пицца Маргарита",
+                "category": "Пицца",
                 "quantity": 2,
                 "price": 450.0,
                 "total_price": 900.0,
@@ -0,0 +1,178 @@
+import gc
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _frame_label(code) -> str:
+
+    filename = code.co_filename
+    if filename.startswith(APP_ROOT):
+        filename = os.path.relpath(filename, APP_ROOT)
+    else:
+        filename = os.path.basename(filename)
+    return f"{code.co_name} ({filename})"
+
+
+class SamplingProfiler:
+    """Statistical CPU profiler for a running worker.
+
+    A background thread reads the target thread's current stack every
+    ``interval`` seconds and counts identical stacks, so the cost is one
+    stack walk per sample and nothing is hooked into the profiled code. The
+    result is in the collapsed format read by flamegraph.pl and speedscope.
+    Only one profile runs at a time.
+    """
+
+    def __init__(self, max_duration: float = 60.0):
+
+        self.max_duration = max_duration
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def profile(self, thread_id: int, duration: float, interval: float = 0.005) -> Counter:
+        """Sample ``thread_id`` for ``duration`` seconds; blocks, so run it in an executor."""
+
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+
+        try:
+            duration = min(duration, self.max_duration)
+            stacks: Counter = Counter()
+            labels: Dict[object, str] = {}
+            deadline = time.monotonic() + duration
+
+            while time.monotonic() < deadline:
+                frame = sys._current_frames().get(thread_id)
+                if frame is not None:
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        label = labels.get(code)
+                        if label is None:
+                            label = labels[code] = _frame_label(code)
+                        stack.append(label)
+                        frame = frame.f_back
+                    stacks[";".join(reversed(stack))] += 1
+                time.sleep(interval)
+
+            logger.info(f"Sampling profile finished: {sum(stacks.values())} samples over {duration}s")
+            return stacks
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def collapsed(stacks: Counter) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+    @staticmethod
+    def top_functions(stacks: Counter, limit: int = 30) -> List[dict]:
+
+        total = sum(stacks.values()) or 1
+        own: Counter = Counter()
+        inclusive: Counter = Counter()
+        for stack, count in stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for label in set(frames):
+                inclusive[label] += count
+
+        return [
+            {
+                "function": label,
+                "own_percent": round(own[label] * 100 / total, 2),
+                "total_percent": round(inclusive[label] * 100 / total, 2)
+            }
+            for label, _ in inclusive.most_common(limit)
+        ]
+
+
+class MemoryProfiler:
+    """tracemalloc snapshots diffed against a baseline, plus sizes of the in-process caches.
+
+    Tracing slows allocations down noticeably, so it only runs between
+    ``start`` and ``stop``. Those, ``diff`` and ``count_instances`` block for
+    as long as the heap is large, so run them in an executor.
+    """
+
+    def __init__(self, frames: int = 10):
+
+        self.frames = frames
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._baseline_sizes: Dict[str, int] = {}
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, sizes: Dict[str, int]):
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        self._baseline = self._take_snapshot()
+        self._baseline_sizes = dict(sizes)
+        logger.info("Memory tracing started")
+
+    def stop(self):
+
+        tracemalloc.stop()
+        self._baseline = None
+        self._baseline_sizes = {}
+        logger.info("Memory tracing stopped")
+
+    def diff(self, sizes: Dict[str, int], limit: int = 30, group_by: str = "lineno") -> dict:
+
+        if self._baseline is None:
+            raise RuntimeError("Memory tracing is not started")
+
+        snapshot = self._take_snapshot()
+        stats = snapshot.compare_to(self._baseline, group_by)
+        current, peak = tracemalloc.get_traced_memory()
+
+        return {
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "top": [
+                {
+                    "location": str(stat.traceback[0]) if stat.traceback else "",
+                    "size_diff_bytes": stat.size_diff,
+                    "size_bytes": stat.size,
+                    "count_diff": stat.count_diff
+                }
+                for stat in stats[:limit]
+            ],
+            "structures": {
+                name: {"size": size, "diff": size - self._baseline_sizes.get(name, 0)}
+                for name, size in sizes.items()
+            }
+        }
+
+    @staticmethod
+    def count_instances(types: tuple) -> Dict[str, int]:
+        """Live instances of ``types`` and their subclasses; walks the whole heap."""
+
+        counts: Counter = Counter()
+        for obj in gc.get_objects():
+            if isinstance(obj, types):
+                counts[type(obj).__name__] += 1
+        return dict(counts)
+
+    @staticmethod
+    def _take_snapshot() -> tracemalloc.Snapshot:
+
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
@@ -0,0 +1,210 @@
+import json
+import logging
+import math
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Sequence, Tuple
+from uuid import UUID
+from pymongo import ASCENDING, MongoClient, ReturnDocument
+from pymongo.errors import PyMongoError
+
+from app.load_shedding import LoadShedder
+
+logger = logging.getLogger(__name__)
+
+# (tokens per second, burst)
+Limit = Tuple[float, float]
+
+
+class TokenBucket:
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, cost: float = 1.0) -> float:
+        """Spend ``cost`` tokens; returns 0 on success or the seconds until they are available."""
+
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+
+class RateLimiter:
+    """Token buckets per key in a bounded LRU.
+
+    Memory is one small bucket per recently active key. When the table is
+    full the least recently used bucket is dropped; that key starts again
+    with a full bucket, which errs on the side of letting clients through.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+
+        self.max_keys = max_keys
+        self.buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def hit(self, key: str, limit: Limit, cost: float = 1.0) -> float:
+
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(*limit)
+            self.buckets[key] = bucket
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+
+        return bucket.take(cost)
+
+
+class SharedRateLimiter:
+    """Limits shared by all workers through fixed windows counted in Mongo.
+
+    Each window lasts ``burst / rate`` seconds and admits ``burst`` requests,
+    which matches the long-run rate of the local token bucket but not its
+    smoothing. Every request costs a Mongo round-trip; if Mongo fails the
+    request is allowed.
+    """
+
+    def __init__(self, db_client: MongoClient, database_name: str = "restaurant_db"):
+
+        self.db = db_client[database_name]
+        self.collection = self.db.rate_limits
+
+    def ensure_indexes(self):
+
+        self.collection.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+
+    def hit(self, key: str, limit: Limit, cost: float = 1.0) -> float:
+
+        rate, burst = limit
+        window = max(burst / rate, 1.0) if rate > 0 else 3600.0
+        now = time.time()
+        window_start = now - now % window
+
+        try:
+            counter = self.collection.find_one_and_update(
+                {"_id": f"{key}:{int(window_start)}"},
+                {
+                    "$inc": {"count": cost},
+                    "$setOnInsert": {"expires_at": datetime.utcnow() + timedelta(seconds=window * 2)}
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except PyMongoError as e:
+            logger.warning(f"Shared rate limit unavailable, allowing request: {e}")
+            return 0.0
+
+        if counter["count"] <= burst:
+            return 0.0
+        return window_start + window - now
+
+
+def route_key(method: str, path: str) -> str:
+    """``GET /api/v1/orders/{id}`` style key with id segments folded together."""
+
+    segments = []
+    for segment in path.rstrip("/").split("/"):
+        try:
+            UUID(segment)
+            segments.append("{id}")
+        except ValueError:
+            segments.append(segment)
+    return f"{method} {'/'.join(segments) or '/'}"
+
+
+def client_address(scope, trusted_proxies: Sequence[str] = ()) -> str:
+    """Address of the client behind ``scope``.
+
+    When the peer is one of ``trusted_proxies``, the address is taken from
+    X-Forwarded-For: the rightmost entry not added by a trusted proxy, since
+    anything left of it can be set by the client.
+    """
+
+    client = scope.get("client")
+    address = client[0] if client else "unknown"
+    if address not in trusted_proxies:
+        return address
+
+    for name, value in scope.get("headers", []):
+        if name == b"x-forwarded-for":
+            for hop in reversed(value.decode("latin-1").split(",")):
+                hop = hop.strip()
+                if hop and hop not in trusted_proxies:
+                    return hop
+    return address
+
+
+class AdmissionMiddleware:
+    """Rejects API requests over their client's rate (429) or while the service is overloaded (503)."""
+
+    def __init__(
+        self,
+        app,
+        limiter,
+        shedder: LoadShedder,
+        default_limit: Limit,
+        route_limits: Optional[Dict[str, Sequence[float]]] = None,
+        path_prefix: str = "/api/",
+        exempt_prefixes: Sequence[str] = (),
+        trusted_proxies: Sequence[str] = ()
+    ):
+        self.app = app
+        self.limiter = limiter
+        self.shedder = shedder
+        self.default_limit = default_limit
+        self.route_limits = {route: tuple(limit) for route, limit in (route_limits or {}).items()}
+        self.path_prefix = path_prefix
+        self.exempt_prefixes = tuple(exempt_prefixes)
+        self.trusted_proxies = tuple(trusted_proxies)
+
+    async def __call__(self, scope, receive, send):
+
+        path = scope["path"] if scope["type"] == "http" else ""
+        if not path.startswith(self.path_prefix) or path.startswith(self.exempt_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        reason = self.shedder.overloaded()
+        if reason is not None:
+            logger.debug(f"Shedding {scope['method']} {scope['path']}: {reason}")
+            await self._reject(send, 503, "Service overloaded, retry later", 1)
+            return
+
+        if self.limiter is not None:
+            route = route_key(scope["method"], scope["path"])
+            key = f"{client_address(scope, self.trusted_proxies)}|{route}"
+
+            retry_after = self.limiter.hit(key, self.route_limits.get(route, self.default_limit))
+            if retry_after > 0:
+                await self._reject(send, 429, "Too many requests", retry_after)
+                return
+
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    async def _reject(send, status_code: int, error: str, retry_after: float):
+
+        body = json.dumps({"error": error, "success": False}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(min(retry_after, 3600)))).encode()),
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,32 @@
+from typing import List
+from pydantic import BaseModel
+
+from app.models.customer import CustomerProfile
+from app.responses.order import OrderResponse
+
+
+class CustomerResponse(CustomerProfile):
+
+    class Config:
+        from_attributes = True
+        json_schema_extra = {
+            "example": {
+                "_id": "phone:+998901234567",
+                "name": "Иван Петров",
+                "phone": "+998901234567",
+                "email": "ivan.petrov@example.com",
+                "address": "г. Ташкент, ул. Навои 15",
+                "order_count": 12,
+                "cancelled_count": 1,
+                "total_spent": 10450.0,
+                "recent_order_ids": ["550e8400-e29b-41d4-a716-446655440002"],
+                "first_order_at": "2024-01-01T12:00:00",
+                "last_order_at": "2024-03-01T19:30:00"
+            }
+        }
+
+
+class CustomerOrdersResponse(BaseModel):
+
+    customer: CustomerResponse
+    orders: List[OrderResponse]
@@ -0,0 +1,16 @@
+from typing import List
+from pydantic import BaseModel, Field
+
+from app.responses.product import ProductResponse
+
+
+class MenuCategoryResponse(BaseModel):
+
+    name: str = Field(..., description="Категория")
+    products: List[ProductResponse]
+
+
+class MenuResponse(BaseModel):
+
+    categories: List[MenuCategoryResponse]
+    total: int = Field(..., description="Количество доступных товаров")
@@ -1,5 +1,5 @@
 from uuid import UUID
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 from pydantic import BaseModel, Field
 
@@ -21,11 +21,18 @@ class OrderResponse(Order):
     delivery_time: Optional[datetime]
     created_at: datetime
     updated_at: datetime
+    version: int
 
     class Config:
         from_attributes = True
 
 
+class ActiveOrdersResponse(BaseModel):
+
+    orders: List[OrderResponse]
+    counts: Dict[str, int] = Field(..., description="Количество активных заказов по статусам")
+
+
 class OrderListResponse(BaseModel):
 
     orders: List[OrderResponse]
@@ -64,3 +71,17 @@ class OrderListResponse(BaseModel):
                 "limit": 10
             }
         }
+
+
+class OrderStatusBulkResult(BaseModel):
+
+    order_id: UUID
+    success: bool = Field(..., description="Статус успеха")
+    order: Optional[OrderResponse] = Field(None, description="Заказ после изменения")
+    error: Optional[str] = Field(None, description="Причина, по которой заказ не изменён")
+
+
+class OrderStatusBulkResponse(BaseModel):
+
+    results: List[OrderStatusBulkResult]
+    updated: int = Field(..., description="Количество изменённых заказов")
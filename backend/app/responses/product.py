@@ -16,6 +16,7 @@ class ProductResponse(Product):
     description: Optional[str]
     created_at: datetime
     updated_at: datetime
+    version: int
 
     class Config:
         from_attributes = True
@@ -46,4 +47,9 @@ class ProductListResponse(BaseModel):
                 "page": 1,
                 "limit": 10
             }
-        }
\ No newline at end of file
+        }
+
+class ProductSearchResponse(BaseModel):
+
+    products: List[ProductResponse]
+    query: str = Field(..., description="Поисковый запрос")
@@ -0,0 +1,40 @@
+from typing import List, Optional
+import socket
+
+import uvicorn
+
+from app.settings import get_settings
+
+
+class DrainingServer(uvicorn.Server):
+    """Uvicorn server that drains the application before dropping its connections.
+
+    Uvicorn closes every open WebSocket before it runs the lifespan shutdown,
+    so the drain has to start here to still reach the clients.
+    """
+
+    async def shutdown(self, sockets: Optional[List[socket.socket]] = None):
+
+        from app.main import drain_application
+
+        await drain_application()
+        await super().shutdown(sockets=sockets)
+
+
+def run():
+
+    settings = get_settings()
+
+    config = uvicorn.Config(
+        "app.main:create_app",
+        factory=True,
+        host=settings.api_host,
+        port=settings.api_port,
+        log_config=None,
+        ws_per_message_deflate=settings.websocket_per_message_deflate,
+    )
+    DrainingServer(config).run()
+
+
+if __name__ == "__main__":
+    run()
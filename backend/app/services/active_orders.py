@@ -0,0 +1,134 @@
+import logging
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from app.models.order import Order, OrderStatus
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = [OrderStatus.NEW, OrderStatus.CONFIRMED, OrderStatus.PREPARING, OrderStatus.READY]
+
+
+class ActiveOrdersBoard:
+    """In-memory view of the orders the kitchen works on, oldest first per status.
+
+    The board is rebuilt from Mongo at startup and then kept current by the
+    local writes and by the outbox events of every worker. Changes are applied
+    only when they carry a newer order version than the board has seen, so
+    the same change arriving twice, or out of order, is harmless. Orders that
+    left the board are remembered for a while for the same reason.
+    """
+
+    _RETIRED_SIZE = 10000
+
+    def __init__(self):
+
+        self.orders: Dict[str, Order] = {}
+        self._by_status: Dict[str, List[Tuple[datetime, str]]] = {status.value: [] for status in ACTIVE_STATUSES}
+        self._retired: OrderedDict = OrderedDict()
+        self.watermark = 0
+
+    def __len__(self) -> int:
+        return len(self.orders)
+
+    def rebuild(self, orders: List[Order], watermark: int):
+        """Replace the board with ``orders``, read after outbox sequence ``watermark`` was issued."""
+
+        self.orders.clear()
+        self._retired.clear()
+        for entries in self._by_status.values():
+            entries.clear()
+
+        for order in orders:
+            self.apply(order)
+
+        self.watermark = watermark
+        logger.info(f"Active orders board rebuilt with {len(self.orders)} orders at outbox sequence {watermark}")
+
+    def known_version(self, order_id: str) -> Optional[int]:
+
+        order = self.orders.get(order_id)
+        if order is not None:
+            return order.version
+        return self._retired.get(order_id)
+
+    def apply(self, order: Order) -> bool:
+
+        order_id = str(order.id)
+        known = self.known_version(order_id)
+        if known is not None and known >= order.version:
+            return False
+
+        self._discard(order_id)
+
+        if order.status in ACTIVE_STATUSES:
+            self.orders[order_id] = order
+            insort(self._by_status[order.status.value], (order.created_at, order_id))
+        else:
+            self._retire(order_id, order.version)
+        return True
+
+    async def sync(self, events: List[dict], load_order: Callable[[UUID], Awaitable[Order]]):
+        """Apply outbox events from any worker.
+
+        Events issued before the rebuild may describe an older state than the
+        board was built from, e.g. when a worker replays its backlog after a
+        restart, so for those the current order is loaded instead.
+        """
+
+        for event in events:
+            if event["type"] in ("new_order", "order_update"):
+                changed = [event["data"]]
+            elif event["type"] == "orders_update":
+                changed = event["data"]["orders"]
+            else:
+                continue
+
+            for order_data in changed:
+                order = Order(**order_data)
+                known = self.known_version(str(order.id))
+                if known is not None and known >= order.version:
+                    continue
+
+                if event["_id"] <= self.watermark:
+                    try:
+                        order = await load_order(order.id)
+                    except Exception as e:
+                        logger.warning(f"Could not reload order {order.id} for the active board: {e}")
+                        continue
+
+                self.apply(order)
+
+    def get_orders(self, status: Optional[OrderStatus] = None) -> List[Order]:
+
+        statuses = [status] if status else ACTIVE_STATUSES
+        return [
+            self.orders[order_id]
+            for s in statuses
+            for _, order_id in self._by_status.get(s.value, [])
+        ]
+
+    def get_counts(self) -> Dict[str, int]:
+        return {status: len(entries) for status, entries in self._by_status.items()}
+
+    def _discard(self, order_id: str):
+
+        order = self.orders.pop(order_id, None)
+        if order is None:
+            return
+
+        entries = self._by_status[order.status.value]
+        key = (order.created_at, order_id)
+        i = bisect_left(entries, key)
+        if i < len(entries) and entries[i] == key:
+            del entries[i]
+
+    def _retire(self, order_id: str, version: int):
+
+        self._retired[order_id] = version
+        self._retired.move_to_end(order_id)
+        if len(self._retired) > self._RETIRED_SIZE:
+            self._retired.popitem(last=False)
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Optional
+from pymongo import ASCENDING, DESCENDING, MongoClient
+from pymongo.client_session import ClientSession
+from pymongo.errors import PyMongoError
+
+from app.models.enums import OrderStatus
+from app.services.outbox import OutboxService
+from app.services import order_documents as fields
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_COLLECTION = "orders_archive"
+ARCHIVABLE_STATUSES = [OrderStatus.COMPLETED.value, OrderStatus.CANCELLED.value]
+
+
+class OrderArchiver:
+    """Moves finished orders out of the hot ``orders`` collection.
+
+    COMPLETED and CANCELLED orders untouched for ``max_age`` are copied to
+    ``orders_archive`` and then deleted from ``orders`` in batches. Both
+    statuses are terminal, so a copied order can no longer change. Each batch
+    is moved in one transaction and copies are keyed by the same ``_id``, so
+    several workers, or a rerun after a crash, never archive an order twice.
+    Per-status counts of archived orders are kept in a single document,
+    updated in the same transaction, so statistics stay complete without
+    scanning the archive.
+    """
+
+    def __init__(
+        self,
+        db_client: MongoClient,
+        outbox: OutboxService,
+        max_age: timedelta,
+        batch_size: int = 500,
+        interval: float = 300.0,
+        database_name: str = "restaurant_db"
+    ):
+        self.db_client = db_client
+        self.db = db_client[database_name]
+        self.orders = self.db.orders
+        self.archive = self.db[ARCHIVE_COLLECTION]
+        self.archive_stats = self.db.order_archive_stats
+        self.outbox = outbox
+        self.max_age = max_age
+        self.batch_size = batch_size
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def ensure_indexes(self):
+
+        self.archive.create_index([(fields.CREATED_AT, DESCENDING), ("_id", DESCENDING)])
+        self.archive.create_index([(fields.STATUS, ASCENDING)])
+        self.archive.create_index([(fields.CUSTOMER_NAME, ASCENDING)])
+
+    def start(self):
+
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Order archiver started: orders older than {self.max_age} every {self.interval}s")
+
+    async def stop(self):
+
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+
+        while True:
+            try:
+                await self.archive_once()
+            except Exception as e:
+                logger.error(f"Error archiving orders: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def archive_once(self) -> int:
+
+        cutoff = datetime.utcnow() - self.max_age
+        archived = 0
+
+        while True:
+            try:
+                orders = list(
+                    self.orders.find({fields.STATUS: {"$in": ARCHIVABLE_STATUSES}, fields.UPDATED_AT: {"$lt": cutoff}})
+                    .limit(self.batch_size)
+                )
+            except PyMongoError as e:
+                logger.error(f"Database error selecting orders to archive: {e}")
+                break
+
+            if not orders:
+                break
+
+            try:
+                self._archive_batch(orders)
+            except PyMongoError as e:
+                logger.error(f"Database error archiving orders: {e}")
+                break
+
+            archived += len(orders)
+            if len(orders) < self.batch_size:
+                break
+
+            await asyncio.sleep(0)
+
+        if archived:
+            logger.info(f"Archived {archived} orders older than {cutoff.isoformat()}")
+        return archived
+
+    def _archive_batch(self, orders: list):
+        """Copy, count, delete and announce one batch in a single transaction.
+
+        A crash leaves all four writes or none, so a rerun archives and
+        counts the whole batch again.
+        """
+
+        order_ids = [order["_id"] for order in orders]
+
+        def write(session: ClientSession):
+            # Another worker may have archived part of the batch since it was read.
+            archived = {
+                document["_id"]
+                for document in self.archive.find({"_id": {"$in": order_ids}}, {"_id": 1}, session=session)
+            }
+            fresh = [order for order in orders if order["_id"] not in archived]
+            if fresh:
+                self.archive.insert_many(fresh, session=session)
+                counts = Counter(order[fields.STATUS] for order in fresh)
+                self.archive_stats.update_one(
+                    {"_id": "statuses"},
+                    {"$inc": {f"counts.{status}": count for status, count in counts.items()}},
+                    upsert=True,
+                    session=session
+                )
+
+            self.orders.delete_many({"_id": {"$in": order_ids}, fields.STATUS: {"$in": ARCHIVABLE_STATUSES}}, session=session)
+
+            # Lets list ETags and live views notice that the orders left the hot set.
+            self.outbox.append(
+                "orders_archived",
+                None,
+                {"order_ids": [str(order_id) for order_id in order_ids]},
+                session=session
+            )
+
+        with self.db_client.start_session() as session:
+            session.with_transaction(write)
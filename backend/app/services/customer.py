@@ -0,0 +1,378 @@
+import logging
+import re
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+from pymongo import ASCENDING, DESCENDING, MongoClient, ReturnDocument, UpdateOne
+from pymongo.client_session import ClientSession
+from pymongo.errors import PyMongoError
+
+from app.models.customer import Customer, CustomerProfile
+from app.models.order import Order
+from app.models.enums import OrderStatus
+from app.exceptions import CustomerNotFoundError, DatabaseError
+
+logger = logging.getLogger(__name__)
+
+NON_DIGITS = re.compile(r"\D")
+
+BACKFILL = "customer_profiles_backfill"
+
+
+def normalize_phone(phone: Optional[str]) -> Optional[str]:
+
+    digits = NON_DIGITS.sub("", phone or "")
+    return f"+{digits}" if digits else None
+
+
+def normalize_email(email: Optional[str]) -> Optional[str]:
+
+    email = (email or "").strip().lower()
+    return email or None
+
+
+def customer_key(customer: Customer) -> Optional[str]:
+    """Profile id: the normalized phone, or the email for customers who gave no phone."""
+
+    phone = normalize_phone(customer.phone)
+    if phone:
+        return f"phone:{phone}"
+    email = normalize_email(customer.email)
+    if email:
+        return f"email:{email}"
+    return None
+
+
+def profile_details(order: Order) -> dict:
+    """Profile fields taken from the customer's latest order."""
+
+    details = {
+        "name": order.customer.name,
+        "phone": normalize_phone(order.customer.phone),
+        "email": normalize_email(order.customer.email),
+        "last_order_at": order.created_at,
+    }
+    address = order.delivery_address or order.customer.address
+    if address:
+        details["address"] = address
+    return details
+
+
+class CustomerService:
+    """Customer profiles kept up to date by the order writes themselves.
+
+    Every order upserts its customer's profile with ``$inc`` and a sliced
+    ``$push``, so lookups and order history are point reads by ``_id``
+    instead of scans over ``orders``. Orders without phone or email have no
+    profile.
+    """
+
+    def __init__(
+        self,
+        db_client: MongoClient,
+        recent_orders: int = 20,
+        backfill_lease_seconds: float = 60.0,
+        database_name: str = "restaurant_db"
+    ):
+
+        self.db_client = db_client
+        self.db = db_client[database_name]
+        self.collection = self.db.customers
+        self.backfill_collection = self.db.customers_backfill
+        self.deferred_cancellations = self.db.customers_backfill_cancellations
+        self.migrations = self.db.migrations
+        self.recent_orders = recent_orders
+        self.backfill_lease_seconds = backfill_lease_seconds
+        self._backfill_since: Optional[datetime] = None
+        self._backfill_done = False
+
+    def ensure_indexes(self):
+
+        self.collection.create_index([("email", ASCENDING)])
+        self.collection.create_index([("last_order_at", DESCENDING)])
+
+    def record_order(self, order: Order, session: Optional[ClientSession] = None):
+
+        update = self._order_update(order)
+        if update is not None:
+            self.collection.update_one(*update, upsert=True, session=session)
+
+    def record_orders(self, orders: Iterable[Order], session: Optional[ClientSession] = None):
+
+        requests = [UpdateOne(*update, upsert=True) for order in orders if (update := self._order_update(order))]
+        if requests:
+            self.collection.bulk_write(requests, ordered=False, session=session)
+
+    def record_cancellation(self, order: Order, session: Optional[ClientSession] = None):
+
+        self.record_cancellations([order], session=session)
+
+    def record_cancellations(self, orders: Iterable[Order], session: Optional[ClientSession] = None):
+
+        cancelled = [(order, key) for order in orders if (key := customer_key(order.customer)) is not None]
+        cancelled = self._defer_to_backfill(cancelled, session)
+
+        requests = [
+            UpdateOne({"_id": key}, {"$inc": {"cancelled_count": 1, "total_spent": -order.total_amount}})
+            for order, key in cancelled
+        ]
+        if requests:
+            self.collection.bulk_write(requests, ordered=False, session=session)
+
+    def _defer_to_backfill(self, cancelled: list, session: Optional[ClientSession]) -> list:
+        """Hand the cancellations of orders older than the high-water mark to a pending backfill.
+
+        The backfill owns those orders until it is done: their cancellations
+        go to ``customers_backfill_cancellations`` and are applied after the
+        totals are merged. Bumping the marker in the same transaction makes
+        the write conflict with the one that marks the backfill done, so
+        every cancellation lands on exactly one side. Returns the
+        cancellations to apply to the profiles now.
+        """
+
+        if self._backfill_done:
+            return cancelled
+
+        since = self._backfill_since or self.start_backfill()
+        older = [(order, key) for order, key in cancelled if order.created_at < since]
+        if not older:
+            return cancelled
+
+        pending = self.migrations.update_one(
+            {"_id": BACKFILL, "phase": {"$ne": "done"}},
+            {"$inc": {"deferred_cancellations": len(older)}},
+            session=session
+        )
+        if not pending.matched_count:
+            self._backfill_done = True
+            return cancelled
+
+        self.deferred_cancellations.insert_many(
+            [{"_id": order.id, "customer": key, "total_spent": order.total_amount} for order, key in older],
+            session=session
+        )
+        return [(order, key) for order, key in cancelled if order.created_at >= since]
+
+    def start_backfill(self) -> datetime:
+        """Fix the high-water mark of the backfill; must run before this worker records any order.
+
+        The first worker to start stores the current time. Orders created
+        from then on are recorded by the order writes, older ones only by
+        ``backfill``, so the two never count the same order. Until the
+        backfill is done it also owns the cancellations of the older orders.
+        """
+
+        marker = self.migrations.find_one_and_update(
+            {"_id": BACKFILL},
+            {"$setOnInsert": {"since": datetime.utcnow(), "phase": "collect"}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._backfill_since = marker["since"]
+        self._backfill_done = marker["phase"] == "done"
+        return marker["since"]
+
+    def backfill(self, orders: Iterable[Order], batch_size: int = 500) -> int:
+        """Add the orders created before the high-water mark to the profiles; returns how many were added.
+
+        Runs once per database. Workers take a lease on the backfill, so
+        only one runs it at a time and a crashed run is taken over. Totals
+        are first collected into ``customers_backfill``, which a restarted
+        run rebuilds from scratch, then merged into the live profiles in
+        transactions that also mark each merged total, so a resumed merge
+        adds every total exactly once. The cancellations deferred to the
+        backfill are applied last, the same way.
+        """
+
+        since = self.start_backfill()
+        now = datetime.utcnow()
+        marker = self.migrations.find_one_and_update(
+            {
+                "_id": BACKFILL,
+                "phase": {"$ne": "done"},
+                "$or": [{"locked_until": {"$lt": now}}, {"locked_until": {"$exists": False}}]
+            },
+            {"$set": {"locked_until": now + timedelta(seconds=self.backfill_lease_seconds)}},
+            return_document=ReturnDocument.AFTER
+        )
+        if marker is None:
+            return 0
+
+        recorded = 0
+        if marker["phase"] == "collect":
+            recorded = self._collect_backfill(orders, since, batch_size)
+            self._renew_backfill_lease("merge")
+
+        self._merge_backfill(batch_size)
+        while not self._finish_backfill():
+            self._merge_deferred_cancellations(batch_size)
+        self._backfill_done = True
+        self.backfill_collection.drop()
+        self.deferred_cancellations.drop()
+        return recorded
+
+    def _collect_backfill(self, orders: Iterable[Order], since: datetime, batch_size: int) -> int:
+
+        self.backfill_collection.drop()
+
+        recorded = 0
+        batch = []
+        for order in orders:
+            if order.created_at < since and customer_key(order.customer) is not None:
+                batch.append(order)
+            if len(batch) >= batch_size:
+                recorded += self._collect_batch(batch)
+                self._renew_backfill_lease()
+                batch = []
+
+        if batch:
+            recorded += self._collect_batch(batch)
+        return recorded
+
+    def _collect_batch(self, orders: List[Order]) -> int:
+
+        # A cancellation deferred to the backfill is applied on its own, so
+        # its order is collected as it was before the cancellation. The
+        # orders were read first: a cancellation they show was committed
+        # together with its deferred entry.
+        deferred = {
+            entry["_id"]
+            for entry in self.deferred_cancellations.find(
+                {"_id": {"$in": [order.id for order in orders if order.status == OrderStatus.CANCELLED]}},
+                {"_id": 1}
+            )
+        }
+
+        requests = []
+        for order in orders:
+            filter_query, changes = self._order_update(order)
+            changes["$set"]["merged"] = False
+            if order.status == OrderStatus.CANCELLED and order.id not in deferred:
+                changes["$inc"]["cancelled_count"] = 1
+                changes["$inc"]["total_spent"] = 0.0
+            requests.append(UpdateOne(filter_query, changes, upsert=True))
+
+        self.backfill_collection.bulk_write(requests)
+        return len(requests)
+
+    def _merge_backfill(self, batch_size: int):
+
+        while True:
+            totals = list(self.backfill_collection.find({"merged": False}).limit(batch_size))
+            if not totals:
+                return
+
+            # Live profiles already hold the newer orders: the backfilled
+            # totals are added, their details only fill in missing profiles.
+            requests = [
+                UpdateOne(
+                    {"_id": total["_id"]},
+                    {
+                        "$setOnInsert": {
+                            field: total[field]
+                            for field in ("name", "phone", "email", "address", "last_order_at")
+                            if field in total
+                        },
+                        "$min": {"first_order_at": total["first_order_at"]},
+                        "$inc": {
+                            "order_count": total.get("order_count", 0),
+                            "cancelled_count": total.get("cancelled_count", 0),
+                            "total_spent": total.get("total_spent", 0.0)
+                        },
+                        "$push": {"recent_order_ids": {
+                            "$each": total.get("recent_order_ids", []),
+                            "$position": 0,
+                            "$slice": -self.recent_orders
+                        }}
+                    },
+                    upsert=True
+                )
+                for total in totals
+            ]
+            merged = [total["_id"] for total in totals]
+
+            def write(session: ClientSession):
+                self.collection.bulk_write(requests, ordered=False, session=session)
+                self.backfill_collection.update_many({"_id": {"$in": merged}}, {"$set": {"merged": True}}, session=session)
+
+            with self.db_client.start_session() as session:
+                session.with_transaction(write)
+            self._renew_backfill_lease()
+
+    def _merge_deferred_cancellations(self, batch_size: int):
+
+        while True:
+            entries = list(self.deferred_cancellations.find().limit(batch_size))
+            if not entries:
+                return
+
+            requests = [
+                UpdateOne({"_id": entry["customer"]}, {"$inc": {"cancelled_count": 1, "total_spent": -entry["total_spent"]}})
+                for entry in entries
+            ]
+            applied = [entry["_id"] for entry in entries]
+
+            def write(session: ClientSession):
+                self.collection.bulk_write(requests, ordered=False, session=session)
+                self.deferred_cancellations.delete_many({"_id": {"$in": applied}}, session=session)
+
+            with self.db_client.start_session() as session:
+                session.with_transaction(write)
+            self._renew_backfill_lease()
+
+    def _finish_backfill(self) -> bool:
+        """Mark the backfill done unless cancellations are still deferred to it."""
+
+        def write(session: ClientSession) -> bool:
+            if self.deferred_cancellations.find_one({}, session=session) is not None:
+                return False
+            self.migrations.update_one(
+                {"_id": BACKFILL},
+                {"$set": {"phase": "done"}, "$unset": {"locked_until": ""}},
+                session=session
+            )
+            return True
+
+        with self.db_client.start_session() as session:
+            return session.with_transaction(write)
+
+    def _renew_backfill_lease(self, phase: Optional[str] = None):
+
+        changes = {"locked_until": datetime.utcnow() + timedelta(seconds=self.backfill_lease_seconds)}
+        if phase is not None:
+            changes["phase"] = phase
+        self.migrations.update_one({"_id": BACKFILL}, {"$set": changes})
+
+    async def get_customer(self, phone: Optional[str] = None, email: Optional[str] = None) -> CustomerProfile:
+
+        try:
+            profile = None
+            phone = normalize_phone(phone)
+            email = normalize_email(email)
+            if phone:
+                profile = self.collection.find_one({"_id": f"phone:{phone}"})
+            elif email:
+                profile = self.collection.find_one({"email": email}, sort=[("last_order_at", DESCENDING)])
+
+            if profile is None:
+                raise CustomerNotFoundError(f"Customer {phone or email} not found")
+            return CustomerProfile(**profile)
+
+        except PyMongoError as e:
+            logger.error(f"Database error getting customer {phone or email}: {e}")
+            raise DatabaseError(f"Database error: {str(e)}")
+
+    def _order_update(self, order: Order) -> Optional[tuple]:
+
+        key = customer_key(order.customer)
+        if key is None:
+            return None
+
+        return (
+            {"_id": key},
+            {
+                "$set": profile_details(order),
+                "$setOnInsert": {"first_order_at": order.created_at},
+                "$inc": {"order_count": 1, "total_spent": order.total_amount},
+                "$push": {"recent_order_ids": {"$each": [order.id], "$slice": -self.recent_orders}}
+            }
+        )
@@ -0,0 +1,160 @@
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+from pymongo import ASCENDING, MongoClient
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from app.exceptions import DatabaseError, IdempotencyConflictError, IdempotencyKeyMismatchError
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyService:
+    """Remembers the response to each Idempotency-Key so retries are replayed, not re-executed.
+
+    A key is reserved with a single insert before the request runs; the
+    unique ``_id`` makes concurrent retries of the same key lose the race
+    instead of creating a second order. A reservation is a lease until
+    ``locked_until``: if the worker holding it dies, a retry with the same
+    request takes the key over once the lease has run out. Completed
+    responses are kept in a TTL-indexed collection and in a bounded
+    in-process LRU, so a replay is usually answered without touching Mongo
+    at all.
+    """
+
+    def __init__(
+        self,
+        db_client: MongoClient,
+        cache_size: int = 10000,
+        ttl_seconds: int = 86400,
+        lease_seconds: float = 30.0,
+        database_name: str = "restaurant_db"
+    ):
+        self.db = db_client[database_name]
+        self.collection = self.db.idempotency_keys
+        self.cache_size = cache_size
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds
+        self._cache: "OrderedDict[str, dict]" = OrderedDict()
+
+    def ensure_indexes(self):
+
+        self.collection.create_index([("created_at", ASCENDING)], expireAfterSeconds=self.ttl_seconds)
+
+    @staticmethod
+    def fingerprint(payload: str) -> str:
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def reserve(self, key: str, fingerprint: str) -> Optional[dict]:
+        """Return the stored response for ``key``, or None once the key is reserved for this request."""
+
+        record = self._cache_get(key)
+        if record is not None:
+            return self._check(key, record, fingerprint)
+
+        now = datetime.utcnow()
+        locked_until = now + timedelta(seconds=self.lease_seconds)
+        try:
+            self.collection.insert_one({
+                "_id": key,
+                "fingerprint": fingerprint,
+                "state": "pending",
+                "locked_until": locked_until,
+                "created_at": now
+            })
+            return None
+        except DuplicateKeyError:
+            pass
+        except PyMongoError as e:
+            logger.error(f"Database error reserving idempotency key {key}: {e}")
+            raise DatabaseError(f"Database error: {str(e)}")
+
+        try:
+            # Take over a reservation whose holder let the lease run out.
+            taken = self.collection.find_one_and_update(
+                {
+                    "_id": key,
+                    "state": "pending",
+                    "fingerprint": fingerprint,
+                    "$or": [{"locked_until": {"$lt": now}}, {"locked_until": {"$exists": False}}]
+                },
+                {"$set": {"locked_until": locked_until}}
+            )
+            if taken is not None:
+                logger.warning(f"Taking over expired reservation of idempotency key {key}")
+                return None
+
+            record = self.collection.find_one({"_id": key})
+        except PyMongoError as e:
+            logger.error(f"Database error reading idempotency key {key}: {e}")
+            raise DatabaseError(f"Database error: {str(e)}")
+
+        if record is None:
+            # Expired between the insert and the read; let the client retry.
+            raise IdempotencyConflictError(f"Request with idempotency key {key} is being processed")
+
+        if record["state"] != "completed":
+            if record["fingerprint"] != fingerprint:
+                raise IdempotencyKeyMismatchError(f"Idempotency key {key} was used with a different request")
+            raise IdempotencyConflictError(f"Request with idempotency key {key} is being processed")
+
+        self._cache_put(key, record)
+        return self._check(key, record, fingerprint)
+
+    async def complete(self, key: str, fingerprint: str, status_code: int, body: dict):
+
+        record = {
+            "fingerprint": fingerprint,
+            "state": "completed",
+            "status_code": status_code,
+            "body": body
+        }
+
+        try:
+            self.collection.update_one({"_id": key}, {"$set": record})
+        except PyMongoError as e:
+            # The order exists; a lost record only means a later retry is not replayed.
+            logger.error(f"Database error completing idempotency key {key}: {e}")
+
+        self._cache_put(key, record)
+
+    async def release(self, key: str):
+
+        try:
+            self.collection.delete_one({"_id": key, "state": "pending"})
+        except PyMongoError as e:
+            logger.error(f"Database error releasing idempotency key {key}: {e}")
+
+    def _check(self, key: str, record: dict, fingerprint: str) -> dict:
+
+        if record["fingerprint"] != fingerprint:
+            raise IdempotencyKeyMismatchError(f"Idempotency key {key} was used with a different request")
+
+        logger.info(f"Replaying stored response for idempotency key {key}")
+        return record
+
+    def get_cache_size(self) -> int:
+        return len(self._cache)
+
+    def _cache_get(self, key: str) -> Optional[dict]:
+
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+
+        if entry["expires_at"] < time.monotonic():
+            del self._cache[key]
+            return None
+
+        self._cache.move_to_end(key)
+        return entry["record"]
+
+    def _cache_put(self, key: str, record: dict):
+
+        self._cache[key] = {"record": record, "expires_at": time.monotonic() + self.ttl_seconds}
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
@@ -0,0 +1,443 @@
+import asyncio
+import heapq
+import re
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+from uuid import UUID
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from app.exceptions import CustomerNotFoundError
+from app.models.customer import CustomerProfile
+from app.models.order import Order, OrderStatus
+from app.models.product import Product
+from app.services.customer import customer_key, normalize_email, normalize_phone, profile_details
+from app.services.repositories import OrderRepository, ProductRepository
+from app.services.versions import ORDERS
+
+_created_at = itemgetter(0)
+
+
+class MemoryOrderRepository(OrderRepository):
+    """Orders kept in process, for tests and benchmarks that run without MongoDB.
+
+    Orders are indexed by id, by status and by ``created_at`` (a sorted list
+    of ``(created_at, id)``), which covers every listing the API makes.
+    Stored orders are replaced on update, never mutated, so returned models
+    stay valid snapshots. Each method runs without awaiting, so a write
+    callback is atomic with respect to other requests on the event loop.
+
+    ``run_write`` has no rollback: writes a callback made before raising
+    stay applied, where Mongo would abort the transaction. Order writes
+    raise only before changing anything (a duplicate id), and the outbox and
+    profile writes that follow them do not raise.
+    """
+
+    def __init__(self):
+        self._orders: Dict[UUID, Order] = {}
+        self._by_status: Dict[OrderStatus, Set[UUID]] = {status: set() for status in OrderStatus}
+        self._created: List[Tuple[datetime, UUID]] = []
+
+    def insert(self, order: Order, session=None):
+
+        if order.id in self._orders:
+            raise DuplicateKeyError(f"Duplicate order id {order.id}")
+        self._orders[order.id] = order
+        self._by_status[order.status].add(order.id)
+        insort(self._created, (order.created_at, order.id))
+
+    def insert_many(self, orders: List[Order], session=None):
+
+        # All or nothing, like insert_many inside a Mongo transaction.
+        for order in orders:
+            if order.id in self._orders:
+                raise DuplicateKeyError(f"Duplicate order id {order.id}")
+        for order in orders:
+            self.insert(order)
+
+    def get(self, order_id: UUID) -> Optional[Order]:
+
+        return self._orders.get(order_id)
+
+    def get_version(self, order_id: UUID) -> Optional[Tuple[int, datetime]]:
+
+        order = self._orders.get(order_id)
+        return (order.version, order.updated_at) if order else None
+
+    def get_states(self, order_ids: Iterable[UUID]) -> Dict[UUID, Tuple[OrderStatus, int]]:
+
+        return {
+            order_id: (self._orders[order_id].status, self._orders[order_id].version)
+            for order_id in order_ids if order_id in self._orders
+        }
+
+    def get_many(self, order_ids: List[UUID]) -> List[Order]:
+
+        return [self._orders[order_id] for order_id in order_ids if order_id in self._orders]
+
+    def find(
+        self,
+        status: Optional[OrderStatus] = None,
+        customer_name: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        page: int = 1,
+        limit: int = 10
+    ) -> Tuple[List[Order], int]:
+
+        lo = bisect_left(self._created, date_from, key=_created_at) if date_from else 0
+        hi = bisect_right(self._created, date_to, key=_created_at) if date_to else len(self._created)
+
+        # Walk whichever index is smaller: the orders with the status, or
+        # the created_at range.
+        if status is not None and len(self._by_status[status]) < hi - lo:
+            candidates = sorted(
+                (
+                    (self._orders[order_id].created_at, order_id)
+                    for order_id in self._by_status[status]
+                    if (not date_from or self._orders[order_id].created_at >= date_from)
+                    and (not date_to or self._orders[order_id].created_at <= date_to)
+                ),
+                reverse=True
+            )
+        else:
+            candidates = (self._created[i] for i in range(hi - 1, lo - 1, -1))
+
+        try:
+            pattern = re.compile(customer_name, re.IGNORECASE) if customer_name else None
+        except re.error as e:
+            # Mongo rejects an invalid $regex the same way.
+            raise OperationFailure(f"Regular expression is invalid: {e}")
+        skip = (page - 1) * limit
+        orders = []
+        total = 0
+        for _, order_id in candidates:
+            order = self._orders[order_id]
+            if status is not None and order.status != status:
+                continue
+            if pattern is not None and not pattern.search(order.customer.name):
+                continue
+            if skip <= total < skip + limit:
+                orders.append(order)
+            total += 1
+
+        return orders, total
+
+    def find_updated_since(self, since: datetime, limit: int, after_id: Optional[UUID] = None) -> List[Order]:
+
+        # UUIDs order like their bytes, which is how Mongo orders binary ids.
+        return heapq.nsmallest(
+            limit,
+            (
+                order for order in self._orders.values()
+                if order.updated_at > since
+                or (after_id is not None and order.updated_at == since and order.id > after_id)
+            ),
+            key=lambda order: (order.updated_at, order.id)
+        )
+
+    def find_by_statuses(self, statuses: Iterable[OrderStatus]) -> List[Order]:
+
+        return [self._orders[order_id] for status in statuses for order_id in self._by_status[status]]
+
+    def iter_all(self, batch_size: int = 500) -> Iterator[Order]:
+
+        for _, order_id in list(self._created):
+            yield self._orders[order_id]
+
+    def transition(
+        self,
+        order_id: UUID,
+        sources: List[OrderStatus],
+        new_status: OrderStatus,
+        expected_version: Optional[int],
+        updated_at: datetime,
+        session=None
+    ) -> Optional[Order]:
+
+        order = self._orders.get(order_id)
+        if order is None or order.status not in sources:
+            return None
+        if expected_version is not None and order.version != expected_version:
+            return None
+        return self._set_status(order, new_status, updated_at)
+
+    def transition_many(
+        self,
+        states: Dict[UUID, Tuple[OrderStatus, int]],
+        new_status: OrderStatus,
+        updated_at: datetime,
+        session=None
+    ) -> List[Order]:
+
+        updated = []
+        for order_id, (status, version) in states.items():
+            order = self._orders.get(order_id)
+            if order is not None and order.status == status and order.version == version:
+                updated.append(self._set_status(order, new_status, updated_at))
+        return updated
+
+    def count_by_status(self) -> Dict[str, int]:
+
+        return {status.value: len(order_ids) for status, order_ids in self._by_status.items() if order_ids}
+
+    def _set_status(self, order: Order, new_status: OrderStatus, updated_at: datetime) -> Order:
+
+        updated = order.model_copy(update={"status": new_status, "updated_at": updated_at, "version": order.version + 1})
+        self._orders[order.id] = updated
+        self._by_status[order.status].discard(order.id)
+        self._by_status[new_status].add(order.id)
+        return updated
+
+
+class MemoryProductRepository(ProductRepository):
+    """Products kept in process, in insertion order like the natural order of the Mongo collection."""
+
+    def __init__(self):
+        self._products: Dict[UUID, Product] = {}
+
+    def insert(self, product: Product):
+
+        if product.id in self._products:
+            raise DuplicateKeyError(f"Duplicate product id {product.id}")
+        self._products[product.id] = product
+
+    def get(self, product_id: UUID, allow_stale: bool = False) -> Optional[Product]:
+
+        return self._products.get(product_id)
+
+    def get_version(self, product_id: UUID, allow_stale: bool = False) -> Optional[Tuple[int, datetime]]:
+
+        product = self._products.get(product_id)
+        return (product.version, product.updated_at) if product else None
+
+    def exists(self, product_id: UUID) -> bool:
+
+        return product_id in self._products
+
+    def find(
+        self,
+        category: Optional[str] = None,
+        available_only: bool = False,
+        page: int = 1,
+        limit: int = 10
+    ) -> Tuple[List[Product], int]:
+
+        products = [
+            product for product in self._products.values()
+            if (not category or product.category == category) and (not available_only or product.is_available)
+        ]
+        skip = (page - 1) * limit
+        return products[skip:skip + limit], len(products)
+
+    def all(self) -> List[Product]:
+
+        return list(self._products.values())
+
+    def update(self, product_id: UUID, changes: dict, expected_version: Optional[int] = None) -> Optional[Product]:
+
+        product = self._products.get(product_id)
+        if product is None or (expected_version is not None and product.version != expected_version):
+            return None
+
+        updated = product.model_copy(update={**changes, "version": product.version + 1})
+        self._products[product_id] = updated
+        return updated
+
+    def delete(self, product_id: UUID, expected_version: Optional[int] = None) -> bool:
+
+        product = self._products.get(product_id)
+        if product is None or (expected_version is not None and product.version != expected_version):
+            return False
+
+        del self._products[product_id]
+        return True
+
+
+class MemoryCollectionVersions:
+    """In-process ``CollectionVersions``; the counters are shared with ``MemoryOutboxService``."""
+
+    def __init__(self):
+        self.counters: Dict[str, int] = {}
+
+    def bump(self, name: str, session=None) -> int:
+
+        self.counters[name] = self.counters.get(name, 0) + 1
+        return self.counters[name]
+
+    async def get(self, name: str) -> int:
+        return self.counters.get(name, 0)
+
+
+class MemoryOutboxService:
+    """In-process ``OutboxService`` with the same sequence and offset semantics.
+
+    Events are kept until the process exits; the retention window of the
+    Mongo outbox does not apply.
+    """
+
+    def __init__(self, counters: Optional[Dict[str, int]] = None):
+        self.counters = counters if counters is not None else {}
+        self.events: List[dict] = []
+        self.offsets: Dict[str, int] = {}
+        self.wakeup = asyncio.Event()
+
+    def ensure_indexes(self, retention_seconds: int):
+        pass
+
+    def append(self, event_type: str, order_id: Optional[UUID], data: dict, session=None) -> int:
+
+        return self.append_many(event_type, [(order_id, data)])
+
+    def append_many(self, event_type: str, events: Sequence[Tuple[Optional[UUID], dict]], session=None) -> int:
+        """Append ``(order_id, data)`` events with consecutive sequence numbers; returns the last one."""
+
+        created_at = datetime.utcnow()
+        for order_id, data in events:
+            self.counters[ORDERS] = self.counters.get(ORDERS, 0) + 1
+            self.events.append({
+                "_id": self.counters[ORDERS],
+                "type": event_type,
+                "order_id": str(order_id) if order_id else None,
+                "data": data,
+                "created_at": created_at
+            })
+
+        self.wakeup.set()
+        return self.counters.get(ORDERS, 0)
+
+    async def read_batch(self, after: int, limit: int) -> List[dict]:
+
+        start = bisect_right(self.events, after, key=lambda event: event["_id"])
+        return self.events[start:start + limit]
+
+    async def latest_sequence(self) -> int:
+        return self.counters.get(ORDERS, 0)
+
+    async def get_offset(self, consumer: str) -> Optional[int]:
+        return self.offsets.get(consumer)
+
+    async def save_offset(self, consumer: str, seq: int):
+        self.offsets[consumer] = seq
+
+
+class MemoryCustomerService:
+    """In-process ``CustomerService`` with the same backfill ownership rules.
+
+    Profiles are dicts shaped like the Mongo documents. ``backfill`` reads
+    ``orders`` lazily, so an order can be cancelled after the backfill has
+    read it, as against Mongo; cancellations of orders older than the
+    high-water mark wait for the backfill until it is done.
+    """
+
+    def __init__(self, recent_orders: int = 20):
+        self.recent_orders = recent_orders
+        self.profiles: Dict[str, dict] = {}
+        self.deferred_cancellations: Dict[UUID, Tuple[str, float]] = {}
+        self.since: Optional[datetime] = None
+        self.done = False
+
+    def ensure_indexes(self):
+        pass
+
+    def record_order(self, order: Order, session=None):
+
+        self.record_orders([order])
+
+    def record_orders(self, orders: Iterable[Order], session=None):
+
+        for order in orders:
+            key = customer_key(order.customer)
+            if key is not None:
+                self._add(self.profiles, key, order, cancelled=False)
+
+    def record_cancellation(self, order: Order, session=None):
+
+        self.record_cancellations([order])
+
+    def record_cancellations(self, orders: Iterable[Order], session=None):
+
+        since = self.start_backfill()
+        for order in orders:
+            key = customer_key(order.customer)
+            if key is None:
+                continue
+            if order.created_at < since and not self.done:
+                self.deferred_cancellations[order.id] = (key, order.total_amount)
+            elif key in self.profiles:
+                self._cancel(key, order.total_amount)
+
+    def start_backfill(self) -> datetime:
+
+        if self.since is None:
+            self.since = datetime.utcnow()
+        return self.since
+
+    def backfill(self, orders: Iterable[Order], batch_size: int = 500) -> int:
+
+        since = self.start_backfill()
+        if self.done:
+            return 0
+
+        totals: Dict[str, dict] = {}
+        for order in orders:
+            key = customer_key(order.customer)
+            if order.created_at < since and key is not None:
+                cancelled = order.status == OrderStatus.CANCELLED and order.id not in self.deferred_cancellations
+                self._add(totals, key, order, cancelled)
+
+        for key, total in totals.items():
+            profile = self.profiles.get(key)
+            if profile is None:
+                self.profiles[key] = total
+                continue
+            profile["first_order_at"] = min(profile["first_order_at"], total["first_order_at"])
+            for field in ("order_count", "cancelled_count", "total_spent"):
+                profile[field] += total[field]
+            profile["recent_order_ids"] = (total["recent_order_ids"] + profile["recent_order_ids"])[-self.recent_orders:]
+
+        for key, amount in self.deferred_cancellations.values():
+            self._cancel(key, amount)
+        self.deferred_cancellations.clear()
+        self.done = True
+        return sum(total["order_count"] for total in totals.values())
+
+    async def get_customer(self, phone: Optional[str] = None, email: Optional[str] = None) -> CustomerProfile:
+
+        profile = None
+        phone = normalize_phone(phone)
+        email = normalize_email(email)
+        if phone:
+            profile = self.profiles.get(f"phone:{phone}")
+        elif email:
+            matches = [profile for profile in self.profiles.values() if profile.get("email") == email]
+            profile = max(matches, key=itemgetter("last_order_at"), default=None)
+
+        if profile is None:
+            raise CustomerNotFoundError(f"Customer {phone or email} not found")
+        return CustomerProfile(**profile)
+
+    def _add(self, profiles: Dict[str, dict], key: str, order: Order, cancelled: bool):
+
+        profile = profiles.setdefault(key, {
+            "_id": key,
+            "first_order_at": order.created_at,
+            "order_count": 0,
+            "cancelled_count": 0,
+            "total_spent": 0.0,
+            "recent_order_ids": []
+        })
+        profile.update(profile_details(order))
+        profile["order_count"] += 1
+        if cancelled:
+            profile["cancelled_count"] += 1
+        else:
+            profile["total_spent"] += order.total_amount
+        profile["recent_order_ids"] = (profile["recent_order_ids"] + [order.id])[-self.recent_orders:]
+
+    def _cancel(self, key: str, amount: float):
+
+        profile = self.profiles[key]
+        profile["cancelled_count"] += 1
+        profile["total_spent"] -= amount
@@ -0,0 +1,68 @@
+import gzip
+import hashlib
+import json
+from itertools import groupby
+from typing import Iterable, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from app.models.product import Product
+
+GZIP = "gzip"
+BROTLI = "br"
+IDENTITY = "identity"
+
+
+class MenuSnapshot:
+    """The available menu grouped by category, serialized and compressed once.
+
+    The body is deterministic for a given product set, so the ETag (a hash
+    of it) is the same on every worker. Each encoding is its own
+    representation and gets its own strong tag, ``etag_for``.
+    """
+
+    def __init__(self, products: Iterable[Product]):
+
+        available = sorted(
+            (product for product in products if product.is_available),
+            key=lambda product: (product.category, product.name)
+        )
+        menu = {
+            "categories": [
+                {"name": category, "products": [product.model_dump(mode="json") for product in items]}
+                for category, items in groupby(available, key=lambda product: product.category)
+            ],
+            "total": len(available)
+        }
+
+        self.body = json.dumps(menu, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.etag = f'"{hashlib.blake2b(self.body, digest_size=12).hexdigest()}"'
+        self.encoded = {IDENTITY: self.body, GZIP: gzip.compress(self.body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.encoded[BROTLI] = brotli.compress(self.body, quality=11)
+
+    @property
+    def size(self) -> int:
+        return len(self.body)
+
+    def etag_for(self, encoding: str) -> str:
+
+        return self.etag if encoding == IDENTITY else f'{self.etag[:-1]}-{encoding}"'
+
+    def negotiate(self, accept_encoding: Optional[str]) -> str:
+        """Best stored encoding allowed by an Accept-Encoding header."""
+
+        accepted = set()
+        for part in (accept_encoding or "").split(","):
+            coding, _, params = part.strip().partition(";")
+            quality = params.strip().removeprefix("q=")
+            if coding and quality not in ("0", "0.0", "0.00", "0.000"):
+                accepted.add(coding.strip().lower())
+
+        for encoding in (BROTLI, GZIP):
+            if encoding in self.encoded and (encoding in accepted or "*" in accepted):
+                return encoding
+        return IDENTITY
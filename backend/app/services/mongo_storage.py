@@ -0,0 +1,487 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from uuid import UUID
+from pymongo import ASCENDING, DESCENDING, MongoClient, ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.read_preferences import ReadPreference
+from bson import Binary
+
+from app.models.order import Order, OrderStatus
+from app.models.product import Product
+from app.services.archive import ARCHIVE_COLLECTION, ARCHIVABLE_STATUSES
+from app.services.repositories import OrderRepository, ProductRepository
+from app.services import order_documents as fields
+from app.services.order_documents import (
+    LEGACY_INDEXES,
+    MenuSnapshots,
+    compact_legacy,
+    from_document,
+    is_legacy,
+    snapshot_ids_of,
+    to_document,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class MongoOrderRepository(OrderRepository):
+    """Orders in the compact layout of ``order_documents``, with archived orders in ``orders_archive``."""
+
+    def __init__(
+        self,
+        db_client: MongoClient,
+        stale_read_preference: Optional[ReadPreference] = None,
+        archive_after: Optional[timedelta] = None,
+        snapshots: Optional[MenuSnapshots] = None,
+        database_name: str = "restaurant_db"
+    ):
+        self.db_client = db_client
+        self.db = db_client[database_name]
+        self.collection = self.db.orders
+        self.archive = self.db[ARCHIVE_COLLECTION]
+        self.archive_stats = self.db.order_archive_stats
+        self.archive_after = archive_after
+        self.snapshots = snapshots or MenuSnapshots(db_client, database_name=database_name)
+        # Order lists and statistics tolerate bounded staleness and may go to a
+        # secondary; creation, status transitions and single-order reads stay
+        # on the primary.
+        self.stale_collection = (
+            self.collection.with_options(read_preference=stale_read_preference)
+            if stale_read_preference else self.collection
+        )
+
+    def migrate(self, batch_size: int = 500):
+        """Rewrite orders stored with full field names into the compact layout.
+
+        Legacy documents are recognised by their ``status`` field. Each one is
+        replaced only while it is still in the legacy layout, so the migration
+        can run on several workers at once and be resumed after a crash.
+        Orders without a version get version 1. Once a collection has no
+        legacy document left, the indexes of the old layout are dropped.
+
+        Workers that predate the layout may still write legacy documents
+        during a rolling deploy; reads map them, and a status change
+        compacts the order first.
+        """
+
+        for collection in (self.collection, self.archive):
+            migrated = 0
+            while True:
+                legacy = list(collection.find({"status": {"$exists": True}}).limit(batch_size))
+                if not legacy:
+                    break
+                migrated += self._compact(collection, legacy)
+
+            if migrated:
+                logger.info(f"Compacted {migrated} documents in {collection.name}")
+            self._drop_legacy_indexes(collection)
+
+    def _compact(self, collection, legacy: List[dict], session=None) -> int:
+
+        requests = []
+        snapshots = {}
+        for order_data in legacy:
+            document, order_snapshots = compact_legacy(order_data)
+            snapshots.update(order_snapshots)
+            requests.append(ReplaceOne({"_id": document["_id"], "status": {"$exists": True}}, document))
+
+        self.snapshots.save(snapshots)
+        return collection.bulk_write(requests, ordered=False, session=session).modified_count
+
+    def _compact_legacy_orders(self, order_ids: List[UUID], session=None):
+        """Compact the given orders if they are still in the legacy layout, so compact filters match them."""
+
+        legacy = list(self.collection.find({"_id": {"$in": order_ids}, "status": {"$exists": True}}, session=session))
+        if legacy:
+            self._compact(self.collection, legacy, session=session)
+
+    @staticmethod
+    def _drop_legacy_indexes(collection):
+
+        # Every document in the compact layout would still hold a null entry in them.
+        existing = set(collection.index_information())
+        for name in LEGACY_INDEXES:
+            if name in existing:
+                collection.drop_index(name)
+                logger.info(f"Dropped legacy index {name} on {collection.name}")
+
+    def ensure_indexes(self):
+
+        self.collection.create_index([(fields.STATUS, ASCENDING)])
+        self.collection.create_index([(fields.CUSTOMER_NAME, ASCENDING)])
+        self.collection.create_index([(fields.CUSTOMER_PHONE, ASCENDING)])
+        self.collection.create_index([(fields.CREATED_AT, DESCENDING), ("_id", DESCENDING)])
+        self.collection.create_index([(fields.UPDATED_AT, ASCENDING), ("_id", ASCENDING)])
+        self.collection.create_index([(fields.STATUS, ASCENDING), (fields.UPDATED_AT, ASCENDING)])
+
+    def run_write(self, callback):
+        """Run ``callback(session)`` in a transaction, so the order and its outbox event commit together."""
+
+        with self.db_client.start_session() as session:
+            return session.with_transaction(callback)
+
+    def insert(self, order: Order, session=None):
+
+        self.collection.insert_one(self._to_document(order), session=session)
+
+    def insert_many(self, orders: List[Order], session=None):
+
+        self.collection.insert_many([self._to_document(order) for order in orders], session=session)
+
+    def get(self, order_id: UUID) -> Optional[Order]:
+
+        order_data = self._find_one({"_id": Binary.from_uuid(order_id)})
+        return self._to_order(order_data) if order_data else None
+
+    def get_version(self, order_id: UUID) -> Optional[Tuple[int, datetime]]:
+
+        order_data = self._find_one(
+            {"_id": Binary.from_uuid(order_id)},
+            {fields.VERSION: 1, fields.UPDATED_AT: 1, "version": 1, "updated_at": 1}
+        )
+        if not order_data:
+            return None
+        if fields.UPDATED_AT not in order_data:
+            return order_data.get("version", 1), order_data["updated_at"]
+        return order_data.get(fields.VERSION, 1), order_data[fields.UPDATED_AT]
+
+    def get_states(self, order_ids: Iterable[UUID]) -> Dict[UUID, Tuple[OrderStatus, int]]:
+
+        documents = list(self.collection.find({"_id": {"$in": list(order_ids)}}, {fields.STATUS: 1, fields.VERSION: 1, "status": 1}))
+
+        # States are read ahead of a bulk transition, whose filters only match the compact layout.
+        legacy = [document["_id"] for document in documents if is_legacy(document)]
+        if legacy:
+            self._compact_legacy_orders(legacy)
+            documents = list(self.collection.find({"_id": {"$in": list(order_ids)}}, {fields.STATUS: 1, fields.VERSION: 1}))
+
+        return {
+            order_data["_id"]: (OrderStatus(order_data[fields.STATUS]), order_data.get(fields.VERSION, 1))
+            for order_data in documents
+        }
+
+    def get_many(self, order_ids: List[UUID]) -> List[Order]:
+
+        documents = list(self.collection.find({"_id": {"$in": order_ids}}))
+        if self.archive_after and len(documents) < len(order_ids):
+            found = {document["_id"] for document in documents}
+            missing = [order_id for order_id in order_ids if order_id not in found]
+            documents.extend(self.archive.find({"_id": {"$in": missing}}))
+        return self._to_orders(documents)
+
+    def find(
+        self,
+        status: Optional[OrderStatus] = None,
+        customer_name: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        page: int = 1,
+        limit: int = 10
+    ) -> Tuple[List[Order], int]:
+
+        # Orders created in the same millisecond are ordered by id, so pages
+        # neither repeat nor skip them.
+        filter_query = {}
+
+        if status:
+            filter_query[fields.STATUS] = status.value
+        if customer_name:
+            filter_query[fields.CUSTOMER_NAME] = {"$regex": customer_name, "$options": "i"}
+        if date_from or date_to:
+            date_filter = {}
+            if date_from:
+                date_filter["$gte"] = date_from
+            if date_to:
+                date_filter["$lte"] = date_to
+            filter_query[fields.CREATED_AT] = date_filter
+
+        if self._reaches_archive(status, date_from):
+            cursor, total = self._find_with_archive(filter_query, page, limit)
+        else:
+            total = self.stale_collection.count_documents(filter_query)
+            cursor = (
+                self.stale_collection.find(filter_query)
+                .sort([(fields.CREATED_AT, DESCENDING), ("_id", DESCENDING)]).skip((page - 1) * limit).limit(limit)
+            )
+
+        return self._to_orders(cursor), total
+
+    def find_updated_since(self, since: datetime, limit: int, after_id: Optional[UUID] = None) -> List[Order]:
+
+        filter_query = {fields.UPDATED_AT: {"$gt": since}}
+        if after_id is not None:
+            filter_query = {"$or": [
+                filter_query,
+                {fields.UPDATED_AT: since, "_id": {"$gt": Binary.from_uuid(after_id)}}
+            ]}
+
+        return self._to_orders(
+            self.collection.find(filter_query).sort([(fields.UPDATED_AT, ASCENDING), ("_id", ASCENDING)]).limit(limit)
+        )
+
+    def find_by_statuses(self, statuses: Iterable[OrderStatus]) -> List[Order]:
+
+        return self._to_orders(self.collection.find({fields.STATUS: {"$in": [s.value for s in statuses]}}))
+
+    def iter_all(self, batch_size: int = 500) -> Iterator[Order]:
+        """Archived orders first, each collection oldest first."""
+
+        for collection in (self.archive, self.collection):
+            batch = []
+            for document in collection.find().sort([(fields.CREATED_AT, ASCENDING), ("_id", ASCENDING)]).batch_size(batch_size):
+                batch.append(document)
+                if len(batch) >= batch_size:
+                    yield from self._to_orders(batch)
+                    batch = []
+            yield from self._to_orders(batch)
+
+    def transition(
+        self,
+        order_id: UUID,
+        sources: List[OrderStatus],
+        new_status: OrderStatus,
+        expected_version: Optional[int],
+        updated_at: datetime,
+        session=None
+    ) -> Optional[Order]:
+
+        # The transition rule is part of the filter, so the check and the
+        # write are one atomic round-trip.
+        filter_query = {
+            "_id": Binary.from_uuid(order_id),
+            fields.STATUS: {"$in": [s.value for s in sources]}
+        }
+        if expected_version is not None:
+            filter_query[fields.VERSION] = expected_version
+
+        update = {
+            "$set": {
+                fields.STATUS: new_status.value,
+                fields.UPDATED_AT: updated_at
+            },
+            "$inc": {fields.VERSION: 1}
+        }
+
+        updated = self.collection.find_one_and_update(
+            filter_query, update, return_document=ReturnDocument.AFTER, session=session
+        )
+        if updated is None and self.collection.find_one(
+            {"_id": filter_query["_id"], "status": {"$exists": True}}, {"_id": 1}, session=session
+        ):
+            self._compact_legacy_orders([order_id], session=session)
+            updated = self.collection.find_one_and_update(
+                filter_query, update, return_document=ReturnDocument.AFTER, session=session
+            )
+        return self._to_order(updated) if updated is not None else None
+
+    def transition_many(
+        self,
+        states: Dict[UUID, Tuple[OrderStatus, int]],
+        new_status: OrderStatus,
+        updated_at: datetime,
+        session=None
+    ) -> List[Order]:
+
+        if not states:
+            return []
+
+        self.collection.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": order_id, fields.STATUS: status.value, fields.VERSION: version},
+                    {"$set": {fields.STATUS: new_status.value, fields.UPDATED_AT: updated_at}, "$inc": {fields.VERSION: 1}}
+                )
+                for order_id, (status, version) in states.items()
+            ],
+            ordered=False,
+            session=session
+        )
+
+        # A bulk result has no per-operation outcome; an order was updated
+        # by this write if it now has the new status and the version after
+        # the one it was read at.
+        return [
+            order for order in self._to_orders(self.collection.find(
+                {"_id": {"$in": list(states)}, fields.STATUS: new_status.value},
+                session=session
+            ))
+            if order.version == states[order.id][1] + 1
+        ]
+
+    def count_by_status(self) -> Dict[str, int]:
+
+        pipeline = [
+            {
+                "$group": {
+                    "_id": {"$ifNull": [f"${fields.STATUS}", "$status"]},
+                    "count": {"$sum": 1}
+                }
+            }
+        ]
+        counts = {item["_id"]: item["count"] for item in self.stale_collection.aggregate(pipeline)}
+
+        if self.archive_after:
+            archived = self.archive_stats.find_one({"_id": "statuses"}) or {}
+            for status, count in archived.get("counts", {}).items():
+                counts[status] = counts.get(status, 0) + count
+        return counts
+
+    def _find_one(self, filter_query: dict, projection: Optional[dict] = None) -> Optional[dict]:
+
+        order_data = self.collection.find_one(filter_query, projection)
+        if order_data is None and self.archive_after:
+            order_data = self.archive.find_one(filter_query, projection)
+        return order_data
+
+    def _reaches_archive(self, status: Optional[OrderStatus], date_from: Optional[datetime]) -> bool:
+        """Whether a listing has to look at archived orders as well.
+
+        Only finished orders that have not changed since before the cutoff are
+        archived, so the archive is skipped for active statuses and for date
+        ranges starting after the cutoff. Listings without ``date_from`` cover
+        the hot collection only.
+        """
+
+        if not self.archive_after or date_from is None:
+            return False
+        if status is not None and status.value not in ARCHIVABLE_STATUSES:
+            return False
+        return date_from < datetime.utcnow() - self.archive_after
+
+    def _find_with_archive(self, filter_query: dict, page: int, limit: int) -> Tuple[List[dict], int]:
+
+        pipeline = [
+            {"$match": filter_query},
+            {"$unionWith": {"coll": ARCHIVE_COLLECTION, "pipeline": [{"$match": filter_query}]}},
+            {"$sort": {fields.CREATED_AT: -1, "_id": -1}},
+            {
+                "$facet": {
+                    "orders": [{"$skip": (page - 1) * limit}, {"$limit": limit}],
+                    "total": [{"$count": "count"}]
+                }
+            }
+        ]
+        result = next(self.stale_collection.aggregate(pipeline))
+        total = result["total"][0]["count"] if result["total"] else 0
+        return result["orders"], total
+
+    def _to_document(self, order: Order) -> dict:
+
+        snapshot_ids = [self.snapshots.register(item.id, item.name, item.category) for item in order.items]
+        return to_document(order, snapshot_ids)
+
+    def _to_order(self, order_data: dict) -> Order:
+
+        return from_document(order_data, self.snapshots.resolve(snapshot_ids_of([order_data])))
+
+    def _to_orders(self, cursor) -> List[Order]:
+        """Map a page of stored orders, resolving all of their menu snapshots in one query."""
+
+        documents = list(cursor)
+        snapshots = self.snapshots.resolve(snapshot_ids_of(documents))
+        return [from_document(order_data, snapshots) for order_data in documents]
+
+
+class MongoProductRepository(ProductRepository):
+
+    def __init__(
+        self,
+        db_client: MongoClient,
+        stale_read_preference: Optional[ReadPreference] = None,
+        database_name: str = "restaurant_db"
+    ):
+        self.db = db_client[database_name]
+        self.collection = self.db.products
+        # Catalog reads for browsing may be served by a secondary; lookups made
+        # while creating an order keep using the primary.
+        self.stale_collection = (
+            self.collection.with_options(read_preference=stale_read_preference)
+            if stale_read_preference else self.collection
+        )
+
+    def migrate(self):
+
+        result = self.collection.update_many({"version": {"$exists": False}}, {"$set": {"version": 1}})
+        if result.modified_count:
+            logger.info(f"Added version to {result.modified_count} products")
+
+    def ensure_indexes(self):
+
+        self.collection.create_index([("name", ASCENDING)])
+        self.collection.create_index([("category", ASCENDING)])
+        self.collection.create_index([("is_available", ASCENDING)])
+
+    def insert(self, product: Product):
+
+        self.collection.insert_one(product.model_dump(by_alias=True))
+
+    def get(self, product_id: UUID, allow_stale: bool = False) -> Optional[Product]:
+
+        collection = self.stale_collection if allow_stale else self.collection
+        product_data = collection.find_one({"_id": Binary.from_uuid(product_id)})
+        return self._to_product(product_data) if product_data else None
+
+    def get_version(self, product_id: UUID, allow_stale: bool = False) -> Optional[Tuple[int, datetime]]:
+
+        collection = self.stale_collection if allow_stale else self.collection
+        product_data = collection.find_one(
+            {"_id": Binary.from_uuid(product_id)},
+            {"version": 1, "updated_at": 1}
+        )
+        if not product_data:
+            return None
+        return product_data.get("version", 1), product_data["updated_at"]
+
+    def exists(self, product_id: UUID) -> bool:
+
+        return self.collection.find_one({"_id": Binary.from_uuid(product_id)}, {"_id": 1}) is not None
+
+    def find(
+        self,
+        category: Optional[str] = None,
+        available_only: bool = False,
+        page: int = 1,
+        limit: int = 10
+    ) -> Tuple[List[Product], int]:
+
+        filter_query = {}
+
+        if category:
+            filter_query["category"] = category
+        if available_only:
+            filter_query["is_available"] = True
+
+        total = self.stale_collection.count_documents(filter_query)
+        cursor = self.stale_collection.find(filter_query).skip((page - 1) * limit).limit(limit)
+        return [self._to_product(product_data) for product_data in cursor], total
+
+    def all(self) -> List[Product]:
+
+        return [self._to_product(product_data) for product_data in self.collection.find()]
+
+    def update(self, product_id: UUID, changes: dict, expected_version: Optional[int] = None) -> Optional[Product]:
+
+        filter_query = {"_id": Binary.from_uuid(product_id)}
+        if expected_version is not None:
+            filter_query["version"] = expected_version
+
+        updated = self.collection.find_one_and_update(
+            filter_query,
+            {"$set": changes, "$inc": {"version": 1}},
+            return_document=ReturnDocument.AFTER
+        )
+        return self._to_product(updated) if updated is not None else None
+
+    def delete(self, product_id: UUID, expected_version: Optional[int] = None) -> bool:
+
+        filter_query = {"_id": Binary.from_uuid(product_id)}
+        if expected_version is not None:
+            filter_query["version"] = expected_version
+
+        return self.collection.delete_one(filter_query).deleted_count > 0
+
+    @staticmethod
+    def _to_product(product_data: dict) -> Product:
+
+        product_data["id"] = product_data.pop("_id")
+        return Product(**product_data)
@@ -1,24 +1,59 @@
 import logging
 from datetime import datetime
-from typing import List, Optional, Dict
+from typing import Dict, Iterator, List, Optional
 from uuid import UUID
-from pymongo import MongoClient
 from pymongo.errors import PyMongoError
-from bson import Binary
 
 from app.models.order import Order, OrderItem, OrderStatus
 from app.dto.order import OrderCreate
-from app.exceptions import OrderNotFoundError, ProductNotFoundError, DatabaseError
+from app.exceptions import OrderNotFoundError, ProductNotFoundError, DatabaseError, ConcurrencyError
 from app.services.product import ProductService
+from app.services.outbox import OutboxService
+from app.services.active_orders import ActiveOrdersBoard, ACTIVE_STATUSES
+from app.services.customer import CustomerService
+from app.services.repositories import OrderRepository
+from app.services.write_batcher import WriteBatcher
 
 logger = logging.getLogger(__name__)
 
+VALID_STATUS_TRANSITIONS = {
+    OrderStatus.NEW: [OrderStatus.CONFIRMED, OrderStatus.CANCELLED],
+    OrderStatus.CONFIRMED: [OrderStatus.PREPARING, OrderStatus.CANCELLED],
+    OrderStatus.PREPARING: [OrderStatus.READY, OrderStatus.CANCELLED],
+    OrderStatus.READY: [OrderStatus.COMPLETED, OrderStatus.CANCELLED],
+    OrderStatus.COMPLETED: [],
+    OrderStatus.CANCELLED: [],
+}
+
+# Statuses an order may be in for a transition to the key status to be valid.
+STATUS_TRANSITION_SOURCES = {
+    status: [current for current, targets in VALID_STATUS_TRANSITIONS.items() if status in targets]
+    for status in OrderStatus
+}
+
 
 class OrderService:
-    def __init__(self, db_client: MongoClient, product_service: ProductService):
-        self.db = db_client.restaurant_db
-        self.collection = self.db.orders
+    def __init__(
+        self,
+        repository: OrderRepository,
+        product_service: ProductService,
+        outbox: OutboxService,
+        active_board: Optional[ActiveOrdersBoard] = None,
+        customers: Optional[CustomerService] = None,
+        insert_batch_delay: float = 0.0,
+        insert_batch_size: int = 50
+    ):
+        self.repository = repository
+        self.active_board = active_board
+        self.customers = customers
         self.product_service = product_service
+        self.outbox = outbox
+        # Opt-in group commit: concurrent creations share one insert_many,
+        # one outbox append and one customers bulk write.
+        self.insert_batcher = (
+            WriteBatcher(self._insert_orders, max_size=insert_batch_size, max_delay=insert_batch_delay)
+            if insert_batch_delay > 0 else None
+        )
 
     async def create_order(self, order_data: OrderCreate) -> Order:
 
@@ -38,6 +73,7 @@ class OrderService:
                 order_item = OrderItem(
                     id=product.id,
                     name=product.name,
+                    category=product.category,
                     quantity=item_data.quantity,
                     price=product.price,
                     special_requests=item_data.special_requests
@@ -57,13 +93,23 @@ class OrderService:
             )
 
 
-            result = self.collection.insert_one(order.model_dump(by_alias=True))
+            order_event = order.model_dump(mode='json')
 
-            if result.inserted_id:
-                logger.info(f"Order created successfully: {order.id}, total: {total_amount}")
-                return order
+            if self.insert_batcher is not None:
+                await self.insert_batcher.submit((order, order_event))
             else:
-                raise DatabaseError("Failed to create order")
+                def write(session):
+                    self.repository.insert(order, session=session)
+                    self.outbox.append("new_order", order.id, order_event, session=session)
+                    if self.customers is not None:
+                        self.customers.record_order(order, session=session)
+
+                self.repository.run_write(write)
+
+            if self.active_board is not None:
+                self.active_board.apply(order)
+            logger.info(f"Order created successfully: {order.id}, total: {total_amount}")
+            return order
 
         except (ProductNotFoundError, DatabaseError):
             raise
@@ -71,19 +117,56 @@ class OrderService:
             logger.error(f"Database error creating order: {e}")
             raise DatabaseError(f"Database error: {str(e)}")
 
+    def _insert_orders(self, batch: List[tuple]) -> List[Optional[BaseException]]:
+        """Flush a group of ``(order, event)`` creations; one result per order.
+
+        The group commits in one transaction, so one rejected order aborts
+        it; the orders are then retried one by one and only the failing
+        ones get an error.
+        """
+
+        def write(session):
+            orders = [order for order, _ in batch]
+            self.repository.insert_many(orders, session=session)
+            self.outbox.append_many("new_order", [(order.id, event) for order, event in batch], session=session)
+            if self.customers is not None:
+                self.customers.record_orders(orders, session=session)
+
+        try:
+            self.repository.run_write(write)
+            return [None] * len(batch)
+        except PyMongoError as e:
+            if len(batch) == 1:
+                logger.error(f"Database error creating order: {e}")
+                return [DatabaseError(f"Database error: {str(e)}")]
+            logger.warning(f"Group insert of {len(batch)} orders failed, retrying one by one: {e}")
+
+        return [self._insert_orders([item])[0] for item in batch]
+
     async def get_order(self, order_id: UUID) -> Optional[Order]:
 
         try:
-            order_data = self.collection.find_one({"_id": Binary.from_uuid(order_id)})
+            order = self.repository.get(order_id)
 
-            if not order_data:
+            if order is None:
                 logger.warning(f"Order not found: {order_id}")
                 raise OrderNotFoundError(f"Order {order_id} not found")
 
-            order_data["id"] = order_id
-            del order_data["_id"]
+            return order
 
-            return Order(**order_data)
+        except PyMongoError as e:
+            logger.error(f"Database error getting order {order_id}: {e}")
+            raise DatabaseError(f"Database error: {str(e)}")
+
+    async def get_order_version(self, order_id: UUID) -> tuple[int, datetime]:
+
+        try:
+            version = self.repository.get_version(order_id)
+
+            if version is None:
+                raise OrderNotFoundError(f"Order {order_id} not found")
+
+            return version
 
         except PyMongoError as e:
             logger.error(f"Database error getting order {order_id}: {e}")
@@ -99,93 +182,192 @@ class OrderService:
     ) -> tuple[List[Order], int]:
 
         try:
-            filter_query = {}
+            orders, total = self.repository.find(
+                status=status,
+                customer_name=customer_name,
+                date_from=date_from,
+                date_to=date_to,
+                page=page,
+                limit=limit
+            )
+
+            logger.info(f"Retrieved {len(orders)} orders (page {page}, total {total})")
+            return orders, total
+
+        except PyMongoError as e:
+            logger.error(f"Database error getting orders: {e}")
+            raise DatabaseError(f"Database error: {str(e)}")
+
+    async def get_orders_updated_since(
+        self,
+        since: datetime,
+        limit: int = 500,
+        after_id: Optional[UUID] = None
+    ) -> List[Order]:
+
+        try:
+            orders = self.repository.find_updated_since(since, limit, after_id)
 
-            if status:
-                filter_query["status"] = status.value
-            if customer_name:
-                filter_query["customer.name"] = {"$regex": customer_name, "$options": "i"}
-            if date_from or date_to:
-                date_filter = {}
-                if date_from:
-                    date_filter["$gte"] = date_from
-                if date_to:
-                    date_filter["$lte"] = date_to
-                filter_query["created_at"] = date_filter
+            logger.info(f"Retrieved {len(orders)} orders updated since {since.isoformat()}")
+            return orders
+
+        except PyMongoError as e:
+            logger.error(f"Database error getting orders updated since {since}: {e}")
+            raise DatabaseError(f"Database error: {str(e)}")
 
+    async def get_active_orders(self) -> List[Order]:
 
-            total = self.collection.count_documents(filter_query)
+        try:
+            orders = self.repository.find_by_statuses(ACTIVE_STATUSES)
 
+            logger.info(f"Retrieved {len(orders)} active orders")
+            return orders
 
-            cursor = self.collection.find(filter_query).sort("created_at", -1).skip((page - 1) * limit).limit(limit)
+        except PyMongoError as e:
+            logger.error(f"Database error getting active orders: {e}")
+            raise DatabaseError(f"Database error: {str(e)}")
 
-            orders = []
-            for order_data in cursor:
-                print(order_data, 'ORDERED')
-                order_data["id"] = order_data["_id"]
-                del order_data["_id"]
-                orders.append(Order(**order_data))
+    async def get_orders_by_ids(self, order_ids: List[UUID]) -> List[Order]:
+        """Orders by id, newest first, including archived ones when archival is enabled."""
 
-            logger.info(f"Retrieved {len(orders)} orders (page {page}, total {total})")
-            return orders, total
+        try:
+            orders = self.repository.get_many(order_ids)
+            orders.sort(key=lambda order: order.created_at, reverse=True)
+            return orders
 
         except PyMongoError as e:
-            logger.error(f"Database error getting orders: {e}")
+            logger.error(f"Database error getting orders by id: {e}")
             raise DatabaseError(f"Database error: {str(e)}")
 
-    async def update_order_status(self, order_id: UUID, new_status: OrderStatus) -> Order:
+    def iter_orders(self, batch_size: int = 500) -> Iterator[Order]:
+        """Every order, archived ones first, each collection oldest first; for backfills."""
+
+        return self.repository.iter_all(batch_size)
+
+    async def update_order_status(
+        self,
+        order_id: UUID,
+        new_status: OrderStatus,
+        expected_version: Optional[int] = None
+    ) -> Order:
 
         try:
+            # The repository checks the transition rule and writes in one
+            # atomic step; the order is only read again to explain why
+            # nothing matched.
+            def write(session):
+                updated = self.repository.transition(
+                    order_id,
+                    STATUS_TRANSITION_SOURCES[new_status],
+                    new_status,
+                    expected_version,
+                    datetime.utcnow(),
+                    session=session
+                )
+                if updated is None:
+                    return None
 
-            order = await self.get_order(order_id)
+                self.outbox.append("order_update", order_id, updated.model_dump(mode='json'), session=session)
+                if self.customers is not None and new_status == OrderStatus.CANCELLED:
+                    self.customers.record_cancellation(updated, session=session)
+                return updated
 
+            updated_order = self.repository.run_write(write)
 
-            if not self._is_valid_status_transition(order.status, new_status):
+            if updated_order is None:
+                order = await self.get_order(order_id)
+                if expected_version is not None and order.version != expected_version:
+                    raise ConcurrencyError(f"Order {order_id} was modified (expected version {expected_version})")
                 raise ValueError(f"Invalid status transition: {order.status} -> {new_status}")
 
-            print(new_status, order_id, "!@")
-            result = self.collection.update_one(
-                {"_id": Binary.from_uuid(order_id)},
-                {
-                    "$set": {
-                        "status": new_status.value,
-                        "updated_at": datetime.utcnow()
-                    }
-                }
-            )
+            if self.active_board is not None:
+                self.active_board.apply(updated_order)
 
-            if result.modified_count > 0:
-                logger.info(f"Order status updated: {order_id} -> {new_status.value}")
-                return await self.get_order(order_id)
-            else:
-                return order
+            logger.info(f"Order status updated: {order_id} -> {new_status.value}")
+            return updated_order
 
-        except (OrderNotFoundError, ValueError):
+        except (OrderNotFoundError, ConcurrencyError, ValueError):
             raise
         except PyMongoError as e:
             logger.error(f"Database error updating order status {order_id}: {e}")
             raise DatabaseError(f"Database error: {str(e)}")
 
-    async def cancel_order(self, order_id: UUID) -> Order:
-        return await self.update_order_status(order_id, OrderStatus.CANCELLED)
+    async def update_orders_status_bulk(self, order_ids: List[UUID], new_status: OrderStatus) -> List[dict]:
+        """Move many orders to ``new_status`` with one conditional bulk write.
+
+        Each update is conditioned on the status and version read just
+        before, so an order changed in between is reported as a conflict
+        rather than overwritten. The changed orders are published as one
+        ``orders_update`` outbox event. Returns one result per requested id,
+        in request order, with either the updated ``order`` or an ``error``.
+        """
 
-    async def get_orders_statistics(self) -> Dict[str, int]:
         try:
-            pipeline = [
-                {
-                    "$group": {
-                        "_id": "$status",
-                        "count": {"$sum": 1}
-                    }
-                }
-            ]
-            result = list(self.collection.aggregate(pipeline))
+            order_ids = list(dict.fromkeys(order_ids))
+            current = self.repository.get_states(order_ids)
+
+            errors: Dict[UUID, str] = {}
+            states = {}
+            for order_id in order_ids:
+                if order_id not in current:
+                    errors[order_id] = f"Order {order_id} not found"
+                    continue
+
+                status, version = current[order_id]
+                if not self._is_valid_status_transition(status, new_status):
+                    errors[order_id] = f"Invalid status transition: {status} -> {new_status}"
+                    continue
+
+                states[order_id] = (status, version)
+
+            now = datetime.utcnow()
+
+            def write(session):
+                updated = self.repository.transition_many(states, new_status, now, session=session)
+
+                if updated:
+                    self.outbox.append(
+                        "orders_update",
+                        None,
+                        {"orders": [order.model_dump(mode='json') for order in updated]},
+                        session=session
+                    )
+                    if self.customers is not None and new_status == OrderStatus.CANCELLED:
+                        self.customers.record_cancellations(updated, session=session)
+                return updated
+
+            updated_orders = {order.id: order for order in self.repository.run_write(write)}
+
+            if self.active_board is not None:
+                for order in updated_orders.values():
+                    self.active_board.apply(order)
+
+            results = []
+            for order_id in order_ids:
+                order = updated_orders.get(order_id)
+                if order is not None:
+                    results.append({"order_id": order_id, "order": order})
+                else:
+                    error = errors.get(order_id, f"Order {order_id} was modified concurrently")
+                    results.append({"order_id": order_id, "error": error})
+
+            logger.info(f"Bulk status update to {new_status.value}: {len(updated_orders)} of {len(order_ids)} orders")
+            return results
 
+        except PyMongoError as e:
+            logger.error(f"Database error in bulk status update: {e}")
+            raise DatabaseError(f"Database error: {str(e)}")
+
+    async def cancel_order(self, order_id: UUID, expected_version: Optional[int] = None) -> Order:
+        return await self.update_order_status(order_id, OrderStatus.CANCELLED, expected_version)
+
+    async def get_orders_statistics(self) -> Dict[str, int]:
+        try:
             stats = {status.value: 0 for status in OrderStatus}
 
-            for item in result:
-                if item["_id"] in stats:
-                    stats[item["_id"]] = item["count"]
+            for status, count in self.repository.count_by_status().items():
+                if status in stats:
+                    stats[status] += count
 
             logger.info(f"Orders statistics retrieved: {stats}")
 
@@ -195,13 +377,4 @@ class OrderService:
             raise DatabaseError(f"Database error: {str(e)}")
 
     def _is_valid_status_transition(self, current: OrderStatus, new: OrderStatus) -> bool:
-        valid_transitions = {
-            OrderStatus.NEW: [OrderStatus.CONFIRMED, OrderStatus.CANCELLED],
-            OrderStatus.CONFIRMED: [OrderStatus.PREPARING, OrderStatus.CANCELLED],
-            OrderStatus.PREPARING: [OrderStatus.READY, OrderStatus.CANCELLED],
-            OrderStatus.READY: [OrderStatus.COMPLETED, OrderStatus.CANCELLED],
-            OrderStatus.COMPLETED: [],
-            OrderStatus.CANCELLED: [],
-        }
-
-        return new in valid_transitions.get(current, [])
\ No newline at end of file
+        return new in VALID_STATUS_TRANSITIONS.get(current, [])
@@ -0,0 +1,237 @@
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import PyMongoError
+
+from app.models.order import Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+# Stored order layout. Keys are kept short because they are repeated in
+# every document; derived values (item and order totals) are not stored and
+# are recomputed by the models on read. Item names and categories live in
+# menu snapshots and are referenced by id.
+STATUS = "s"
+CUSTOMER = "c"
+ITEMS = "i"
+NOTES = "no"
+DELIVERY_ADDRESS = "da"
+DELIVERY_TIME = "dt"
+CREATED_AT = "ca"
+UPDATED_AT = "ua"
+VERSION = "v"
+
+CUSTOMER_FIELDS = {"name": "n", "phone": "p", "email": "e", "address": "a"}
+CUSTOMER_NAME = f"{CUSTOMER}.{CUSTOMER_FIELDS['name']}"
+CUSTOMER_PHONE = f"{CUSTOMER}.{CUSTOMER_FIELDS['phone']}"
+
+ITEM_PRODUCT = "p"
+ITEM_SNAPSHOT = "m"
+ITEM_QUANTITY = "q"
+ITEM_PRICE = "u"
+ITEM_SPECIAL_REQUESTS = "r"
+
+OPTIONAL_FIELDS = {"notes": NOTES, "delivery_address": DELIVERY_ADDRESS, "delivery_time": DELIVERY_TIME}
+
+
+def snapshot_id(product_id: UUID, name: str, category: Optional[str]) -> int:
+    """Content-derived id of a product's name and category, stable across workers."""
+
+    key = f"{product_id}|{name}|{category or ''}".encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "big", signed=True)
+
+
+def to_document(order: Order, snapshot_ids: List[int]) -> dict:
+
+    document = {
+        "_id": order.id,
+        STATUS: order.status.value,
+        CUSTOMER: {
+            short: value
+            for field, short in CUSTOMER_FIELDS.items()
+            if (value := getattr(order.customer, field)) is not None
+        },
+        ITEMS: [item_document(item, snapshot) for item, snapshot in zip(order.items, snapshot_ids)],
+        CREATED_AT: order.created_at,
+        UPDATED_AT: order.updated_at,
+        VERSION: order.version,
+    }
+
+    for field, short in OPTIONAL_FIELDS.items():
+        value = getattr(order, field)
+        if value is not None:
+            document[short] = value
+    return document
+
+
+def item_document(item: OrderItem, snapshot: int) -> dict:
+
+    document = {
+        ITEM_PRODUCT: item.id,
+        ITEM_SNAPSHOT: snapshot,
+        ITEM_QUANTITY: item.quantity,
+        ITEM_PRICE: item.price,
+    }
+    if item.special_requests is not None:
+        document[ITEM_SPECIAL_REQUESTS] = item.special_requests
+    return document
+
+
+# Indexes that are no longer created: those of the layout with full field
+# names, and ``ua`` and ``ca`` alone, now paired with ``_id``. Dropped once no
+# legacy document is left.
+LEGACY_INDEXES = [
+    "status_1",
+    "customer.name_1",
+    "customer.phone_1",
+    "created_at_-1",
+    "updated_at_1",
+    "status_1_updated_at_1",
+    "ua_1",
+    "ca_-1",
+]
+
+
+def is_legacy(document: dict) -> bool:
+    """Whether ``document`` is still stored with the model's field names."""
+
+    return STATUS not in document and "status" in document
+
+
+def snapshot_ids_of(documents: Iterable[dict]) -> set:
+
+    return {item[ITEM_SNAPSHOT] for document in documents if not is_legacy(document) for item in document[ITEMS]}
+
+
+def from_document(document: dict, snapshots: Dict[int, dict]) -> Order:
+
+    if is_legacy(document):
+        # Written by a worker that predates the compact layout; its item
+        # names are still inline.
+        document, inline_snapshots = compact_legacy(document)
+        snapshots = {**snapshots, **inline_snapshots}
+
+    items = []
+    for item in document[ITEMS]:
+        snapshot = snapshots.get(item[ITEM_SNAPSHOT]) or {"name": "", "category": None}
+        items.append(OrderItem(
+            id=item[ITEM_PRODUCT],
+            name=snapshot["name"],
+            category=snapshot.get("category"),
+            quantity=item[ITEM_QUANTITY],
+            price=item[ITEM_PRICE],
+            special_requests=item.get(ITEM_SPECIAL_REQUESTS)
+        ))
+
+    customer = document[CUSTOMER]
+    return Order(
+        id=document["_id"],
+        status=document[STATUS],
+        customer={field: customer.get(short) for field, short in CUSTOMER_FIELDS.items()},
+        items=items,
+        created_at=document[CREATED_AT],
+        updated_at=document[UPDATED_AT],
+        version=document.get(VERSION, 1),
+        **{field: document.get(short) for field, short in OPTIONAL_FIELDS.items()}
+    )
+
+
+def compact_legacy(document: dict) -> Tuple[dict, Dict[int, dict]]:
+    """Rewrite an order stored with the model's field names into the compact layout."""
+
+    snapshots = {}
+    items = []
+    for item in document.get("items", []):
+        snapshot = snapshot_id(item["id"], item["name"], item.get("category"))
+        snapshots[snapshot] = {"product_id": item["id"], "name": item["name"], "category": item.get("category")}
+        compact_item = {
+            ITEM_PRODUCT: item["id"],
+            ITEM_SNAPSHOT: snapshot,
+            ITEM_QUANTITY: item["quantity"],
+            ITEM_PRICE: item["price"],
+        }
+        if item.get("special_requests") is not None:
+            compact_item[ITEM_SPECIAL_REQUESTS] = item["special_requests"]
+        items.append(compact_item)
+
+    customer = document.get("customer") or {}
+    compact = {
+        "_id": document["_id"],
+        STATUS: document["status"],
+        CUSTOMER: {short: customer[field] for field, short in CUSTOMER_FIELDS.items() if customer.get(field) is not None},
+        ITEMS: items,
+        CREATED_AT: document["created_at"],
+        UPDATED_AT: document["updated_at"],
+        VERSION: document.get("version", 1),
+    }
+    for field, short in OPTIONAL_FIELDS.items():
+        if document.get(field) is not None:
+            compact[short] = document[field]
+    return compact, snapshots
+
+
+class MenuSnapshots:
+    """Immutable product name/category snapshots that order items refer to.
+
+    A snapshot never changes once written, so resolved snapshots are cached
+    in process and a worker writes each one at most once.
+    """
+
+    def __init__(self, db_client: MongoClient, cache_size: int = 10000, database_name: str = "restaurant_db"):
+
+        self.db = db_client[database_name]
+        self.collection = self.db.menu_snapshots
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[int, dict]" = OrderedDict()
+
+    def register(self, product_id: UUID, name: str, category: Optional[str]) -> int:
+
+        snapshot = snapshot_id(product_id, name, category)
+        if snapshot not in self._cache:
+            self.save({snapshot: {"product_id": product_id, "name": name, "category": category}})
+        return snapshot
+
+    def save(self, snapshots: Dict[int, dict]):
+
+        missing = {key: value for key, value in snapshots.items() if key not in self._cache}
+        if not missing:
+            return
+
+        self.collection.bulk_write(
+            [UpdateOne({"_id": key}, {"$setOnInsert": value}, upsert=True) for key, value in missing.items()],
+            ordered=False
+        )
+        for key, value in missing.items():
+            self._remember(key, value)
+
+    def resolve(self, snapshot_ids: Iterable[int]) -> Dict[int, dict]:
+
+        resolved = {}
+        missing = []
+        for key in snapshot_ids:
+            snapshot = self._cache.get(key)
+            if snapshot is None:
+                missing.append(key)
+            else:
+                resolved[key] = snapshot
+
+        if missing:
+            try:
+                for snapshot in self.collection.find({"_id": {"$in": missing}}):
+                    key = snapshot.pop("_id")
+                    self._remember(key, snapshot)
+                    resolved[key] = snapshot
+            except PyMongoError as e:
+                logger.error(f"Database error resolving menu snapshots: {e}")
+                raise
+
+        return resolved
+
+    def _remember(self, key: int, snapshot: dict):
+
+        self._cache[key] = snapshot
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+from uuid import UUID
+from pymongo import ASCENDING, MongoClient, ReturnDocument
+from pymongo.client_session import ClientSession
+from pymongo.errors import PyMongoError
+
+from app.exceptions import DatabaseError
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxService:
+    """Durable, totally ordered log of order events.
+
+    Events are appended in the same transaction as the order change they
+    describe and are delivered later by the dispatcher, so a crash between
+    the write and the broadcast no longer loses the event. Sequence numbers
+    come from a single counter document shared by all workers; the counter
+    is taken inside the transaction, so concurrent appends commit in
+    sequence order and an aborted one gives its number back. An append made
+    without a session runs in a transaction of its own.
+    """
+
+    def __init__(self, db_client: MongoClient, database_name: str = "restaurant_db"):
+        self.db_client = db_client
+        self.db = db_client[database_name]
+        self.collection = self.db.outbox
+        self.counters = self.db.counters
+        self.offsets = self.db.outbox_offsets
+        self.wakeup = asyncio.Event()
+
+    def ensure_indexes(self, retention_seconds: int):
+
+        self.collection.create_index([("created_at", ASCENDING)], expireAfterSeconds=retention_seconds)
+        # Consumers are named per process, so offsets of exited workers expire with the events.
+        self.offsets.create_index([("updated_at", ASCENDING)], expireAfterSeconds=retention_seconds)
+
+    def require_transactions(self):
+        """Fail fast on a deployment without transactions, where events could be lost or skipped."""
+
+        hello = self.db_client.admin.command("hello")
+        if not hello.get("setName") and hello.get("msg") != "isdbgrid":
+            raise RuntimeError(
+                "The order outbox needs MongoDB transactions: run MongoDB as a replica set "
+                "(a single-node one is enough) or use STORAGE_BACKEND=memory"
+            )
+
+    def _in_transaction(self, callback, session: Optional[ClientSession]):
+
+        if session is not None:
+            return callback(session)
+
+        with self.db_client.start_session() as own_session:
+            return own_session.with_transaction(callback)
+
+    def append(
+        self,
+        event_type: str,
+        order_id: Optional[UUID],
+        data: dict,
+        session: Optional[ClientSession] = None
+    ) -> int:
+
+        return self.append_many(event_type, [(order_id, data)], session=session)
+
+    def append_many(
+        self,
+        event_type: str,
+        events: Sequence[Tuple[Optional[UUID], dict]],
+        session: Optional[ClientSession] = None
+    ) -> int:
+        """Append ``(order_id, data)`` events with consecutive sequence numbers; returns the last one."""
+
+        def write(session: ClientSession) -> int:
+
+            counter = self.counters.find_one_and_update(
+                {"_id": "outbox"},
+                {"$inc": {"seq": len(events)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+                session=session
+            )
+            last = counter["seq"]
+            created_at = datetime.utcnow()
+
+            self.collection.insert_many(
+                [
+                    {
+                        "_id": seq,
+                        "type": event_type,
+                        "order_id": str(order_id) if order_id else None,
+                        "data": data,
+                        "created_at": created_at
+                    }
+                    for seq, (order_id, data) in zip(range(last - len(events) + 1, last + 1), events)
+                ],
+                session=session
+            )
+            return last
+
+        last = self._in_transaction(write, session)
+        self.wakeup.set()
+        return last
+
+    async def read_batch(self, after: int, limit: int) -> List[dict]:
+
+        try:
+            cursor = self.collection.find({"_id": {"$gt": after}}).sort("_id", ASCENDING).limit(limit)
+            return list(cursor)
+        except PyMongoError as e:
+            logger.error(f"Database error reading outbox after {after}: {e}")
+            raise DatabaseError(f"Database error: {str(e)}")
+
+    async def latest_sequence(self) -> int:
+
+        try:
+            counter = self.counters.find_one({"_id": "outbox"})
+            return counter["seq"] if counter else 0
+        except PyMongoError as e:
+            logger.error(f"Database error reading outbox sequence: {e}")
+            raise DatabaseError(f"Database error: {str(e)}")
+
+    async def get_offset(self, consumer: str) -> Optional[int]:
+
+        try:
+            offset = self.offsets.find_one({"_id": consumer})
+            return offset["seq"] if offset else None
+        except PyMongoError as e:
+            logger.error(f"Database error reading outbox offset for {consumer}: {e}")
+            raise DatabaseError(f"Database error: {str(e)}")
+
+    async def save_offset(self, consumer: str, seq: int):
+
+        try:
+            self.offsets.update_one(
+                {"_id": consumer},
+                {"$set": {"seq": seq, "updated_at": datetime.utcnow()}},
+                upsert=True
+            )
+        except PyMongoError as e:
+            logger.error(f"Database error saving outbox offset for {consumer}: {e}")
+            raise DatabaseError(f"Database error: {str(e)}")
@@ -1,54 +1,65 @@
 import logging
+import time
 from datetime import datetime
 from typing import List, Optional
 from uuid import UUID
-from pymongo import MongoClient
 from pymongo.errors import PyMongoError
-from bson import Binary
 from bson.errors import InvalidId
 
 from app.models.product import Product
 from app.dto.product import ProductCreate, ProductUpdate
-from app.exceptions import ProductNotFoundError, DatabaseError
+from app.exceptions import ProductNotFoundError, DatabaseError, ConcurrencyError
+from app.services.repositories import ProductRepository
+from app.services.versions import CollectionVersions, PRODUCTS
+from app.services.product_search import ProductSearchIndex
+from app.services.menu import MenuSnapshot
 
 logger = logging.getLogger(__name__)
 
 
 class ProductService:
-    def __init__(self, db_client: MongoClient):
-        self.db = db_client.restaurant_db
-        self.collection = self.db.products
+    def __init__(
+        self,
+        repository: ProductRepository,
+        versions: CollectionVersions,
+        search_refresh_interval: float = 5.0
+    ):
+        self.repository = repository
+        self.versions = versions
+        # Writes made by this worker update the search index in place; writes
+        # from other workers are noticed through the products version, which
+        # is checked at most once per ``search_refresh_interval``.
+        self.search_index = ProductSearchIndex()
+        self.search_refresh_interval = search_refresh_interval
+        self._search_checked_at = 0.0
+        self._menu: Optional[MenuSnapshot] = None
+        self._menu_generation = -1
 
     async def create_product(self, product_data: ProductCreate) -> Product:
         """Создание товара"""
         try:
             product = Product(**product_data.model_dump())
 
-            result = self.collection.insert_one(product.model_dump(by_alias=True))
+            self.repository.insert(product)
 
-            if result.inserted_id:
-                logger.info(f"Product created successfully: {product.id}")
-                return product
-            else:
-                raise DatabaseError("Failed to create product")
+            self._update_search_index(self.versions.bump(PRODUCTS), product=product)
+            logger.info(f"Product created successfully: {product.id}")
+            return product
 
         except PyMongoError as e:
             logger.error(f"Database error creating product: {e}")
             raise DatabaseError(f"Database error: {str(e)}")
 
-    async def get_product(self, product_id: UUID) -> Optional[Product]:
+    async def get_product(self, product_id: UUID, allow_stale: bool = False) -> Optional[Product]:
 
         try:
-            product_data = self.collection.find_one({"_id": Binary.from_uuid(product_id)})
+            product = self.repository.get(product_id, allow_stale=allow_stale)
 
-            if not product_data:
+            if product is None:
                 logger.warning(f"Product not found: {product_id}")
                 raise ProductNotFoundError(f"Product {product_id} not found")
 
-            product_data["id"] = product_id
-            del product_data["_id"]
-
-            return Product(**product_data)
+            return product
 
         except InvalidId:
             logger.error(f"Invalid product ID format: {product_id}")
@@ -57,6 +68,20 @@ class ProductService:
             logger.error(f"Database error getting product {product_id}: {e}")
             raise DatabaseError(f"Database error: {str(e)}")
 
+    async def get_product_version(self, product_id: UUID, allow_stale: bool = False) -> tuple[int, datetime]:
+
+        try:
+            version = self.repository.get_version(product_id, allow_stale=allow_stale)
+
+            if version is None:
+                raise ProductNotFoundError(f"Product {product_id} not found")
+
+            return version
+
+        except PyMongoError as e:
+            logger.error(f"Database error getting product {product_id}: {e}")
+            raise DatabaseError(f"Database error: {str(e)}")
+
     async def get_products(self,
         category: Optional[str] = None,
         available_only: bool = False,
@@ -64,22 +89,12 @@ class ProductService:
         limit: int = 10,
     ) -> tuple[List[Product], int]:
         try:
-            filter_query = {}
-
-            if category:
-                filter_query["category"] = category
-            if available_only:
-                filter_query["is_available"] = True
-
-            total = self.collection.count_documents(filter_query)
-
-            cursor = self.collection.find(filter_query).skip((page - 1) * limit).limit(limit)
-
-            products = []
-            for product_data in cursor:
-                product_data["id"] = product_data["_id"]
-                del product_data["_id"]
-                products.append(Product(**product_data))
+            products, total = self.repository.find(
+                category=category,
+                available_only=available_only,
+                page=page,
+                limit=limit
+            )
 
             logger.info(f"Retrieved {len(products)} products (page {page}, total {total})")
             return products, total
@@ -88,45 +103,122 @@ class ProductService:
             logger.error(f"Database error getting products: {e}")
             raise DatabaseError(f"Database error: {str(e)}")
 
-    async def update_product(self, product_id: UUID, product_data: ProductUpdate) -> Product:
+    async def search_products(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        available_only: bool = False,
+        limit: int = 10
+    ) -> List[Product]:
+        """Prefix search served from the in-process index."""
+
+        await self._refresh_search_index_if_due()
+        return self.search_index.search(query, category=category, available_only=available_only, limit=limit)
+
+    async def get_menu(self) -> MenuSnapshot:
+        """The available menu, rendered and compressed once per change of the product set."""
+
+        await self._refresh_search_index_if_due()
+
+        generation = self.search_index.generation
+        if self._menu is None or self._menu_generation != generation:
+            self._menu = MenuSnapshot(self.search_index.products.values())
+            self._menu_generation = generation
+            logger.info(f"Menu snapshot rendered: {self._menu.size} bytes, etag {self._menu.etag}")
+        return self._menu
+
+    async def _refresh_search_index_if_due(self):
+
+        if time.monotonic() - self._search_checked_at >= self.search_refresh_interval:
+            await self.refresh_search_index()
+
+    async def refresh_search_index(self):
+        """Rebuild the search index if the products collection changed since it was built."""
+
+        version = await self.versions.get(PRODUCTS)
+        self._search_checked_at = time.monotonic()
+        if version == self.search_index.version:
+            return
+
         try:
-            await self.get_product(product_id)
+            products = self.repository.all()
+        except PyMongoError as e:
+            logger.error(f"Database error loading products for search: {e}")
+            raise DatabaseError(f"Database error: {str(e)}")
+
+        self.search_index.rebuild(products, version)
+        logger.info(f"Product search index rebuilt with {len(products)} products at version {version}")
 
+    async def update_product(
+        self,
+        product_id: UUID,
+        product_data: ProductUpdate,
+        expected_version: Optional[int] = None
+    ) -> Product:
+        try:
             update_data = {k: v for k, v in product_data.model_dump().items() if v is not None}
             update_data["updated_at"] = datetime.utcnow()
 
-            result = self.collection.update_one(
-                {"_id": Binary.from_uuid(product_id)},
-                {"$set": update_data}
-            )
+            product = self.repository.update(product_id, update_data, expected_version)
+
+            if product is None:
+                self._raise_write_miss(product_id, expected_version)
 
-            if result.modified_count > 0:
-                logger.info(f"Product updated successfully: {product_id}")
-                return await self.get_product(product_id)
-            else:
-                logger.warning(f"No changes made to product: {product_id}")
-                return await self.get_product(product_id)
+            self._update_search_index(self.versions.bump(PRODUCTS), product=product)
+            logger.info(f"Product updated successfully: {product_id}")
+            return product
 
-        except ProductNotFoundError:
+        except (ProductNotFoundError, ConcurrencyError):
             raise
         except PyMongoError as e:
             logger.error(f"Database error updating product {product_id}: {e}")
             raise DatabaseError(f"Database error: {str(e)}")
 
-    async def delete_product(self, product_id: UUID) -> bool:
+    async def delete_product(self, product_id: UUID, expected_version: Optional[int] = None) -> bool:
         try:
-            await self.get_product(product_id)
+            if not self.repository.delete(product_id, expected_version):
+                self._raise_write_miss(product_id, expected_version)
 
-            result = self.collection.delete_one({"_id": Binary.from_uuid(product_id)})
+            self._update_search_index(self.versions.bump(PRODUCTS), product_id=product_id)
+            logger.info(f"Product deleted successfully: {product_id}")
+            return True
 
-            if result.deleted_count > 0:
-                logger.info(f"Product deleted successfully: {product_id}")
-                return True
-            else:
-                return False
-
-        except ProductNotFoundError:
+        except (ProductNotFoundError, ConcurrencyError):
             raise
         except PyMongoError as e:
             logger.error(f"Database error deleting product {product_id}: {e}")
-            raise DatabaseError(f"Database error: {str(e)}")
\ No newline at end of file
+            raise DatabaseError(f"Database error: {str(e)}")
+
+    def _update_search_index(
+        self,
+        version: int,
+        product: Optional[Product] = None,
+        product_id: Optional[UUID] = None
+    ):
+        """Apply this worker's write to the search index.
+
+        The index only moves to ``version`` when it was at the version right
+        before it; otherwise another worker wrote in between and the next
+        refresh rebuilds the index.
+        """
+
+        index = self.search_index
+        if index.version is None:
+            return
+
+        if product is not None:
+            index.upsert(product)
+        else:
+            index.remove(product_id)
+
+        if index.version == version - 1:
+            index.version = version
+
+    def _raise_write_miss(self, product_id: UUID, expected_version: Optional[int]):
+        """A conditional write matched nothing: tell a missing product from a stale version."""
+
+        if expected_version is not None and self.repository.exists(product_id):
+            raise ConcurrencyError(f"Product {product_id} was modified (expected version {expected_version})")
+
+        logger.warning(f"Product not found: {product_id}")
+        raise ProductNotFoundError(f"Product {product_id} not found")
@@ -0,0 +1,126 @@
+import bisect
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set
+from uuid import UUID
+
+from app.models.product import Product
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    """Case-folded NFKC text with ``ё`` folded to ``е``, as Russian menus spell both."""
+
+    return unicodedata.normalize("NFKC", text).casefold().replace("ё", "е")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return TOKEN_PATTERN.findall(normalize(text)) if text else []
+
+
+class ProductSearchIndex:
+    """Inverted index over product name, category and description.
+
+    Tokens map to the ids of the products containing them and are also kept
+    in a sorted list, so every token starting with a prefix is one bisect
+    away. A query matches products that contain, for each query word, a
+    token starting with that word. The index is changed in place on each
+    write and remembers the products collection version it reflects;
+    ``generation`` changes on every change, so views derived from the index
+    can tell when to rebuild.
+    """
+
+    def __init__(self):
+
+        self.version: Optional[int] = None
+        self.generation = 0
+        self.products: Dict[UUID, Product] = {}
+        self._postings: Dict[str, Set[UUID]] = {}
+        self._tokens: List[str] = []
+        self._product_tokens: Dict[UUID, Set[str]] = {}
+
+    def rebuild(self, products: Iterable[Product], version: int):
+
+        self.products = {}
+        self._postings = {}
+        self._product_tokens = {}
+        for product in products:
+            self._add(product)
+        self._tokens = sorted(self._postings)
+        self.version = version
+        self.generation += 1
+
+    def upsert(self, product: Product):
+
+        self.remove(product.id)
+        self._add(product, keep_sorted=True)
+        self.generation += 1
+
+    def remove(self, product_id: UUID):
+
+        if self.products.pop(product_id, None) is not None:
+            self.generation += 1
+        for token in self._product_tokens.pop(product_id, ()):
+            postings = self._postings[token]
+            postings.discard(product_id)
+            if not postings:
+                del self._postings[token]
+                del self._tokens[bisect.bisect_left(self._tokens, token)]
+
+    def search(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        available_only: bool = False,
+        limit: int = 10
+    ) -> List[Product]:
+
+        words = tokenize(query)
+        if not words:
+            return []
+
+        matches: Optional[Set[UUID]] = None
+        # Longest words first: they have the fewest completions and shrink the set fastest.
+        for word in sorted(set(words), key=len, reverse=True):
+            found = self._complete(word)
+            matches = found if matches is None else matches & found
+            if not matches:
+                return []
+
+        category_key = normalize(category) if category else None
+        results = [
+            self.products[product_id] for product_id in matches
+            if (not available_only or self.products[product_id].is_available)
+            and (category_key is None or normalize(self.products[product_id].category) == category_key)
+        ]
+
+        first = words[0]
+        results.sort(key=lambda product: (not normalize(product.name).startswith(first), product.name))
+        return results[:limit]
+
+    def _complete(self, prefix: str) -> Set[UUID]:
+
+        found: Set[UUID] = set()
+        tokens = self._tokens
+        position = bisect.bisect_left(tokens, prefix)
+        while position < len(tokens) and tokens[position].startswith(prefix):
+            found |= self._postings[tokens[position]]
+            position += 1
+        return found
+
+    def _add(self, product: Product, keep_sorted: bool = False):
+
+        tokens = set(tokenize(product.name)) | set(tokenize(product.category)) | set(tokenize(product.description))
+        self.products[product.id] = product
+        self._product_tokens[product.id] = tokens
+        for token in tokens:
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = set()
+                if keep_sorted:
+                    bisect.insort(self._tokens, token)
+            postings.add(product.id)
+
+    def __len__(self) -> int:
+        return len(self.products)
@@ -0,0 +1,153 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+from uuid import UUID
+
+from app.models.order import Order, OrderStatus
+from app.models.product import Product
+
+T = TypeVar("T")
+
+# Opaque per-backend transaction handle passed back to ``session=`` arguments.
+WriteCallback = Callable[[Optional[object]], T]
+
+
+class OrderRepository(ABC):
+    """Storage of orders, independent of the database behind it.
+
+    Methods are synchronous and raise the backend's own errors; the service
+    turns those into ``DatabaseError``. ``run_write`` runs a callback in a
+    transaction where the backend has them, and the callback's session is
+    passed to every write that has to commit with it.
+    """
+
+    def ensure_indexes(self):
+        pass
+
+    def migrate(self):
+        pass
+
+    def run_write(self, callback: WriteCallback) -> T:
+        return callback(None)
+
+    @abstractmethod
+    def insert(self, order: Order, session=None):
+        ...
+
+    @abstractmethod
+    def insert_many(self, orders: List[Order], session=None):
+        """Insert every order, or none when one is rejected."""
+
+    @abstractmethod
+    def get(self, order_id: UUID) -> Optional[Order]:
+        ...
+
+    @abstractmethod
+    def get_version(self, order_id: UUID) -> Optional[Tuple[int, datetime]]:
+        ...
+
+    @abstractmethod
+    def get_states(self, order_ids: Iterable[UUID]) -> Dict[UUID, Tuple[OrderStatus, int]]:
+        """Current status and version of the orders that exist among ``order_ids``."""
+
+    @abstractmethod
+    def get_many(self, order_ids: List[UUID]) -> List[Order]:
+        ...
+
+    @abstractmethod
+    def find(
+        self,
+        status: Optional[OrderStatus] = None,
+        customer_name: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        page: int = 1,
+        limit: int = 10
+    ) -> Tuple[List[Order], int]:
+        """A page of orders, newest first, and the total matching; ``customer_name`` is a case-insensitive regex."""
+
+    @abstractmethod
+    def find_updated_since(self, since: datetime, limit: int, after_id: Optional[UUID] = None) -> List[Order]:
+        """Orders after the ``(updated_at, id)`` cursor, in that order; ``after_id`` None means every id at ``since``."""
+
+    @abstractmethod
+    def find_by_statuses(self, statuses: Iterable[OrderStatus]) -> List[Order]:
+        ...
+
+    @abstractmethod
+    def iter_all(self, batch_size: int = 500) -> Iterator[Order]:
+        ...
+
+    @abstractmethod
+    def transition(
+        self,
+        order_id: UUID,
+        sources: List[OrderStatus],
+        new_status: OrderStatus,
+        expected_version: Optional[int],
+        updated_at: datetime,
+        session=None
+    ) -> Optional[Order]:
+        """Set ``new_status`` if the order is in one of ``sources`` (and at ``expected_version``); None if not."""
+
+    @abstractmethod
+    def transition_many(
+        self,
+        states: Dict[UUID, Tuple[OrderStatus, int]],
+        new_status: OrderStatus,
+        updated_at: datetime,
+        session=None
+    ) -> List[Order]:
+        """Set ``new_status`` on each order still in the given status and version; returns the updated ones."""
+
+    @abstractmethod
+    def count_by_status(self) -> Dict[str, int]:
+        ...
+
+
+class ProductRepository(ABC):
+    """Storage of products; same conventions as ``OrderRepository``."""
+
+    def ensure_indexes(self):
+        pass
+
+    def migrate(self):
+        pass
+
+    @abstractmethod
+    def insert(self, product: Product):
+        ...
+
+    @abstractmethod
+    def get(self, product_id: UUID, allow_stale: bool = False) -> Optional[Product]:
+        ...
+
+    @abstractmethod
+    def get_version(self, product_id: UUID, allow_stale: bool = False) -> Optional[Tuple[int, datetime]]:
+        ...
+
+    @abstractmethod
+    def exists(self, product_id: UUID) -> bool:
+        ...
+
+    @abstractmethod
+    def find(
+        self,
+        category: Optional[str] = None,
+        available_only: bool = False,
+        page: int = 1,
+        limit: int = 10
+    ) -> Tuple[List[Product], int]:
+        ...
+
+    @abstractmethod
+    def all(self) -> List[Product]:
+        ...
+
+    @abstractmethod
+    def update(self, product_id: UUID, changes: dict, expected_version: Optional[int] = None) -> Optional[Product]:
+        """Apply ``changes`` and bump the version; None if no product matched."""
+
+    @abstractmethod
+    def delete(self, product_id: UUID, expected_version: Optional[int] = None) -> bool:
+        ...
@@ -0,0 +1,42 @@
+import logging
+from pymongo import MongoClient, ReturnDocument
+from pymongo.client_session import ClientSession
+from pymongo.errors import PyMongoError
+from typing import Optional
+
+from app.exceptions import DatabaseError
+
+logger = logging.getLogger(__name__)
+
+PRODUCTS = "products"
+# Every order write appends an outbox event, so the outbox sequence doubles
+# as the version of the orders collection.
+ORDERS = "outbox"
+
+
+class CollectionVersions:
+    """Per-collection change counters used to validate cached list responses."""
+
+    def __init__(self, db_client: MongoClient, database_name: str = "restaurant_db"):
+        self.db = db_client[database_name]
+        self.counters = self.db.counters
+
+    def bump(self, name: str, session: Optional[ClientSession] = None) -> int:
+
+        counter = self.counters.find_one_and_update(
+            {"_id": name},
+            {"$inc": {"seq": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+        return counter["seq"]
+
+    async def get(self, name: str) -> int:
+
+        try:
+            counter = self.counters.find_one({"_id": name})
+            return counter["seq"] if counter else 0
+        except PyMongoError as e:
+            logger.error(f"Database error reading version of {name}: {e}")
+            raise DatabaseError(f"Database error: {str(e)}")
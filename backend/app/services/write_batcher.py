@@ -0,0 +1,74 @@
+import asyncio
+import logging
+from typing import Callable, Generic, List, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class WriteBatcher(Generic[T]):
+    """Group commit for concurrent writes.
+
+    ``submit`` queues an item and waits. The queue is flushed with one call
+    to ``flush`` once it holds ``max_size`` items or ``max_delay`` seconds
+    after the first item arrived, whichever comes first, so the added
+    latency is bounded by ``max_delay``. ``flush`` returns one entry per
+    item: None when it was written, or the exception to raise in that
+    item's caller.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[List[T]], List[Optional[BaseException]]],
+        max_size: int = 50,
+        max_delay: float = 0.005
+    ):
+        self.flush = flush
+        self.max_size = max_size
+        self.max_delay = max_delay
+
+        self.batches = 0
+        self.items = 0
+        self._pending: List[Tuple[T, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def submit(self, item: T):
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_size:
+            self._flush_pending()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush_pending)
+
+        await future
+
+    def _flush_pending(self):
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        try:
+            results = self.flush([item for item, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+
+        self.batches += 1
+        self.items += len(batch)
+
+        for (_, future), error in zip(batch, results):
+            # A caller that went away still had its item written (or not).
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
@@ -4,9 +4,22 @@ from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
 
+    # "mongo", or "memory" to keep orders, products and the outbox in process (tests and benchmarks).
+    storage_backend: str = "mongo"
+
     mongodb_url: str = "mongodb://localhost:27017"
     database_name: str = "restaurant_db"
 
+    mongodb_max_pool_size: int = 100
+    mongodb_min_pool_size: int = 0
+    mongodb_warmup_connections: int = 10
+    mongodb_connect_timeout_ms: int = 10000
+    mongodb_server_selection_timeout_ms: int = 10000
+    mongodb_socket_timeout_ms: int = 0
+    mongodb_compressors: str = ""
+    mongodb_secondary_reads: bool = False
+    mongodb_max_staleness_s: int = 90
+
     log_level: str = "INFO"
     log_file: str = "app.log"
 
@@ -16,6 +29,62 @@ class Settings(BaseSettings):
 
     cors_origins: list = ["http://localhost:3000", "http://localhost:8080"]
 
+    websocket_event_log_size: int = 1000
+    websocket_sync_max_orders: int = 500
+    websocket_coalesce_window_ms: int = 0
+    websocket_statistics_interval_ms: int = 0
+    websocket_per_message_deflate: bool = True
+    websocket_heartbeat_interval_s: float = 25.0
+    websocket_idle_timeout_s: float = 75.0
+    websocket_max_connections: dict = {"customers": 5000, "staff": 200, "admin": 50}
+    websocket_reconnect_window_s: float = 10.0
+
+    shutdown_drain_timeout_s: float = 15.0
+
+    outbox_consumer_name: str = ""
+    outbox_batch_size: int = 100
+    outbox_poll_interval_ms: int = 500
+    outbox_gap_timeout_s: float = 5.0
+    outbox_retention_hours: int = 24
+
+    idempotency_ttl_hours: int = 24
+    idempotency_lease_s: float = 30.0
+    idempotency_cache_size: int = 10000
+
+    product_search_refresh_s: float = 5.0
+
+    customer_recent_orders: int = 20
+
+    order_insert_batch_ms: int = 0
+    order_insert_batch_size: int = 50
+
+    order_archive_after_days: int = 0
+    order_archive_interval_s: int = 300
+    order_archive_batch_size: int = 500
+
+    # Off by default: behind a proxy every client shares the proxy's address
+    # unless the proxy is listed in rate_limit_trusted_proxies.
+    rate_limit_enabled: bool = False
+    rate_limit_trusted_proxies: list = []
+    rate_limit_shared: bool = False
+    rate_limit_max_keys: int = 100000
+    rate_limit_default: list = [20, 40]
+    rate_limit_routes: dict = {"GET /api/v1/orders": [10, 20], "POST /api/v1/orders": [2, 10]}
+    websocket_connect_rate: list = [1, 10]
+    websocket_message_rate: dict = {"customers": [5, 20], "staff": [20, 100], "admin": [20, 100]}
+
+    # Off by default (0): the Mongo latency average also counts startup
+    # migrations, the customer backfill and archive batches.
+    shed_mongo_latency_ms: float = 0.0
+    shed_loop_lag_ms: float = 0.0
+
+    loop_monitor_interval_ms: int = 100
+    loop_block_threshold_ms: int = 100
+    profiler_max_duration_s: float = 60.0
+
+    # Admin endpoints are disabled while the token is empty.
+    admin_token: str = ""
+
     enable_metrics: bool = True
     metrics_port: int = 9090
 
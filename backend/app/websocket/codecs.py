@@ -0,0 +1,53 @@
+import json
+from typing import Dict, Union
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+SUPPORTED_ENCODINGS = (JSON, MSGPACK) if msgpack is not None else (JSON,)
+
+
+class EncodedMessage:
+    """A message serialized at most once per wire encoding, however many sockets receive it."""
+
+    def __init__(self, message: dict):
+
+        self.message = message
+        self._frames: Dict[str, Union[str, bytes]] = {}
+
+    def frame(self, encoding: str = JSON) -> Union[str, bytes]:
+
+        frame = self._frames.get(encoding)
+        if frame is None:
+            frame = encode(self.message, encoding)
+            self._frames[encoding] = frame
+        return frame
+
+
+def encode(message: dict, encoding: str = JSON) -> Union[str, bytes]:
+
+    if encoding == MSGPACK:
+        return msgpack.packb(message, default=str, use_bin_type=True)
+
+    # Order payloads are mostly Cyrillic; escaping it to \uXXXX triples the size.
+    return json.dumps(message, default=str, ensure_ascii=False)
+
+
+def decode(data: Union[str, bytes]) -> dict:
+
+    if isinstance(data, bytes):
+        if msgpack is None:
+            raise ValueError("Binary messages are not supported")
+        message = msgpack.unpackb(data, raw=False)
+    else:
+        message = json.loads(data)
+
+    if not isinstance(message, dict):
+        raise ValueError("Message must be an object")
+    return message
@@ -1,15 +1,29 @@
-import json
+import asyncio
 import logging
-from typing import Dict, Set
-from uuid import UUID
+import random
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple
+from uuid import UUID, uuid4
 from fastapi import WebSocket
 
+from app.websocket.codecs import JSON, EncodedMessage
+from app.websocket.subscriptions import SubscriptionFilter, SubscriptionIndex
+
 logger = logging.getLogger(__name__)
 
 
 class ConnectionManager:
 
-    def __init__(self):
+    def __init__(
+        self,
+        event_log_size: int = 1000,
+        coalesce_window: float = 0.0,
+        statistics_interval: float = 0.0,
+        heartbeat_interval: float = 0.0,
+        idle_timeout: float = 0.0,
+        max_connections: Optional[Dict[str, int]] = None
+    ):
 
         self.active_connections: Dict[str, Set[WebSocket]] = {
             "customers": set(),
@@ -19,12 +33,76 @@ class ConnectionManager:
 
 
         self.order_subscribers: Dict[UUID, Set[WebSocket]] = {}
+        self._socket_orders: Dict[WebSocket, Set[UUID]] = {}
+
+        # Liveness: every inbound frame refreshes last_seen. The heartbeat task
+        # pings quiet sockets and reaps the ones idle past the timeout, so
+        # half-open connections never stay in the fan-out sets.
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self.max_connections = max_connections or {}
+        self.last_seen: Dict[WebSocket, float] = {}
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+        # Order events carry a monotonic sequence number so that reconnecting
+        # clients can ask for what they missed instead of reloading everything.
+        # The epoch names the sequence space; the outbox dispatcher switches it
+        # to the durable outbox sequence shared by all workers. Events at or
+        # below the log floor are no longer available for replay.
+        self.epoch = uuid4().hex
+        self.sequence = 0
+        self.event_log: Deque[dict] = deque(maxlen=event_log_size)
+        self._log_floor = 0
+
+        # With a non-zero window, order events are held briefly and collapsed
+        # per (event type, order id) so a burst of status changes reaches the
+        # clients as its final state. Statistics are throttled separately.
+        self.coalesce_window = coalesce_window
+        self.statistics_interval = statistics_interval
+        self._pending_events: Dict[Tuple[str, str], Tuple[UUID, dict, Optional[int]]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._pending_stats: Optional[dict] = None
+        self._stats_task: Optional[asyncio.Task] = None
+        self._stats_sent_at = 0.0
+
+        # Staff and admin sockets may narrow what they receive; the indexes
+        # pick the recipients of an order event without scanning every socket.
+        # The last broadcast status of each order is remembered so that a
+        # station watching READY also sees the order leave READY.
+        self.subscription_indexes: Dict[str, SubscriptionIndex] = {
+            "staff": SubscriptionIndex(),
+            "admin": SubscriptionIndex()
+        }
+        self._last_status: "OrderedDict[str, str]" = OrderedDict()
+        self._last_status_size = 10000
+
+        # Wire encoding chosen by each socket in the handshake; JSON when absent.
+        self.encodings: Dict[WebSocket, str] = {}
+
+        # Set once shutdown starts; new sockets are turned away from then on.
+        self.draining = False
 
-    async def connect(self, websocket: WebSocket, role: str = "customers"):
+    async def connect(self, websocket: WebSocket, role: str = "customers", encoding: str = JSON) -> bool:
+
+        if self.draining:
+            await websocket.close(code=1012)
+            return False
+
+        limit = self.max_connections.get(role)
+        if limit and len(self.active_connections[role]) >= limit:
+            logger.warning(f"Rejecting {role} connection: limit of {limit} reached")
+            await websocket.close(code=1013)
+            return False
 
         await websocket.accept()
         self.active_connections[role].add(websocket)
+        self.last_seen[websocket] = time.monotonic()
+        if encoding != JSON:
+            self.encodings[websocket] = encoding
+        if role in self.subscription_indexes:
+            self.subscription_indexes[role].add(websocket)
         logger.info(f"New {role} connection established. Total: {len(self.active_connections[role])}")
+        return True
 
     def disconnect(self, websocket: WebSocket):
 
@@ -34,9 +112,105 @@ class ConnectionManager:
                 logger.info(f"{role.capitalize()} disconnected. Remaining: {len(connections)}")
                 break
 
+        for index in self.subscription_indexes.values():
+            index.remove(websocket)
+        self.encodings.pop(websocket, None)
+        self.last_seen.pop(websocket, None)
+
+
+        for order_id in self._socket_orders.pop(websocket, set()):
+            subscribers = self.order_subscribers.get(order_id)
+            if subscribers is not None:
+                subscribers.discard(websocket)
+                if not subscribers:
+                    del self.order_subscribers[order_id]
+
+    def touch(self, websocket: WebSocket):
+
+        if websocket in self.last_seen:
+            self.last_seen[websocket] = time.monotonic()
+
+    def start_heartbeat(self):
+
+        if self.heartbeat_interval > 0 and self._heartbeat_task is None:
+            self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+            logger.info(f"WebSocket heartbeat started: interval {self.heartbeat_interval}s, idle timeout {self.idle_timeout}s")
+
+    async def stop_heartbeat(self):
 
-        for order_id, subscribers in self.order_subscribers.items():
-            subscribers.discard(websocket)
+        if self._heartbeat_task is None:
+            return
+
+        self._heartbeat_task.cancel()
+        try:
+            await self._heartbeat_task
+        except asyncio.CancelledError:
+            pass
+        self._heartbeat_task = None
+
+    async def _heartbeat_loop(self):
+
+        ping = EncodedMessage({"type": "ping"})
+
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+
+            try:
+                now = time.monotonic()
+                for websocket, seen in list(self.last_seen.items()):
+                    idle = now - seen
+                    if self.idle_timeout > 0 and idle > self.idle_timeout:
+                        await self._reap(websocket)
+                    elif idle >= self.heartbeat_interval:
+                        try:
+                            await self._send(websocket, ping)
+                        except Exception as e:
+                            logger.info(f"Heartbeat failed, dropping connection: {e}")
+                            await self._reap(websocket)
+            except Exception as e:
+                logger.error(f"Error in WebSocket heartbeat: {e}")
+
+    async def drain(self, reconnect_window: float):
+        """Flush pending events, then close every socket with a reconnect hint.
+
+        Each client is told to wait a random delay within ``reconnect_window``
+        before reconnecting, so a restart does not bring every client back at
+        the same instant. The hint carries the current sequence for ``sync``.
+        """
+
+        self.draining = True
+        await self.flush()
+
+        websockets = [websocket for connections in self.active_connections.values() for websocket in connections]
+        await asyncio.gather(*(self._close_with_hint(websocket, reconnect_window) for websocket in websockets))
+        logger.info(f"Drained {len(websockets)} WebSocket connections")
+
+    async def _close_with_hint(self, websocket: WebSocket, reconnect_window: float):
+
+        hint = EncodedMessage({
+            "type": "reconnect",
+            "retry_after_ms": int(random.uniform(0, reconnect_window) * 1000),
+            "epoch": self.epoch,
+            "seq": self.sequence
+        })
+
+        # The hint goes out in the socket's own encoding, so the socket is
+        # only forgotten once it has been closed.
+        try:
+            await self._send(websocket, hint)
+            await websocket.close(code=1012)
+        except Exception:
+            pass
+        finally:
+            self.disconnect(websocket)
+
+    async def _reap(self, websocket: WebSocket):
+
+        self.disconnect(websocket)
+        try:
+            await websocket.close(code=1001)
+        except Exception:
+            pass
 
     async def subscribe_to_order(self, websocket: WebSocket, order_id: UUID):
 
@@ -44,67 +218,383 @@ class ConnectionManager:
             self.order_subscribers[order_id] = set()
 
         self.order_subscribers[order_id].add(websocket)
+        self._socket_orders.setdefault(websocket, set()).add(order_id)
         logger.info(f"Client subscribed to order {order_id}")
 
+    def set_subscription_filter(self, websocket: WebSocket, role: str, subscription: SubscriptionFilter) -> bool:
+
+        index = self.subscription_indexes.get(role)
+        if index is None or websocket not in self.active_connections[role]:
+            return False
+
+        index.add(websocket, subscription)
+        logger.info(f"{role.capitalize()} client set subscription filter: {subscription.model_dump(mode='json')}")
+        return True
+
     async def broadcast_to_role(self, message: dict, role: str):
 
         if role not in self.active_connections:
             return
 
-        message_str = json.dumps(message, default=str)
+        await self._send_to_role(EncodedMessage(message), role)
+
+    async def send_personal(self, websocket: WebSocket, message: dict):
+
+        await self._send(websocket, EncodedMessage(message))
+
+    async def _send(self, websocket: WebSocket, encoded: EncodedMessage):
+
+        encoding = self.encodings.get(websocket, JSON)
+        frame = encoded.frame(encoding)
+
+        if encoding == JSON:
+            await websocket.send_text(frame)
+        else:
+            await websocket.send_bytes(frame)
+
+    async def _send_to_role(self, encoded: EncodedMessage, role: str):
+
         disconnected = set()
 
         for connection in self.active_connections[role]:
             try:
-                await connection.send_text(message_str)
+                await self._send(connection, encoded)
             except Exception as e:
                 logger.error(f"Error sending message to {role}: {e}")
                 disconnected.add(connection)
 
 
         for connection in disconnected:
-            self.active_connections[role].discard(connection)
+            self.disconnect(connection)
+
+    async def _send_routed(
+        self,
+        encoded: EncodedMessage,
+        role: str,
+        statuses: Iterable[Optional[str]],
+        categories: Set[str],
+        order_id: str
+    ):
+
+        targets = self._routed_targets(role, statuses, categories, order_id)
+        if not targets:
+            return
 
-    async def broadcast_order_update(self, order_id: UUID, order_data: dict):
+        disconnected = set()
 
-        message = {
+        for connection in targets:
+            try:
+                await self._send(connection, encoded)
+            except Exception as e:
+                logger.error(f"Error sending message to {role}: {e}")
+                disconnected.add(connection)
+
+
+        for connection in disconnected:
+            self.disconnect(connection)
+
+    def _routed_targets(
+        self,
+        role: str,
+        statuses: Iterable[Optional[str]],
+        categories: Set[str],
+        order_id: str
+    ) -> Set[WebSocket]:
+
+        index = self.subscription_indexes[role]
+        targets = set()
+        if len(index) == 0:
+            return targets
+
+        for status in statuses:
+            targets |= index.route(status, categories, order_id)
+        return targets
+
+    def _routing_keys(self, order_id: str, order_data: dict) -> Tuple[Set[Optional[str]], Set[str]]:
+
+        status = order_data.get("status")
+        statuses = {status}
+
+        previous = self._last_status.pop(order_id, None)
+        if previous is not None:
+            statuses.add(previous)
+        self._last_status[order_id] = status
+        if len(self._last_status) > self._last_status_size:
+            self._last_status.popitem(last=False)
+
+        categories = {
+            item["category"]
+            for item in order_data.get("items", [])
+            if item.get("category")
+        }
+        return statuses, categories
+
+    def reset_sequence(self, seq: int, epoch: str):
+
+        self.epoch = epoch
+        self.sequence = seq
+        self._log_floor = seq
+        self.event_log.clear()
+
+    def _record_event(self, message: dict, seq: Optional[int] = None) -> dict:
+
+        self.sequence = seq if seq is not None else self.sequence + 1
+        message["seq"] = self.sequence
+
+        if len(self.event_log) == self.event_log.maxlen:
+            self._log_floor = self.event_log[0]["seq"]
+        self.event_log.append(message)
+        return message
+
+    def get_events_since(self, websocket: WebSocket, role: str, seq: int) -> Optional[List[dict]]:
+        """Events after ``seq`` visible to the socket, or None if the log no longer covers the gap."""
+
+        if seq == self.sequence:
+            return []
+        if seq > self.sequence or seq < self._log_floor:
+            return None
+
+        subscribed = None
+        subscription = None
+        if role in self.subscription_indexes:
+            subscription = self.subscription_indexes[role].filters.get(websocket)
+            if subscription is not None and subscription.is_empty():
+                subscription = None
+        if role == "customers":
+            subscribed = {str(order_id) for order_id in self._socket_orders.get(websocket, set())}
+
+        def visible(message: dict) -> bool:
+            if subscribed is not None and (
+                message["type"] not in ("order_update", "new_order") or message["order_id"] not in subscribed
+            ):
+                return False
+            return subscription is None or subscription.matches(
+                message["data"].get("status"),
+                {item.get("category") for item in message["data"].get("items", [])},
+                message["order_id"]
+            )
+
+        events = []
+        for message in self.event_log:
+            if message["seq"] <= seq:
+                continue
+            if message["type"] == "orders_update":
+                orders = [
+                    entry for entry in message["orders"]
+                    if visible({"type": "order_update", **entry})
+                ]
+                if orders:
+                    events.append(message if len(orders) == len(message["orders"]) else {**message, "orders": orders})
+                continue
+            if visible(message):
+                if subscribed is not None and message["type"] == "new_order":
+                    message = {**message, "type": "order_update"}
+                events.append(message)
+
+        return events
+
+    async def broadcast_order_update(self, order_id: UUID, order_data: dict, seq: Optional[int] = None):
+
+        if self.coalesce_window <= 0:
+            await self._send_order_update(order_id, order_data, seq)
+            return
+
+        pending_new = self._pending_events.get(("new_order", str(order_id)))
+        if pending_new is not None:
+            # Staff have not seen the order yet, so the creation event can
+            # simply carry the latest state; its subscribers still get it as
+            # an update when it is flushed.
+            self._pending_events[("new_order", str(order_id))] = (order_id, order_data, seq)
+        else:
+            self._pending_events[("order_update", str(order_id))] = (order_id, order_data, seq)
+        self._schedule_flush()
+
+    async def broadcast_new_order(self, order_data: dict, seq: Optional[int] = None):
+
+        if self.coalesce_window <= 0:
+            await self._send_new_order(order_data, seq)
+            return
+
+        order_id = order_data.get("id")
+        self._pending_events[("new_order", str(order_id))] = (order_id, order_data, seq)
+        self._schedule_flush()
+
+    async def broadcast_orders_update(self, orders: List[dict], seq: Optional[int] = None):
+        """Status changes made together, sent to each socket as one message with the orders it may see."""
+
+        if self.coalesce_window > 0:
+            # Coalescing already merges events per order; the batch joins the pending events.
+            for order_data in orders:
+                await self.broadcast_order_update(UUID(str(order_data["id"])), order_data, seq)
+            return
+
+        await self._send_orders_update(orders, seq)
+
+    async def broadcast_statistics_update(self, stats: dict):
+
+        if self.statistics_interval <= 0:
+            await self._send_statistics(stats)
+            return
+
+        self._pending_stats = stats
+        if self._stats_task is not None:
+            return
+
+        delay = self._stats_sent_at + self.statistics_interval - time.monotonic()
+        if delay <= 0:
+            await self._flush_statistics()
+        else:
+            self._stats_task = asyncio.create_task(self._flush_statistics_after(delay))
+
+    async def flush(self):
+
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self._flush_events()
+
+        if self._stats_task is not None:
+            self._stats_task.cancel()
+            self._stats_task = None
+        await self._flush_statistics()
+
+    def _schedule_flush(self):
+
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_events_after(self.coalesce_window))
+
+    async def _flush_events_after(self, delay: float):
+
+        await asyncio.sleep(delay)
+        self._flush_task = None
+        await self._flush_events()
+
+    async def _flush_events(self):
+
+        pending, self._pending_events = self._pending_events, {}
+
+        # Pending events are sent in sequence order even when a later event
+        # was merged into an earlier key.
+        ordered = sorted(pending.items(), key=lambda item: item[1][2] or 0)
+
+        for (event_type, _), (order_id, order_data, seq) in ordered:
+            try:
+                if event_type == "new_order":
+                    await self._send_new_order(order_data, seq)
+                else:
+                    await self._send_order_update(order_id, order_data, seq)
+            except Exception as e:
+                logger.error(f"Error flushing coalesced {event_type} for {order_id}: {e}")
+
+    async def _flush_statistics_after(self, delay: float):
+
+        await asyncio.sleep(delay)
+        self._stats_task = None
+        await self._flush_statistics()
+
+    async def _flush_statistics(self):
+
+        stats, self._pending_stats = self._pending_stats, None
+        if stats is None:
+            return
+
+        self._stats_sent_at = time.monotonic()
+        await self._send_statistics(stats)
+
+    async def _send_order_update(self, order_id: UUID, order_data: dict, seq: Optional[int] = None):
+
+        message = self._record_event({
             "type": "order_update",
             "order_id": str(order_id),
             "data": order_data
-        }
+        }, seq)
+        encoded = EncodedMessage(message)
+        statuses, categories = self._routing_keys(message["order_id"], order_data)
 
 
-        await self.broadcast_to_role(message, "staff")
-        await self.broadcast_to_role(message, "admin")
+        await self._send_routed(encoded, "staff", statuses, categories, message["order_id"])
+        await self._send_routed(encoded, "admin", statuses, categories, message["order_id"])
+
 
+        await self._send_to_order_subscribers(order_id, encoded)
+
+    async def _send_to_order_subscribers(self, order_id: UUID, encoded: EncodedMessage):
 
         if order_id in self.order_subscribers:
-            message_str = json.dumps(message, default=str)
             disconnected = set()
 
             for connection in self.order_subscribers[order_id]:
                 try:
-                    await connection.send_text(message_str)
+                    await self._send(connection, encoded)
                 except Exception as e:
                     logger.error(f"Error sending order update to subscriber: {e}")
                     disconnected.add(connection)
 
 
             for connection in disconnected:
-                self.order_subscribers[order_id].discard(connection)
+                self.disconnect(connection)
+
+    async def _send_orders_update(self, orders: List[dict], seq: Optional[int] = None):
+
+        message = self._record_event({
+            "type": "orders_update",
+            "orders": [{"order_id": str(order_data["id"]), "data": order_data} for order_data in orders]
+        }, seq)
+
+        visible: Dict[WebSocket, Set[int]] = {}
+        for position, entry in enumerate(message["orders"]):
+            statuses, categories = self._routing_keys(entry["order_id"], entry["data"])
+            targets = (
+                self._routed_targets("staff", statuses, categories, entry["order_id"])
+                | self._routed_targets("admin", statuses, categories, entry["order_id"])
+                | self.order_subscribers.get(UUID(entry["order_id"]), set())
+            )
+            for connection in targets:
+                visible.setdefault(connection, set()).add(position)
+
+        # Sockets that see the same orders share one encoded frame.
+        frames: Dict[Tuple[int, ...], EncodedMessage] = {}
+        disconnected = set()
+        for connection, positions in visible.items():
+            key = tuple(sorted(positions))
+            encoded = frames.get(key)
+            if encoded is None:
+                if len(key) == len(message["orders"]):
+                    encoded = EncodedMessage(message)
+                else:
+                    encoded = EncodedMessage({**message, "orders": [message["orders"][i] for i in key]})
+                frames[key] = encoded
 
-    async def broadcast_new_order(self, order_data: dict):
+            try:
+                await self._send(connection, encoded)
+            except Exception as e:
+                logger.error(f"Error sending orders update: {e}")
+                disconnected.add(connection)
 
-        message = {
+        for connection in disconnected:
+            self.disconnect(connection)
+
+    async def _send_new_order(self, order_data: dict, seq: Optional[int] = None):
+
+        message = self._record_event({
             "type": "new_order",
+            "order_id": str(order_data.get("id")),
             "data": order_data
-        }
+        }, seq)
+        encoded = EncodedMessage(message)
+        statuses, categories = self._routing_keys(message["order_id"], order_data)
 
 
-        await self.broadcast_to_role(message, "staff")
-        await self.broadcast_to_role(message, "admin")
+        await self._send_routed(encoded, "staff", statuses, categories, message["order_id"])
+        await self._send_routed(encoded, "admin", statuses, categories, message["order_id"])
 
-    async def broadcast_statistics_update(self, stats: dict):
+        # A coalesced creation event may carry status changes; customers who
+        # subscribed to the order in the meantime get them as an update.
+        order_id = UUID(message["order_id"])
+        if order_id in self.order_subscribers:
+            await self._send_to_order_subscribers(order_id, EncodedMessage({**message, "type": "order_update"}))
+
+    async def _send_statistics(self, stats: dict):
 
         message = {
             "type": "statistics_update",
@@ -120,3 +610,15 @@ class ConnectionManager:
             role: len(connections)
             for role, connections in self.active_connections.items()
         }
+
+    def get_structure_sizes(self) -> dict:
+
+        return {
+            "order_subscribers": len(self.order_subscribers),
+            "order_subscriptions": sum(len(s) for s in self.order_subscribers.values()),
+            "event_log": len(self.event_log),
+            "pending_events": len(self._pending_events),
+            "last_status": len(self._last_status),
+            "encodings": len(self.encodings),
+            **{f"filters_{role}": len(index) for role, index in self.subscription_indexes.items()}
+        }
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, List, Optional
+from uuid import UUID
+
+from app.services.order import OrderService
+from app.services.outbox import OutboxService
+from app.websocket.connection_manager import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+EventHandler = Callable[[List[dict]], Awaitable[None]]
+
+
+class OutboxDispatcher:
+    """Drains the outbox in sequence order to the local sockets and any extra handlers.
+
+    Every worker runs its own dispatcher under its own consumer name, since
+    each one has to fan events out to its own sockets. The delivered offset is
+    persisted after every batch. Appends take their sequence number inside
+    their transaction, so events become visible in sequence order; a missing
+    number can only mean the event is gone (e.g. expired), and the dispatcher
+    waits up to ``gap_timeout`` before moving past it.
+    """
+
+    def __init__(
+        self,
+        outbox: OutboxService,
+        connection_manager: ConnectionManager,
+        order_service: OrderService,
+        consumer: str,
+        batch_size: int = 100,
+        poll_interval: float = 0.5,
+        gap_timeout: float = 5.0
+    ):
+        self.outbox = outbox
+        self.connection_manager = connection_manager
+        self.order_service = order_service
+        self.consumer = consumer
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.gap_timeout = gap_timeout
+
+        self.handlers: List[EventHandler] = []
+        self.offset: Optional[int] = None
+        self._gap_since: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def add_handler(self, handler: EventHandler):
+        self.handlers.append(handler)
+
+    async def start(self):
+
+        if self._task is not None:
+            return
+
+        self.offset = await self.outbox.get_offset(self.consumer)
+        if self.offset is None:
+            # A new consumer has no sockets that could have seen older events.
+            self.offset = await self.outbox.latest_sequence()
+
+        self.connection_manager.reset_sequence(self.offset, epoch="outbox")
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Outbox dispatcher '{self.consumer}' started at offset {self.offset}")
+
+    async def stop(self):
+
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info(f"Outbox dispatcher '{self.consumer}' stopped at offset {self.offset}")
+
+    async def drain(self):
+        """Stop polling and deliver what is already committed to the local sockets."""
+
+        if self._task is None:
+            return
+
+        await self.stop()
+        try:
+            while await self.dispatch_pending() == self.batch_size:
+                pass
+        except Exception as e:
+            logger.error(f"Error draining outbox events: {e}")
+
+    async def _run(self):
+
+        while True:
+            self.outbox.wakeup.clear()
+            try:
+                delivered = await self.dispatch_pending()
+            except Exception as e:
+                logger.error(f"Error dispatching outbox events: {e}")
+                delivered = 0
+
+            if delivered < self.batch_size:
+                try:
+                    await asyncio.wait_for(self.outbox.wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def dispatch_pending(self) -> int:
+
+        events = await self.outbox.read_batch(self.offset, self.batch_size)
+
+        batch = []
+        expected = self.offset + 1
+        for event in events:
+            if event["_id"] != expected:
+                now = time.monotonic()
+                if self._gap_since is None:
+                    self._gap_since = now
+                if now - self._gap_since < self.gap_timeout:
+                    break
+                logger.warning(f"Skipping outbox sequence {expected}..{event['_id'] - 1}: never committed")
+
+            self._gap_since = None
+            batch.append(event)
+            expected = event["_id"] + 1
+
+        if not batch:
+            return 0
+
+        await self._deliver(batch)
+
+        self.offset = batch[-1]["_id"]
+        await self.outbox.save_offset(self.consumer, self.offset)
+        return len(batch)
+
+    async def _deliver(self, events: List[dict]):
+
+        for event in events:
+            try:
+                if event["type"] == "new_order":
+                    await self.connection_manager.broadcast_new_order(event["data"], seq=event["_id"])
+                elif event["type"] == "order_update":
+                    await self.connection_manager.broadcast_order_update(
+                        UUID(event["order_id"]), event["data"], seq=event["_id"]
+                    )
+                elif event["type"] == "orders_update":
+                    await self.connection_manager.broadcast_orders_update(event["data"]["orders"], seq=event["_id"])
+            except Exception as e:
+                logger.error(f"Error broadcasting outbox event {event['_id']}: {e}")
+
+        # One statistics refresh per batch instead of one per status change.
+        try:
+            stats = await self.order_service.get_orders_statistics()
+            await self.connection_manager.broadcast_statistics_update(stats)
+        except Exception as e:
+            logger.error(f"Error broadcasting statistics after outbox batch: {e}")
+
+        for handler in self.handlers:
+            try:
+                await handler(events)
+            except Exception as e:
+                logger.error(f"Error in outbox handler {handler}: {e}")
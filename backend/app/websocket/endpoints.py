@@ -1,11 +1,19 @@
-import json
 import logging
+from datetime import datetime
 from uuid import UUID
-from fastapi import WebSocket, WebSocketDisconnect, Depends
+from fastapi import WebSocket, WebSocketDisconnect, Depends, Query
 from fastapi.routing import APIRouter
+from pydantic import ValidationError as PydanticValidationError
 
 from app.websocket.connection_manager import ConnectionManager
-from app.dependencies import get_connection_manager
+from app.websocket.codecs import JSON, SUPPORTED_ENCODINGS, decode
+from app.websocket.subscriptions import SubscriptionFilter
+from app.services.order import OrderService
+from app.exceptions import DatabaseError
+from app.rate_limit import RateLimiter, TokenBucket, client_address
+from app.load_shedding import LoadShedder
+from app.dependencies import get_connection_manager, get_order_service, get_load_shedder, get_websocket_rate_limiter
+from app.settings import get_settings
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -15,36 +23,75 @@ router = APIRouter()
 async def websocket_endpoint(
     websocket: WebSocket,
     role: str,
-    manager: ConnectionManager = Depends(get_connection_manager)
+    encoding: str = Query(JSON),
+    manager: ConnectionManager = Depends(get_connection_manager),
+    order_service: OrderService = Depends(get_order_service),
+    limiter: RateLimiter = Depends(get_websocket_rate_limiter),
+    shedder: LoadShedder = Depends(get_load_shedder)
 ):
 
     if role not in ["customers", "staff", "admin"]:
         await websocket.close(code=4000)
         return
 
-    await manager.connect(websocket, role)
+    if encoding not in SUPPORTED_ENCODINGS:
+        await websocket.close(code=4001)
+        return
+
+    settings = get_settings()
+    client = client_address(websocket.scope, settings.rate_limit_trusted_proxies)
+    if shedder.overloaded() or limiter.hit(f"{client}|{role}", tuple(settings.websocket_connect_rate)) > 0:
+        await websocket.close(code=1013)
+        return
+
+    if not await manager.connect(websocket, role, encoding):
+        return
+
+    # Inbound messages are limited per socket; the bucket goes away with the connection.
+    messages = TokenBucket(*settings.websocket_message_rate.get(role, (10, 50)))
 
     try:
         while True:
 
-            data = await websocket.receive_text()
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            manager.touch(websocket)
+
+            if messages.take() > 0:
+                await manager.send_personal(websocket, {
+                    "type": "error",
+                    "message": "Rate limit exceeded"
+                })
+                continue
 
             try:
-                message = json.loads(data)
-                await handle_websocket_message(websocket, message, manager)
-            except json.JSONDecodeError:
-                logger.error(f"Invalid JSON from {role} client")
-                await websocket.send_text(json.dumps({
+                message = decode(frame["bytes"] if frame.get("bytes") is not None else frame["text"])
+            except ValueError:
+                logger.error(f"Invalid message from {role} client")
+                await manager.send_personal(websocket, {
                     "type": "error",
-                    "message": "Invalid JSON format"
-                }))
+                    "message": "Invalid message format"
+                })
+                continue
+
+            await handle_websocket_message(websocket, role, message, manager, order_service)
 
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
         logger.info(f"{role.capitalize()} client disconnected")
+    except Exception as e:
+        logger.error(f"Error in {role} websocket connection: {e}")
+    finally:
+        manager.disconnect(websocket)
 
 
-async def handle_websocket_message(websocket: WebSocket, message: dict, manager: ConnectionManager):
+async def handle_websocket_message(
+    websocket: WebSocket,
+    role: str,
+    message: dict,
+    manager: ConnectionManager,
+    order_service: OrderService
+):
 
     message_type = message.get("type")
 
@@ -55,21 +102,127 @@ async def handle_websocket_message(websocket: WebSocket, message: dict, manager:
             try:
                 order_uuid = UUID(order_id)
                 await manager.subscribe_to_order(websocket, order_uuid)
-                await websocket.send_text(json.dumps({
+                await manager.send_personal(websocket, {
                     "type": "subscribed",
                     "order_id": order_id
-                }))
+                })
             except ValueError:
-                await websocket.send_text(json.dumps({
+                await manager.send_personal(websocket, {
                     "type": "error",
                     "message": "Invalid order ID format"
-                }))
+                })
+
+    elif message_type in ("subscribe_filter", "clear_filter"):
+
+        try:
+            if message_type == "clear_filter":
+                subscription = SubscriptionFilter()
+            else:
+                subscription = SubscriptionFilter(
+                    statuses=message.get("statuses") or [],
+                    categories=message.get("categories") or [],
+                    order_ids=message.get("order_ids") or []
+                )
+        except PydanticValidationError:
+            await manager.send_personal(websocket, {
+                "type": "error",
+                "message": "Invalid subscription filter"
+            })
+            return
+
+        if manager.set_subscription_filter(websocket, role, subscription):
+            await manager.send_personal(websocket, {
+                "type": "filter_updated",
+                "filter": subscription.model_dump(mode='json')
+            })
+        else:
+            await manager.send_personal(websocket, {
+                "type": "error",
+                "message": "Subscription filters are not available for this role"
+            })
+
+    elif message_type == "sync":
+        await handle_sync(websocket, role, message, manager, order_service)
 
     elif message_type == "ping":
-        await websocket.send_text(json.dumps({"type": "pong"}))
+        await manager.send_personal(websocket, {"type": "pong"})
+
+    elif message_type == "pong":
+        pass
 
     else:
-        await websocket.send_text(json.dumps({
+        await manager.send_personal(websocket, {
             "type": "error",
             "message": "Unknown message type"
-        }))
+        })
+
+
+async def handle_sync(
+    websocket: WebSocket,
+    role: str,
+    message: dict,
+    manager: ConnectionManager,
+    order_service: OrderService
+):
+
+    seq = message.get("seq")
+    since = message.get("since")
+
+
+    current_seq = manager.sequence
+    response = {"type": "sync", "epoch": manager.epoch, "seq": current_seq}
+
+    if seq is not None and message.get("epoch") == manager.epoch:
+        try:
+            events = manager.get_events_since(websocket, role, int(seq))
+        except (TypeError, ValueError):
+            await manager.send_personal(websocket, {
+                "type": "error",
+                "message": "Invalid sequence number"
+            })
+            return
+
+        if events is not None:
+            response.update({"mode": "events", "events": events})
+            await manager.send_personal(websocket, response)
+            return
+
+
+    if since and role in ("staff", "admin"):
+        # The cursor is (updated_at, order id): orders sharing the timestamp
+        # of the last one sent are picked up by the next page.
+        after_id = message.get("after_id")
+        try:
+            since_dt = datetime.fromisoformat(since)
+            after_uuid = UUID(after_id) if after_id else None
+        except (TypeError, ValueError):
+            await manager.send_personal(websocket, {
+                "type": "error",
+                "message": "Invalid since timestamp"
+            })
+            return
+
+        limit = get_settings().websocket_sync_max_orders
+        try:
+            orders = await order_service.get_orders_updated_since(since_dt, limit=limit, after_id=after_uuid)
+        except DatabaseError as e:
+            logger.error(f"Database error during websocket sync: {e}")
+            await manager.send_personal(websocket, {
+                "type": "error",
+                "message": "Sync failed"
+            })
+            return
+
+        response.update({
+            "mode": "orders",
+            "orders": [o.model_dump(mode='json') for o in orders],
+            "watermark": orders[-1].updated_at.isoformat() if orders else since,
+            "watermark_id": str(orders[-1].id) if orders else after_id,
+            "complete": len(orders) < limit
+        })
+        await manager.send_personal(websocket, response)
+        return
+
+
+    response["mode"] = "reset"
+    await manager.send_personal(websocket, response)
@@ -0,0 +1,121 @@
+from typing import Dict, Iterable, Optional, Set, Tuple
+from uuid import UUID
+from fastapi import WebSocket
+from pydantic import BaseModel, Field
+
+from app.models.enums import OrderStatus
+
+
+class SubscriptionFilter(BaseModel):
+
+    statuses: Set[OrderStatus] = Field(default_factory=set, description="Статусы заказов")
+    categories: Set[str] = Field(default_factory=set, description="Категории товаров")
+    order_ids: Set[UUID] = Field(default_factory=set, description="ID заказов")
+
+    def is_empty(self) -> bool:
+        return not (self.statuses or self.categories or self.order_ids)
+
+    def matches(self, status: Optional[str], categories: Iterable[str], order_id: Optional[str]) -> bool:
+
+        if self.statuses and status not in {s.value for s in self.statuses}:
+            return False
+        if self.categories and self.categories.isdisjoint(categories):
+            return False
+        if self.order_ids and order_id not in {str(o) for o in self.order_ids}:
+            return False
+        return True
+
+
+class SubscriptionIndex:
+    """Routes order events to the sockets of one role whose filters accept them.
+
+    Every socket is indexed per dimension (status, category, order id) either
+    under the values it asked for or in the dimension's wildcard set, so
+    routing is a few set lookups and intersections. Results for a
+    (status, categories) pair are cached until the subscriptions change.
+    """
+
+    _ROUTE_CACHE_SIZE = 1024
+
+    def __init__(self):
+
+        self.filters: Dict[WebSocket, SubscriptionFilter] = {}
+
+        self._by_status: Dict[str, Set[WebSocket]] = {}
+        self._by_category: Dict[str, Set[WebSocket]] = {}
+        self._by_order: Dict[str, Set[WebSocket]] = {}
+
+        self._any_status: Set[WebSocket] = set()
+        self._any_category: Set[WebSocket] = set()
+        self._any_order: Set[WebSocket] = set()
+
+        self._route_cache: Dict[Tuple[Optional[str], frozenset], frozenset] = {}
+
+    def __len__(self) -> int:
+        return len(self.filters)
+
+    def add(self, websocket: WebSocket, subscription: Optional[SubscriptionFilter] = None):
+
+        self.remove(websocket)
+        subscription = subscription or SubscriptionFilter()
+        self.filters[websocket] = subscription
+
+        self._index(websocket, {s.value for s in subscription.statuses}, self._by_status, self._any_status)
+        self._index(websocket, subscription.categories, self._by_category, self._any_category)
+        self._index(websocket, {str(o) for o in subscription.order_ids}, self._by_order, self._any_order)
+        self._route_cache.clear()
+
+    def remove(self, websocket: WebSocket):
+
+        subscription = self.filters.pop(websocket, None)
+        if subscription is None:
+            return
+
+        self._unindex(websocket, {s.value for s in subscription.statuses}, self._by_status, self._any_status)
+        self._unindex(websocket, subscription.categories, self._by_category, self._any_category)
+        self._unindex(websocket, {str(o) for o in subscription.order_ids}, self._by_order, self._any_order)
+        self._route_cache.clear()
+
+    def route(self, status: Optional[str], categories: Iterable[str], order_id: Optional[str]) -> frozenset:
+
+        categories = frozenset(categories)
+        key = (status, categories)
+
+        targets = self._route_cache.get(key)
+        if targets is None:
+            by_status = self._by_status.get(status, set()) | self._any_status
+            by_category = set(self._any_category)
+            for category in categories:
+                by_category |= self._by_category.get(category, set())
+
+            targets = frozenset(by_status & by_category)
+            if len(self._route_cache) >= self._ROUTE_CACHE_SIZE:
+                self._route_cache.clear()
+            self._route_cache[key] = targets
+
+        if len(self._any_order) == len(self.filters):
+            return targets
+
+        return targets & (self._by_order.get(order_id, set()) | self._any_order)
+
+    @staticmethod
+    def _index(websocket: WebSocket, values: Set[str], index: Dict[str, Set[WebSocket]], wildcard: Set[WebSocket]):
+
+        if not values:
+            wildcard.add(websocket)
+            return
+
+        for value in values:
+            index.setdefault(value, set()).add(websocket)
+
+    @staticmethod
+    def _unindex(websocket: WebSocket, values: Set[str], index: Dict[str, Set[WebSocket]], wildcard: Set[WebSocket]):
+
+        wildcard.discard(websocket)
+
+        for value in values:
+            sockets = index.get(value)
+            if sockets is not None:
+                sockets.discard(websocket)
+                if not sockets:
+                    del index[value]
@@ -0,0 +1,83 @@
+import os
+
+# Tests run on the in-memory backend and never need MongoDB or the metrics port.
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("ENABLE_METRICS", "false")
+
+import asyncio
+import inspect
+
+import pytest
+
+from app import dependencies
+from app.dto.product import ProductCreate
+from app.services.active_orders import ActiveOrdersBoard
+from app.services.memory_storage import (
+    MemoryCollectionVersions,
+    MemoryOrderRepository,
+    MemoryOutboxService,
+    MemoryProductRepository,
+)
+from app.services.order import OrderService
+from app.services.product import ProductService
+from app.settings import get_settings
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    """Run ``async def`` tests on a fresh event loop."""
+
+    if not inspect.iscoroutinefunction(pyfuncitem.obj):
+        return None
+
+    arguments = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+    asyncio.run(pyfuncitem.obj(**arguments))
+    return True
+
+
+@pytest.fixture(autouse=True)
+def fresh_dependencies():
+    """Drop the application-scoped singletons so every test starts from empty storage."""
+
+    def reset():
+        get_settings.cache_clear()
+        for name, value in list(vars(dependencies).items()):
+            if name.startswith("_") and not name.startswith("__") and not callable(value):
+                setattr(dependencies, name, None)
+
+    reset()
+    yield
+    reset()
+
+
+@pytest.fixture
+def product_service() -> ProductService:
+    return ProductService(MemoryProductRepository(), MemoryCollectionVersions())
+
+
+@pytest.fixture
+def outbox(product_service) -> MemoryOutboxService:
+    # Shares the counters, as in get_outbox_service.
+    return MemoryOutboxService(product_service.versions.counters)
+
+
+@pytest.fixture
+def order_service(product_service, outbox) -> OrderService:
+    return OrderService(MemoryOrderRepository(), product_service, outbox, active_board=ActiveOrdersBoard())
+
+
+@pytest.fixture
+def products(product_service) -> dict:
+    """An available pizza and an unavailable dessert."""
+
+    async def create():
+        return {
+            "pizza": await product_service.create_product(
+                ProductCreate(name="Пицца Маргарита", price=450.0, category="Пицца")
+            ),
+            "tiramisu": await product_service.create_product(
+                ProductCreate(name="Тирамису", price=180.0, category="Десерты", is_available=False)
+            ),
+        }
+
+    return asyncio.run(create())
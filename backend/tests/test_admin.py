@@ -0,0 +1,24 @@
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+
+ADMIN = {"X-Admin-Token": "secret"}
+
+
+def test_memory_report_on_the_memory_backend(monkeypatch):
+
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+
+    with TestClient(create_app()) as client:
+        assert client.post("/api/v1/admin/memory/start", headers=ADMIN).json() == {"tracing": True}
+        try:
+            response = client.get("/api/v1/admin/memory/diff", params={"objects": True}, headers=ADMIN)
+        finally:
+            client.post("/api/v1/admin/memory/stop", headers=ADMIN)
+
+    assert response.status_code == 200, response.text
+    report = response.json()
+    # There is no idempotency cache without MongoDB.
+    assert "idempotency.cache" not in report["structures"]
+    assert "active_orders_board" in report["structures"]
+    assert report["models"]
@@ -0,0 +1,81 @@
+import os
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+from pymongo import MongoClient
+
+from app.models.order import Order, OrderItem, OrderStatus
+from app.services.archive import OrderArchiver
+from app.services.mongo_storage import MongoOrderRepository
+from app.services.outbox import OutboxService
+
+# The archiver runs on MongoDB only and needs transactions, so a replica set.
+MONGODB_TEST_URL = os.environ.get("MONGODB_TEST_URL")
+
+pytestmark = pytest.mark.skipif(not MONGODB_TEST_URL, reason="MONGODB_TEST_URL is not set")
+
+
+class CrashingOutbox(OutboxService):
+    """Fails the last write of an archive batch, like a worker dying before it."""
+
+    def append_many(self, *args, **kwargs):
+        raise RuntimeError("worker crashed")
+
+
+@pytest.fixture
+def database_name() -> str:
+    return f"test_archive_{uuid4().hex}"
+
+
+@pytest.fixture
+def db_client(database_name):
+
+    client = MongoClient(MONGODB_TEST_URL, UuidRepresentation="standard")
+    yield client
+    client.drop_database(database_name)
+    client.close()
+
+
+def finished_order(status: OrderStatus) -> Order:
+
+    updated_at = datetime.utcnow() - timedelta(days=60)
+    return Order(
+        customer={"name": "Иван Петров"},
+        items=[OrderItem(id=uuid4(), name="Пицца Маргарита", quantity=1, price=450.0)],
+        total_amount=450.0,
+        status=status,
+        created_at=updated_at,
+        updated_at=updated_at
+    )
+
+
+async def test_rerun_after_a_crash_archives_and_counts_every_order(db_client, database_name):
+
+    repository = MongoOrderRepository(db_client, database_name=database_name)
+    orders = [finished_order(OrderStatus.COMPLETED), finished_order(OrderStatus.CANCELLED)]
+    for order in orders:
+        repository.insert(order)
+
+    def archiver(outbox: OutboxService) -> OrderArchiver:
+        return OrderArchiver(db_client, outbox, max_age=timedelta(days=30), database_name=database_name)
+
+    with pytest.raises(RuntimeError):
+        await archiver(CrashingOutbox(db_client, database_name=database_name)).archive_once()
+
+    # Nothing of the interrupted batch was kept.
+    db = db_client[database_name]
+    assert db.orders.count_documents({}) == 2
+    assert db.orders_archive.count_documents({}) == 0
+    assert db.order_archive_stats.find_one({"_id": "statuses"}) is None
+
+    outbox = OutboxService(db_client, database_name=database_name)
+    assert await archiver(outbox).archive_once() == 2
+
+    assert db.orders.count_documents({}) == 0
+    assert db.orders_archive.count_documents({}) == 2
+    assert db.order_archive_stats.find_one({"_id": "statuses"})["counts"] == {
+        OrderStatus.COMPLETED.value: 1,
+        OrderStatus.CANCELLED.value: 1
+    }
+    assert [event["type"] for event in await outbox.read_batch(0, 10)] == ["orders_archived"]
@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from app.dto.order import OrderCreate
+from app.models.order import Order, OrderItem, OrderStatus
+from app.services.memory_storage import MemoryCustomerService, MemoryOrderRepository
+from app.services.order import OrderService
+
+
+def older_order(name: str = "Иван Петров") -> Order:
+    """An order placed before the customer profiles existed."""
+
+    created_at = datetime.utcnow() - timedelta(days=30)
+    return Order(
+        customer={"name": name, "phone": "+998 90 123-45-67"},
+        items=[OrderItem(id=uuid4(), name="Пицца Маргарита", quantity=1, price=450.0)],
+        total_amount=450.0,
+        created_at=created_at,
+        updated_at=created_at
+    )
+
+
+def service_with_customers(product_service, outbox) -> OrderService:
+
+    service = OrderService(MemoryOrderRepository(), product_service, outbox, customers=MemoryCustomerService())
+    service.customers.start_backfill()
+    return service
+
+
+async def profile_of(service: OrderService):
+    return await service.customers.get_customer(phone="+998901234567")
+
+
+async def test_cancellation_before_the_backfill_is_left_to_it(product_service, outbox):
+
+    service = service_with_customers(product_service, outbox)
+    order, kept = older_order(), older_order()
+    service.repository.insert(order)
+    service.repository.insert(kept)
+
+    # No profile exists yet; the backfill accounts for the cancellation.
+    await service.cancel_order(order.id)
+    assert service.customers.backfill(service.iter_orders()) == 2
+
+    profile = await profile_of(service)
+    assert (profile.order_count, profile.cancelled_count, profile.total_spent) == (2, 1, 450.0)
+
+
+async def test_cancellation_after_the_backfill_read_the_order(product_service, outbox):
+
+    service = service_with_customers(product_service, outbox)
+    order, kept = older_order(), older_order()
+    service.repository.insert(order)
+    service.repository.insert(kept)
+
+    def orders_cancelled_once_read():
+        # The backfill reads the order as new, then it is cancelled.
+        for read in service.iter_orders():
+            yield read
+            if read.id == order.id:
+                service.repository.transition(
+                    order.id, [OrderStatus.NEW], OrderStatus.CANCELLED, None, datetime.utcnow()
+                )
+                service.customers.record_cancellation(service.repository.get(order.id))
+
+    service.customers.backfill(orders_cancelled_once_read())
+
+    profile = await profile_of(service)
+    assert (profile.order_count, profile.cancelled_count, profile.total_spent) == (2, 1, 450.0)
+
+
+async def test_cancellation_with_a_live_profile_is_counted_once(product_service, outbox, products):
+
+    service = service_with_customers(product_service, outbox)
+    older = older_order()
+    service.repository.insert(older)
+    # A new order creates the profile before the backfill runs.
+    newer = await service.create_order(OrderCreate(
+        customer={"name": "Иван Петров", "phone": "+998901234567"},
+        items=[{"product_id": products["pizza"].id, "quantity": 1}]
+    ))
+
+    await service.cancel_order(older.id)
+    service.customers.backfill(service.iter_orders())
+
+    profile = await profile_of(service)
+    assert (profile.order_count, profile.cancelled_count, profile.total_spent) == (2, 1, 450.0)
+    assert profile.recent_order_ids == [older.id, newer.id]
+
+    # Once the backfill is done, cancellations are counted live.
+    await service.cancel_order(newer.id)
+    profile = await profile_of(service)
+    assert (profile.order_count, profile.cancelled_count, profile.total_spent) == (2, 2, 0.0)
+    assert service.customers.backfill(service.iter_orders()) == 0
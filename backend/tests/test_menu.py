@@ -0,0 +1,31 @@
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+
+
+def test_each_encoding_has_its_own_etag():
+
+    with TestClient(create_app()) as client:
+        created = client.post("/api/v1/products/", json={"name": "Пицца Маргарита", "price": 450.0, "category": "Пицца"})
+        assert created.status_code == 201
+
+        responses = {
+            encoding: client.get("/api/v1/menu", headers={"Accept-Encoding": encoding})
+            for encoding in ("identity", "gzip", "br")
+        }
+        etags = {encoding: response.headers["ETag"] for encoding, response in responses.items()}
+
+        assert len(set(etags.values())) == 3
+        assert "content-encoding" not in responses["identity"].headers
+        for encoding in ("gzip", "br"):
+            assert responses[encoding].headers["Content-Encoding"] == encoding
+            assert responses[encoding].json() == responses["identity"].json()
+
+        revalidated = client.get("/api/v1/menu", headers={"Accept-Encoding": "gzip", "If-None-Match": etags["gzip"]})
+        assert revalidated.status_code == 304
+        assert revalidated.headers["ETag"] == etags["gzip"]
+
+        # A tag for another encoding does not validate this one.
+        switched = client.get("/api/v1/menu", headers={"Accept-Encoding": "identity", "If-None-Match": etags["gzip"]})
+        assert switched.status_code == 200
+        assert switched.headers["ETag"] == etags["identity"]
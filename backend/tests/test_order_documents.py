@@ -0,0 +1,67 @@
+from uuid import uuid4
+
+from app.models.order import Order, OrderItem, OrderStatus
+from app.services import order_documents as fields
+from app.services.order_documents import from_document, is_legacy, snapshot_id, snapshot_ids_of, to_document
+
+
+def make_order() -> Order:
+
+    product_id = uuid4()
+    return Order(
+        customer={"name": "Иван Петров", "phone": "+998901234567"},
+        items=[OrderItem(id=product_id, name="Пицца Маргарита", category="Пицца", quantity=2, price=450.0)],
+        notes="Без лука"
+    )
+
+
+def legacy_document(order: Order) -> dict:
+    """The order as a worker that predates the compact layout stores it."""
+
+    document = order.model_dump(by_alias=True)
+    document["status"] = order.status.value
+    return document
+
+
+def test_compact_round_trip():
+
+    order = make_order()
+    item = order.items[0]
+    snapshot = snapshot_id(item.id, item.name, item.category)
+
+    document = to_document(order, [snapshot])
+    assert not is_legacy(document)
+    assert snapshot_ids_of([document]) == {snapshot}
+
+    restored = from_document(document, {snapshot: {"name": item.name, "category": item.category}})
+    assert restored == order
+
+
+def test_legacy_document_is_mapped_on_read():
+
+    order = make_order()
+    document = legacy_document(order)
+
+    assert is_legacy(document)
+    assert snapshot_ids_of([document]) == set()
+
+    restored = from_document(document, {})
+    assert restored.id == order.id
+    assert restored.status == OrderStatus.NEW
+    assert restored.customer == order.customer
+    assert restored.items == order.items
+    assert restored.total_amount == order.total_amount
+    assert restored.notes == "Без лука"
+
+
+def test_legacy_indexes_do_not_include_current_ones():
+
+    current = {
+        f"{fields.STATUS}_1",
+        f"{fields.CUSTOMER_NAME}_1",
+        f"{fields.CUSTOMER_PHONE}_1",
+        f"{fields.CREATED_AT}_-1__id_-1",
+        f"{fields.UPDATED_AT}_1__id_1",
+        f"{fields.STATUS}_1_{fields.UPDATED_AT}_1",
+    }
+    assert current.isdisjoint(fields.LEGACY_INDEXES)
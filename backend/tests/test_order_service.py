@@ -0,0 +1,243 @@
+import asyncio
+from datetime import datetime, timedelta
+from uuid import UUID, uuid4
+
+import pytest
+
+from app.dto.order import OrderCreate
+from app.exceptions import ConcurrencyError, DatabaseError, OrderNotFoundError, ProductNotFoundError
+from app.models.order import Order, OrderItem, OrderStatus
+from app.services.memory_storage import MemoryOrderRepository
+from app.services.order import OrderService
+from app.services.versions import ORDERS
+
+
+def order_request(product_id: UUID, name: str = "Иван Петров", quantity: int = 2) -> OrderCreate:
+
+    return OrderCreate(
+        customer={"name": name, "phone": "+998901234567"},
+        items=[{"product_id": product_id, "quantity": quantity}]
+    )
+
+
+def stored_order(name: str, created_at: datetime, status: OrderStatus = OrderStatus.NEW) -> Order:
+
+    return Order(
+        customer={"name": name},
+        items=[OrderItem(id=uuid4(), name="Пицца Маргарита", quantity=1, price=450.0)],
+        status=status,
+        created_at=created_at,
+        updated_at=created_at
+    )
+
+
+async def test_create_order(order_service, outbox, products):
+
+    order = await order_service.create_order(order_request(products["pizza"].id))
+
+    assert order.total_amount == 900.0
+    assert order.items[0].name == "Пицца Маргарита"
+    assert order.items[0].category == "Пицца"
+    assert await order_service.get_order(order.id) == order
+
+    assert [event["type"] for event in outbox.events] == ["new_order"]
+    assert outbox.events[0]["order_id"] == str(order.id)
+    assert [o.id for o in order_service.active_board.get_orders(OrderStatus.NEW)] == [order.id]
+
+
+async def test_create_order_rejects_missing_and_unavailable_products(order_service, outbox, products):
+
+    with pytest.raises(ProductNotFoundError):
+        await order_service.create_order(order_request(products["tiramisu"].id))
+    with pytest.raises(ProductNotFoundError):
+        await order_service.create_order(order_request(uuid4()))
+
+    assert outbox.events == []
+    with pytest.raises(OrderNotFoundError):
+        await order_service.get_order(uuid4())
+
+
+async def test_list_filters_and_pagination(order_service):
+
+    repository = order_service.repository
+    start = datetime(2024, 1, 1, 12, 0)
+    orders = [
+        stored_order("Иван Петров", start),
+        stored_order("Мария Иванова", start + timedelta(hours=1), OrderStatus.CANCELLED),
+        stored_order("Пётр Сидоров", start + timedelta(hours=2)),
+        stored_order("иван грозный", start + timedelta(hours=3)),
+    ]
+    for order in orders:
+        repository.insert(order)
+
+    page, total = await order_service.get_orders(page=1, limit=3)
+    assert total == 4
+    assert [o.id for o in page] == [o.id for o in reversed(orders)][:3]
+    page, _ = await order_service.get_orders(page=2, limit=3)
+    assert [o.id for o in page] == [orders[0].id]
+
+    page, total = await order_service.get_orders(status=OrderStatus.CANCELLED)
+    assert total == 1 and page[0].id == orders[1].id
+
+    # customer_name is a case-insensitive, unanchored regex, like $regex with "i".
+    page, total = await order_service.get_orders(customer_name="иван")
+    assert total == 3
+    page, total = await order_service.get_orders(customer_name="^иван")
+    assert [o.id for o in page] == [orders[3].id, orders[0].id]
+
+    # Both ends of the date range are inclusive.
+    page, total = await order_service.get_orders(date_from=start + timedelta(hours=1), date_to=start + timedelta(hours=2))
+    assert [o.id for o in page] == [orders[2].id, orders[1].id]
+    page, total = await order_service.get_orders(status=OrderStatus.NEW, date_from=start + timedelta(hours=1))
+    assert [o.id for o in page] == [orders[3].id, orders[2].id]
+
+
+async def test_invalid_name_pattern_is_a_database_error(order_service):
+
+    # Mongo answers an invalid $regex with OperationFailure.
+    with pytest.raises(DatabaseError):
+        await order_service.get_orders(customer_name="(")
+
+
+async def test_orders_created_together_page_by_id(order_service):
+
+    created_at = datetime(2024, 1, 1, 12, 0)
+    orders = [stored_order(f"Клиент {i}", created_at) for i in range(5)]
+    for order in orders:
+        order_service.repository.insert(order)
+
+    seen = []
+    for page_number in (1, 2, 3):
+        page, _ = await order_service.get_orders(page=page_number, limit=2)
+        seen.extend(o.id for o in page)
+
+    # Ties on created_at are ordered by id, descending, like the Mongo sort.
+    assert seen == sorted((o.id for o in orders), reverse=True)
+
+
+async def test_status_transitions(order_service, outbox, products):
+
+    order = await order_service.create_order(order_request(products["pizza"].id))
+
+    confirmed = await order_service.update_order_status(order.id, OrderStatus.CONFIRMED)
+    assert confirmed.status == OrderStatus.CONFIRMED
+    assert confirmed.version == order.version + 1
+
+    with pytest.raises(ValueError):
+        await order_service.update_order_status(order.id, OrderStatus.COMPLETED)
+    with pytest.raises(ConcurrencyError):
+        await order_service.update_order_status(order.id, OrderStatus.PREPARING, expected_version=order.version)
+    with pytest.raises(OrderNotFoundError):
+        await order_service.update_order_status(uuid4(), OrderStatus.CONFIRMED)
+
+    # The status index follows the transition.
+    assert (await order_service.get_orders(status=OrderStatus.NEW))[1] == 0
+    assert (await order_service.get_orders(status=OrderStatus.CONFIRMED))[1] == 1
+    statistics = await order_service.get_orders_statistics()
+    assert statistics[OrderStatus.NEW.value] == 0
+    assert statistics[OrderStatus.CONFIRMED.value] == 1
+
+    cancelled = await order_service.cancel_order(order.id, expected_version=confirmed.version)
+    assert cancelled.status == OrderStatus.CANCELLED
+    assert await order_service.get_active_orders() == []
+    assert order_service.active_board.get_orders() == []
+
+    assert [event["type"] for event in outbox.events] == ["new_order", "order_update", "order_update"]
+
+
+async def test_bulk_status_transition(order_service, outbox, products):
+
+    first = await order_service.create_order(order_request(products["pizza"].id))
+    second = await order_service.create_order(order_request(products["pizza"].id))
+    done = await order_service.create_order(order_request(products["pizza"].id))
+    await order_service.cancel_order(done.id)
+    missing = uuid4()
+
+    results = await order_service.update_orders_status_bulk(
+        [second.id, missing, first.id, done.id, second.id],
+        OrderStatus.CONFIRMED
+    )
+
+    assert [result["order_id"] for result in results] == [second.id, missing, first.id, done.id]
+    assert results[0]["order"].status == OrderStatus.CONFIRMED
+    assert results[2]["order"].status == OrderStatus.CONFIRMED
+    assert "not found" in results[1]["error"]
+    assert "Invalid status transition" in results[3]["error"]
+
+    event = outbox.events[-1]
+    assert event["type"] == "orders_update"
+    assert {o["id"] for o in event["data"]["orders"]} == {str(first.id), str(second.id)}
+    assert (await order_service.get_orders(status=OrderStatus.CONFIRMED))[1] == 2
+
+
+async def test_outbox_sequence_is_the_orders_version(order_service, outbox, products):
+
+    order = await order_service.create_order(order_request(products["pizza"].id))
+    await order_service.update_order_status(order.id, OrderStatus.CONFIRMED)
+    await order_service.update_orders_status_bulk([order.id], OrderStatus.PREPARING)
+
+    assert [event["_id"] for event in outbox.events] == [1, 2, 3]
+    assert await outbox.latest_sequence() == 3
+    assert await order_service.product_service.versions.get(ORDERS) == 3
+    assert [event["_id"] for event in await outbox.read_batch(1, 10)] == [2, 3]
+    assert await outbox.read_batch(3, 10) == []
+
+
+async def test_orders_updated_since_pages_through_equal_timestamps(order_service):
+
+    updated_at = datetime(2024, 1, 1, 12, 0)
+    orders = [stored_order(f"Клиент {i}", updated_at) for i in range(3)]
+    for order in orders:
+        order_service.repository.insert(order)
+
+    since, after_id = updated_at - timedelta(seconds=1), None
+    seen = []
+    while True:
+        page = await order_service.get_orders_updated_since(since, limit=2, after_id=after_id)
+        if not page:
+            break
+        seen.extend(o.id for o in page)
+        since, after_id = page[-1].updated_at, page[-1].id
+
+    assert seen == sorted(o.id for o in orders)
+
+
+async def test_rejected_order_fails_alone_in_a_group_insert(order_service, outbox):
+
+    created_at = datetime(2024, 1, 1, 12, 0)
+    existing = stored_order("Иван Петров", created_at)
+    order_service.repository.insert(existing)
+    fresh = stored_order("Мария Иванова", created_at)
+
+    # The group insert is rejected as a whole, then retried order by order.
+    errors = order_service._insert_orders([(existing, {"id": str(existing.id)}), (fresh, {"id": str(fresh.id)})])
+
+    assert isinstance(errors[0], DatabaseError)
+    assert errors[1] is None
+    assert await order_service.get_order(fresh.id) == fresh
+    # Only the written order is published.
+    assert [event["order_id"] for event in outbox.events] == [str(fresh.id)]
+
+
+async def test_concurrent_creations_share_one_insert(product_service, outbox, products):
+
+    service = OrderService(MemoryOrderRepository(), product_service, outbox, insert_batch_delay=0.01)
+
+    orders = await asyncio.gather(*(service.create_order(order_request(products["pizza"].id)) for _ in range(5)))
+
+    assert service.insert_batcher.batches == 1
+    assert service.insert_batcher.items == 5
+    assert len({order.id for order in orders}) == 5
+    assert [event["_id"] for event in outbox.events] == [1, 2, 3, 4, 5]
+
+
+async def test_orders_by_ids_newest_first(order_service):
+
+    # The memory backend never archives, so every order is found without the archive fallback.
+    start = datetime(2024, 1, 1, 12, 0)
+    older, newer = stored_order("Иван Петров", start), stored_order("Иван Петров", start + timedelta(days=90))
+    order_service.repository.insert(older)
+    order_service.repository.insert(newer)
+
+    orders = await order_service.get_orders_by_ids([older.id, uuid4(), newer.id])
+    assert [o.id for o in orders] == [newer.id, older.id]
@@ -0,0 +1,65 @@
+from uuid import uuid4
+
+import pytest
+
+from app.dto.product import ProductCreate, ProductUpdate
+from app.exceptions import ConcurrencyError, ProductNotFoundError
+from app.services.versions import PRODUCTS
+
+
+async def test_create_and_get_product(product_service, products):
+
+    pizza = products["pizza"]
+    assert await product_service.get_product(pizza.id) == pizza
+    assert await product_service.get_product_version(pizza.id) == (1, pizza.updated_at)
+    assert await product_service.versions.get(PRODUCTS) == 2
+
+    with pytest.raises(ProductNotFoundError):
+        await product_service.get_product(uuid4())
+
+
+async def test_list_filters_and_pagination(product_service, products):
+
+    salad = await product_service.create_product(ProductCreate(name="Цезарь", price=320.0, category="Салаты"))
+
+    page, total = await product_service.get_products(limit=2)
+    assert total == 3
+    assert [p.id for p in page] == [products["pizza"].id, products["tiramisu"].id]
+    page, _ = await product_service.get_products(page=2, limit=2)
+    assert [p.id for p in page] == [salad.id]
+
+    page, total = await product_service.get_products(available_only=True)
+    assert total == 2 and products["tiramisu"].id not in {p.id for p in page}
+    page, total = await product_service.get_products(category="Десерты")
+    assert [p.id for p in page] == [products["tiramisu"].id]
+
+
+async def test_conditional_update_and_delete(product_service, products):
+
+    pizza = products["pizza"]
+
+    updated = await product_service.update_product(pizza.id, ProductUpdate(price=500.0), expected_version=1)
+    assert updated.price == 500.0 and updated.version == 2
+
+    with pytest.raises(ConcurrencyError):
+        await product_service.update_product(pizza.id, ProductUpdate(price=550.0), expected_version=1)
+    with pytest.raises(ConcurrencyError):
+        await product_service.delete_product(pizza.id, expected_version=1)
+    with pytest.raises(ProductNotFoundError):
+        await product_service.update_product(uuid4(), ProductUpdate(price=1.0))
+
+    assert await product_service.delete_product(pizza.id, expected_version=2)
+    with pytest.raises(ProductNotFoundError):
+        await product_service.get_product(pizza.id)
+
+
+async def test_search_and_menu_follow_writes(product_service, products):
+
+    await product_service.refresh_search_index()
+    assert [p.id for p in await product_service.search_products("пиц")] == [products["pizza"].id]
+
+    await product_service.update_product(products["pizza"].id, ProductUpdate(is_available=False))
+    assert await product_service.search_products("пиц", available_only=True) == []
+
+    menu = await product_service.get_menu()
+    assert menu.size > 0
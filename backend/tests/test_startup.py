@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+# Cold start budget: interpreter start, imports, create_app, the lifespan and
+# the first request, on the in-memory backend.
+TIME_TO_FIRST_REQUEST_BUDGET_S = float(os.environ.get("TIME_TO_FIRST_REQUEST_BUDGET_S", "3.0"))
+
+FIRST_REQUEST = """
+import time
+started = time.perf_counter()
+
+from fastapi.testclient import TestClient
+from app.main import create_app
+
+with TestClient(create_app()) as client:
+    response = client.get("/health")
+    elapsed = time.perf_counter() - started
+    assert response.status_code == 200, response.text
+    assert client.app.openapi_schema is not None
+
+print(elapsed)
+"""
+
+
+def test_time_to_first_request():
+
+    backend = Path(__file__).resolve().parent.parent
+    result = subprocess.run(
+        [sys.executable, "-c", FIRST_REQUEST],
+        cwd=backend,
+        env={**os.environ, "PYTHONPATH": str(backend)},
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+
+    assert result.returncode == 0, result.stderr
+    elapsed = float(result.stdout.strip().splitlines()[-1])
+    assert elapsed < TIME_TO_FIRST_REQUEST_BUDGET_S, f"first request after {elapsed:.2f}s"
+
+
+def test_startup_timings_cover_lifespan_phases():
+
+    from fastapi.testclient import TestClient
+    from app.main import create_app
+
+    with TestClient(create_app()) as client:
+        assert client.get("/health").json() == {"status": "ok"}
+        timings = client.app.state.startup_timings
+
+    for phase in ("imports", "create_app", "openapi", "lifespan"):
+        assert phase in timings
@@ -5,6 +5,7 @@ export interface WebSocketMessage {
         [key: string]: number;
     };
     error?: string;
+    retry_after_ms?: number;
 }
 
 type MessageHandler = (data: WebSocketMessage) => void;
@@ -15,6 +16,7 @@ export class WebSocketService {
     private reconnectAttempts: number = 0;
     private maxReconnectAttempts: number = 5;
     private reconnectTimeout: number | null = null;
+    private reconnectHintMs: number | null = null;
     private currentRole: string = 'customers';
 
     connect(role: string = 'customers') {
@@ -55,6 +57,17 @@ export class WebSocketService {
         try {
             const data: WebSocketMessage = JSON.parse(event.data);
             console.log('Received WebSocket message:', data);
+
+            if (data.type === 'ping') {
+                // The server reaps sockets that stay silent past its idle timeout.
+                this.ws?.send(JSON.stringify({ type: 'pong' }));
+                return;
+            }
+            if (data.type === 'reconnect') {
+                // The server is restarting and spreads reconnects over a window.
+                this.reconnectHintMs = data.retry_after_ms ?? null;
+                return;
+            }
             this.messageHandlers.forEach(handler => {
                 try {
                     handler(data);
@@ -85,7 +98,9 @@ export class WebSocketService {
             return;
         }
 
-        const delay = Math.min(1000 * Math.pow(2, this.reconnectAttempts), 30000);
+        const backoff = Math.min(1000 * Math.pow(2, this.reconnectAttempts), 30000);
+        const delay = this.reconnectHintMs ?? Math.round(backoff / 2 + Math.random() * backoff / 2);
+        this.reconnectHintMs = null;
         this.reconnectAttempts++;
 
         console.log(`Attempting to reconnect in ${delay}ms (attempt ${this.reconnectAttempts})`);
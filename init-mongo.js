@@ -3,15 +3,33 @@ db = db.getSiblingDB('restaurant_db');
 db.dropDatabase();
 db.createCollection('products');
 db.createCollection('orders');
+db.createCollection('outbox');
+db.createCollection('idempotency_keys');
+db.createCollection('orders_archive');
+db.createCollection('menu_snapshots');
+db.createCollection('customers');
 
 db.products.createIndex({ "name": 1 });
 db.products.createIndex({ "category": 1 });
 db.products.createIndex({ "is_available": 1 });
 
-db.orders.createIndex({ "status": 1 });
-db.orders.createIndex({ "customer.name": 1 });
-db.orders.createIndex({ "created_at": -1 });
-db.orders.createIndex({ "customer.phone": 1 });
+// Orders use the compact layout from backend/app/services/order_documents.py.
+db.orders.createIndex({ "s": 1 });
+db.orders.createIndex({ "c.n": 1 });
+db.orders.createIndex({ "ca": -1, "_id": -1 });
+db.orders.createIndex({ "ua": 1, "_id": 1 });
+db.orders.createIndex({ "c.p": 1 });
+db.orders.createIndex({ "s": 1, "ua": 1 });
+
+db.orders_archive.createIndex({ "ca": -1, "_id": -1 });
+db.orders_archive.createIndex({ "s": 1 });
+db.orders_archive.createIndex({ "c.n": 1 });
+
+db.customers.createIndex({ "email": 1 });
+db.customers.createIndex({ "last_order_at": -1 });
+
+db.outbox.createIndex({ "created_at": 1 }, { expireAfterSeconds: 86400 });
+db.idempotency_keys.createIndex({ "created_at": 1 }, { expireAfterSeconds: 86400 });
 
 db.products.insertMany([
     {
@@ -22,7 +40,8 @@ db.products.insertMany([
         is_available: true,
         description: "Классическая пицца с томатным соусом, моцареллой и базиликом",
         created_at: new Date(),
-        updated_at: new Date()
+        updated_at: new Date(),
+        version: 1
     },
     {
         _id: UUID("b7b14f78-07f6-4958-b042-f4dfda5544ca"),
@@ -32,7 +51,8 @@ db.products.insertMany([
         is_available: true,
         description: "Традиционная итальянская паста с беконом и сыром",
         created_at: new Date(),
-        updated_at: new Date()
+        updated_at: new Date(),
+        version: 1
     },
     {
         _id: UUID("b7b14f78-07f6-4958-b042-f4dfda5544cc"),
@@ -42,7 +62,8 @@ db.products.insertMany([
         is_available: true,
         description: "Салат с куриной грудкой, сыром пармезан и соусом цезарь",
         created_at: new Date(),
-        updated_at: new Date()
+        updated_at: new Date(),
+        version: 1
     },
     {
         _id: UUID("b7b14f78-07f6-4958-b042-f4dfda5544cf"),
@@ -52,6 +73,7 @@ db.products.insertMany([
         is_available: false,
         description: "Классический итальянский десерт",
         created_at: new Date(),
-        updated_at: new Date()
+        updated_at: new Date(),
+        version: 1
     }
 ]);